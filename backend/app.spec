@@ -23,6 +23,23 @@ a = Analysis(
         'solver_cpsat',
         'solver_greedy',
         'solver_config',
+        'solver_interval',
+        'solver_two_stage',
+        'solver_decompose',
+        'solver_repair',
+        'solver_precheck',
+        'solver_cache',
+        'solver_metrics',
+        'solver_validate',
+        'solver_scenarios',
+        'solver_race',
+        'solver_lns',
+        'solver_export',
+        'solver_domains',
+        'csv_ingest',
+        'job_scheduler',
+        'job_store',
+        'server',
     ],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,435 @@
+"""
+Benchmark harness for generate_timetable.
+
+    python benchmark.py convert ../Allotments.csv -o allotments.json
+    python benchmark.py synthetic --departments 4 --sections 3 --rooms 24 --density 0.2 -o synth.json
+    python benchmark.py run allotments.json synth.json --time-limit 60 --seed 1 -o results.json
+    python benchmark.py compare results.json baseline.json
+    python benchmark.py replay exports/20250101-120000-0123456789ab --workers 1 --param linearization_level=2
+
+`convert` turns Allotments or Plan of Study CSVs into one /generate payload
+(see csv_ingest.py), `synthetic` builds a seeded instance of a chosen size,
+`run` solves every instance in a fresh process and writes per-phase wall
+time, model size, peak RSS, time to first solution and final objective/gap
+as JSON, and `compare` checks a results file against a stored baseline and exits with
+status 1 when an instance got worse. `replay` re-solves a job exported
+with TIMETABLE_EXPORT_DIR (see solver_export.py): the stored CP-SAT model
+with its parameters and any overrides, or with `--rebuild` the whole job
+from its payload, e.g. with another engine.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+
+from csv_ingest import ESTIMATED_STUDENTS, ROOM_CAPACITY, csv_payload, generated_rooms, session_demand
+from solver_config import DEFAULT_DAYS, DEFAULT_INTERVALS
+from solver_metrics import peak_rss_mb
+
+# Default slot grid of the solver (see solver_config.TimeGrid)
+DAYS = DEFAULT_DAYS
+START_TIMES = [start for start, _ in DEFAULT_INTERVALS]
+
+# compare: relative slack before a slower or worse run counts as a regression,
+# and absolute slack in seconds so sub-second phases do not flap
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_OBJECTIVE_TOLERANCE = 0.0
+TIME_SLACK = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------
+# Synthetic instances
+# -----------------------------
+def synthetic_payload(departments=2, semesters=4, sections=2, rooms=None, lab_rooms=None,
+                      density=0.0, courses_per_class=5, seed=0):
+    """
+    A seeded instance: every department x semester x section is a class
+    taking `courses_per_class` theory courses and one lab, each course
+    taught by one of a pool of faculty sized for about three allotments
+    each. `rooms`/`lab_rooms` default to generated_rooms' sizing.
+    `density` is the share of faculty and room slots already booked by an
+    existing timetable.
+    """
+    rnd = random.Random(seed)
+    courses, allotments = [], []
+    num_faculty = max(1, departments * semesters * (courses_per_class + 1) * sections // 3)
+    faculty = [{"id": f"F{i + 1}", "name": f"Faculty {i + 1}"} for i in range(num_faculty)]
+
+    for d_idx in range(departments):
+        dept = f"DEPT{d_idx + 1}"
+        for semester in range(1, semesters + 1):
+            for c_idx in range(courses_per_class + 1):
+                is_lab = c_idx == courses_per_class
+                course_id = f"{dept}-{semester}-{c_idx + 1}"
+                courses.append({
+                    "id": course_id,
+                    "code": f"{dept}{semester}{c_idx:02d}" + ("L" if is_lab else ""),
+                    "name": f"{dept} Course {semester}.{c_idx + 1}" + (" Lab" if is_lab else ""),
+                    "credits": 1 if is_lab else rnd.choice([3, 3, 4]),
+                    "type": "Core",
+                    "semester": str(semester),
+                    "department": dept,
+                    "requiresLab": is_lab,
+                    "estimatedStudents": ESTIMATED_STUDENTS,
+                })
+                for section in range(sections):
+                    allotments.append({
+                        "courseId": course_id,
+                        "facultyId": rnd.choice(faculty)["id"],
+                        "classIds": [f"{dept}-{semester}-{chr(ord('A') + section)}"],
+                    })
+
+    room_list = generated_rooms(*session_demand(courses, allotments))
+    lecture = [r for r in room_list if r["type"] == "lecture"]
+    labs = [r for r in room_list if r["type"] == "lab"]
+    if rooms is not None:
+        lecture = [{"id": f"R{i + 1}", "name": f"R{i + 1}", "capacity": ROOM_CAPACITY, "type": "lecture"}
+                   for i in range(rooms)]
+    if lab_rooms is not None:
+        labs = [{"id": f"LAB{i + 1}", "name": f"Lab {i + 1}", "capacity": ROOM_CAPACITY, "type": "lab"}
+                for i in range(lab_rooms)]
+    room_list = lecture + labs
+
+    entries = []
+    slots = [(day, start) for day in DAYS for start in START_TIMES]
+    for key, owners in (("facultyId", faculty), ("roomId", room_list)):
+        for owner in owners:
+            for day, start in rnd.sample(slots, round(density * len(slots))):
+                entries.append({key: owner["id"], "timeSlot": {"day": day, "startTime": start}})
+
+    return {
+        "courses": courses,
+        "faculty": faculty,
+        "rooms": room_list,
+        "allotments": allotments,
+        "existing_timetables": [{"entries": entries}] if entries else [],
+    }
+
+
+# -----------------------------
+# Running
+# -----------------------------
+def _run_in_child(payload, results):
+    from solver import generate_timetable
+
+    started = time.time()
+    result = generate_timetable(payload, existing_timetables=payload.get("existing_timetables", []))
+    wall_time = time.time() - started
+    stats = result["statistics"]
+    results.put({
+        "wallTime": round(wall_time, 3),
+        "peakRssMb": peak_rss_mb(),
+        "success": result["success"],
+        "scheduledSessions": stats.get("scheduledCourses", 0),
+        "usedSlots": stats.get("usedSlots", 0),
+        "conflicts": len(result["conflicts"]),
+        "timings": stats.get("timings", {}),
+        "model": stats.get("model", {}),
+        "search": stats.get("search", {}),
+        "solves": stats.get("profile", {}).get("search", []),
+        "solver": stats.get("solver", {}),
+        "objective": stats.get("objective"),
+    })
+
+
+def run_instance(name, payload, settings):
+    """
+    Solve one payload with `settings` merged in. Each instance runs in a
+    fresh process so the peak RSS belongs to that instance alone.
+    """
+    payload = dict(payload, **settings)
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_in_child, args=(payload, results), name=f"benchmark-{name}")
+    process.start()
+    try:
+        record = results.get()
+    finally:
+        process.join()
+    record = {"instance": name, "allotments": len(payload.get("allotments", [])), **record}
+    logger.info(f"{name}: {record['wallTime']:.2f}s, {record['scheduledSessions']} sessions, "
+                f"objective {record['search'].get('objective')}")
+    return record
+
+
+def load_instance(path):
+    """A payload from a JSON file or a CSV converted with csv_payload."""
+    if path.lower().endswith(".csv"):
+        return csv_payload(path)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_benchmarks(paths, settings):
+    runs = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        runs.append(run_instance(name, load_instance(path), settings))
+    from ortools import __version__ as ortools_version
+    return {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "ortools": ortools_version, "cpus": os.cpu_count()},
+        "settings": settings,
+        "runs": runs,
+    }
+
+
+# -----------------------------
+# Comparing against a baseline
+# -----------------------------
+def compare_runs(results, baseline, time_tolerance=DEFAULT_TIME_TOLERANCE,
+                 objective_tolerance=DEFAULT_OBJECTIVE_TOLERANCE):
+    """
+    Compare instances present in both files. Returns (rows, regressions):
+    rows are (instance, metric, baseline, current, change) and regressions
+    the subset that got worse beyond the tolerances. Objectives are only
+    compared when both runs used the same objective formulation.
+    """
+    previous = {run["instance"]: run for run in baseline["runs"]}
+    rows, regressions = [], []
+
+    def check(instance, metric, old, new, worse):
+        if old is None or new is None:
+            return
+        change = (new - old) / abs(old) if old else 0.0
+        row = (instance, metric, old, new, change)
+        rows.append(row)
+        if worse:
+            regressions.append(row)
+
+    for run in results["runs"]:
+        old = previous.get(run["instance"])
+        if old is None:
+            continue
+        name = run["instance"]
+        for metric, new_value, old_value in (
+            ("wallTime", run["wallTime"], old["wallTime"]),
+            ("solveTime", run["timings"].get("solve"), old["timings"].get("solve")),
+            ("firstSolutionTime", run["search"].get("firstSolutionTime"), old["search"].get("firstSolutionTime")),
+        ):
+            check(name, metric, old_value, new_value,
+                  new_value is not None and old_value is not None
+                  and new_value > old_value * (1 + time_tolerance) + TIME_SLACK)
+        check(name, "peakRssMb", old.get("peakRssMb"), run.get("peakRssMb"),
+              run.get("peakRssMb") is not None and old.get("peakRssMb") is not None
+              and run["peakRssMb"] > old["peakRssMb"] * (1 + time_tolerance))
+        check(name, "scheduledSessions", old["scheduledSessions"], run["scheduledSessions"],
+              run["scheduledSessions"] < old["scheduledSessions"])
+        new_objective, old_objective = run["search"].get("objective"), old["search"].get("objective")
+        if run.get("objective") == old.get("objective"):
+            check(name, "objective", old_objective, new_objective,
+                  new_objective is not None and old_objective is not None
+                  and new_objective > old_objective + abs(old_objective) * objective_tolerance)
+    return rows, regressions
+
+
+def _print_comparison(rows, regressions):
+    worse = set(id(row) for row in regressions)
+    print(f"{'instance':<24} {'metric':<18} {'baseline':>12} {'current':>12} {'change':>8}")
+    for row in rows:
+        instance, metric, old, new, change = row
+        flag = "  REGRESSION" if id(row) in worse else ""
+        print(f"{instance:<24} {metric:<18} {old:>12.3f} {new:>12.3f} {change:>+7.1%}{flag}")
+    print(f"\n{len(regressions)} regression(s)")
+
+
+# -----------------------------
+# Replaying exported jobs
+# -----------------------------
+def _exported_summary(path, exported):
+    result = exported.get("result", {})
+    return {
+        "export": path,
+        "sessionId": exported.get("sessionId"),
+        "engine": exported.get("engine"),
+        "mode": exported.get("mode"),
+        "objective": exported.get("objective"),
+        "solver": exported.get("solver"),
+        "model": exported.get("model"),
+        "timings": result.get("timings", exported.get("timings")),
+        "search": result.get("search"),
+        "solves": result.get("profile", {}).get("search"),
+    }
+
+
+def replay_model(path, time_limit=None, workers=None, seed=None, parameters=()):
+    """
+    Re-solve the CP-SAT model of an export with its stored parameters,
+    overridden by `time_limit`, `workers`, `seed` and `parameters`
+    ((name, value) pairs of SatParameters fields). Skips parsing and model
+    building, so only the search differs from the original job.
+    """
+    from ortools.sat.python import cp_model
+    from solver_export import load_export
+    from solver_metrics import solver_response_statistics
+
+    started = time.time()
+    _, model, exported = load_export(path)
+    load_time = time.time() - started
+
+    solver = cp_model.CpSolver()
+    solver.parameters.parse_text_format(exported["satParameters"])
+    if time_limit is not None:
+        solver.parameters.max_time_in_seconds = time_limit
+    if workers is not None:
+        solver.parameters.num_search_workers = workers
+    if seed is not None:
+        solver.parameters.random_seed = seed
+    for name, value in parameters:
+        setattr(solver.parameters, name, value)
+    solver.parameters.log_search_progress = True
+    solver.parameters.log_to_stdout = False
+    solver.parameters.log_to_response = True
+
+    status = solver.Solve(model)
+    feasible = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    logger.info(f"{path}: {solver.StatusName(status)} in {solver.WallTime():.2f}s, "
+                f"objective {solver.ObjectiveValue() if feasible else None}")
+    return {
+        "exported": _exported_summary(path, exported),
+        "replay": {
+            "loadTime": round(load_time, 3),
+            "parameters": str(solver.parameters),
+            "objective": solver.ObjectiveValue() if feasible else None,
+            "bestBound": solver.BestObjectiveBound() if feasible else None,
+            "search": solver_response_statistics(solver, status),
+            "peakRssMb": peak_rss_mb(),
+        },
+    }
+
+
+def replay_job(path, settings):
+    """Run generate_timetable again on an export's payload with `settings` merged in (see run_instance)."""
+    from solver_export import PARAMETERS_FILE, PAYLOAD_FILE, RESULT_FILE
+
+    with open(os.path.join(path, PARAMETERS_FILE), encoding="utf-8") as f:
+        exported = json.load(f)
+    result_path = os.path.join(path, RESULT_FILE)
+    if os.path.exists(result_path):
+        with open(result_path, encoding="utf-8") as f:
+            exported["result"] = json.load(f)
+    name = os.path.basename(os.path.normpath(path))
+    return {
+        "exported": _exported_summary(path, exported),
+        "replay": run_instance(name, load_instance(os.path.join(path, PAYLOAD_FILE)), settings),
+    }
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _write_json(data, path):
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    else:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+
+
+def _option(text):
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the timetable solver.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show solver logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert Allotments or Plan of Study CSVs to a payload")
+    convert.add_argument("csv", nargs="+", help="CSV files merged into one payload")
+    convert.add_argument("-o", "--output")
+
+    synthetic = commands.add_parser("synthetic", help="generate a seeded synthetic payload")
+    synthetic.add_argument("--departments", type=int, default=2)
+    synthetic.add_argument("--semesters", type=int, default=4)
+    synthetic.add_argument("--sections", type=int, default=2)
+    synthetic.add_argument("--rooms", type=int, help="lecture rooms (default: sized for the demand)")
+    synthetic.add_argument("--lab-rooms", type=int, help="lab rooms (default: sized for the demand)")
+    synthetic.add_argument("--density", type=float, default=0.0,
+                           help="share of faculty and room slots booked by an existing timetable")
+    synthetic.add_argument("--seed", type=int, default=0)
+    synthetic.add_argument("-o", "--output")
+
+    run = commands.add_parser("run", help="solve payload (.json) or CSV instances and record metrics")
+    run.add_argument("instances", nargs="+")
+    run.add_argument("--time-limit", type=int, default=60)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--workers", type=int, default=1,
+                     help="CP-SAT search workers; 1 (the default) makes runs repeatable")
+    run.add_argument("--option", action="append", type=_option, default=[], metavar="KEY=VALUE",
+                     help="extra payload setting, e.g. engine=interval or symmetryBreaking=true")
+    run.add_argument("-o", "--output")
+
+    compare = commands.add_parser("compare", help="compare a results file with a baseline")
+    compare.add_argument("results")
+    compare.add_argument("baseline")
+    compare.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE)
+    compare.add_argument("--objective-tolerance", type=float, default=DEFAULT_OBJECTIVE_TOLERANCE)
+
+    replay = commands.add_parser("replay", help="re-solve a job exported with TIMETABLE_EXPORT_DIR")
+    replay.add_argument("export", help="export directory")
+    replay.add_argument("--time-limit", type=float)
+    replay.add_argument("--seed", type=int)
+    replay.add_argument("--workers", type=int, help="CP-SAT search workers; 1 makes replays repeatable")
+    replay.add_argument("--param", action="append", type=_option, default=[], metavar="NAME=VALUE",
+                        help="CP-SAT parameter for the stored model, e.g. linearization_level=2")
+    replay.add_argument("--rebuild", action="store_true",
+                        help="run the whole job again from its payload instead of only the stored model")
+    replay.add_argument("--option", action="append", type=_option, default=[], metavar="KEY=VALUE",
+                        help="payload setting for --rebuild, e.g. engine=interval")
+    replay.add_argument("-o", "--output")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    if args.command == "convert":
+        _write_json(csv_payload(*args.csv), args.output)
+    elif args.command == "synthetic":
+        _write_json(synthetic_payload(
+            departments=args.departments, semesters=args.semesters, sections=args.sections,
+            rooms=args.rooms, lab_rooms=args.lab_rooms, density=args.density, seed=args.seed,
+        ), args.output)
+    elif args.command == "run":
+        settings = {"timeLimit": args.time_limit, "seed": args.seed, "numWorkers": args.workers,
+                    **dict(args.option)}
+        _write_json(run_benchmarks(args.instances, settings), args.output)
+    elif args.command == "compare":
+        with open(args.results, encoding="utf-8") as f:
+            results = json.load(f)
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare_runs(results, baseline, args.time_tolerance, args.objective_tolerance)
+        _print_comparison(rows, regressions)
+        return 1 if regressions else 0
+    elif args.command == "replay":
+        if args.rebuild or args.option:
+            settings = dict(args.option)
+            if args.time_limit is not None:
+                settings["timeLimit"] = args.time_limit
+            if args.seed is not None:
+                settings["seed"] = args.seed
+            if args.workers is not None:
+                settings["numWorkers"] = settings["maxWorkers"] = args.workers
+            _write_json(replay_job(args.export, settings), args.output)
+        else:
+            _write_json(replay_model(args.export, args.time_limit, args.workers, args.seed, args.param),
+                        args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import csv
+import io
+import math
+import re
+
+from solver_config import DEFAULT_DAYS, DEFAULT_INTERVALS
+
+# Share of room x slot capacity generated rooms should be booked at
+ROOM_UTILISATION = 0.6
+ROOM_CAPACITY = 50
+ESTIMATED_STUDENTS = 40
+
+# Teacher placeholders the frontend importer also skips
+UNASSIGNED_TEACHERS = ("", "nf", "new faculty")
+
+# "(TA)", "(Visiting)" and similar notes after a teacher's name
+TEACHER_NOTE = re.compile(r"\([^)]*\)")
+
+# Class id schemes: "<dept>-<semester>-<section>" keeps same-named sections
+# of different departments and semesters apart; "section" is the bare
+# section the frontend importer (src/services/importService.ts) uses
+CLASS_ID_SCHEMES = ("qualified", "section")
+
+
+def _clean(text):
+    """Trim and collapse inner whitespace: ' Data  Structures Lab ' -> 'Data Structures Lab'."""
+    return " ".join((text or "").split())
+
+
+def first_teacher(cell):
+    """'A + B(TA)' -> 'A'; None for unassigned placeholders."""
+    name = _clean(TEACHER_NOTE.sub(" ", (cell or "").split("+")[0]))
+    return None if name.lower() in UNASSIGNED_TEACHERS else name
+
+
+def session_demand(courses, allotments):
+    """Slots needed by lecture and lab sessions, counted the way prepare_problem creates them."""
+    course_map = {c["id"]: c for c in courses}
+    lecture = lab = 0
+    for allotment in allotments:
+        course = course_map[allotment["courseId"]]
+        classes = len(allotment["classIds"])
+        if course["requiresLab"]:
+            lab += 2 * classes
+        else:
+            lecture += (3 if course["credits"] > 3 else 2) * classes
+    return lecture, lab
+
+
+def generated_rooms(lecture_slots, lab_slots, utilisation=ROOM_UTILISATION):
+    """Lecture and lab rooms sized so the demand books about `utilisation` of them."""
+    week = len(DEFAULT_DAYS) * len(DEFAULT_INTERVALS)
+    num_lecture = max(1, math.ceil(lecture_slots / (week * utilisation)))
+    num_lab = max(1, math.ceil(lab_slots / (week * utilisation))) if lab_slots else 0
+    rooms = [{"id": f"R{i + 1}", "name": f"R{i + 1}", "capacity": ROOM_CAPACITY, "type": "lecture"}
+             for i in range(num_lecture)]
+    rooms += [{"id": f"LAB{i + 1}", "name": f"Lab {i + 1}", "capacity": ROOM_CAPACITY, "type": "lab"}
+              for i in range(num_lab)]
+    return rooms
+
+
+def text_stream(binary):
+    """Decode an uploaded file or request body lazily, as csv.reader wants it (BOM-tolerant)."""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+class CsvIngest:
+    """
+    Builds one /generate payload from Allotments or Plan of Study CSV rows,
+    grouped like the frontend importer: one course per subject and
+    department, one allotment per course and teacher. Class ids differ by
+    default: the importer uses the bare section, so section "A" of every
+    department and semester is one class, while `class_ids="qualified"`
+    gives "<dept>-<semester>-<section>". Pass `class_ids="section"` for
+    timetables whose classes match a frontend import of the same file.
+    Rows are consumed one at a time, so a file is never held whole. Courses, faculty, classes and rooms are
+    interned on whitespace- and case-normalized keys, so spelling variants
+    and repeated rows (Plan of Study has one row per weekly hour) collapse
+    to one compact id. Labs are detected with solver.is_lab_course, the
+    rule generate_timetable applies. Several files can be added to one
+    ingest; a "Room" column adds rooms, and a room hosting any lab becomes
+    a lab room. Without any, rooms are generated from the demand.
+    """
+
+    def __init__(self, class_ids="qualified"):
+        from solver import is_lab_course  # lazy: the server imports this module before the solver
+
+        if class_ids not in CLASS_ID_SCHEMES:
+            raise ValueError(f"Unknown class id scheme '{class_ids}'. Expected one of: {', '.join(CLASS_ID_SCHEMES)}")
+        self.class_ids = class_ids
+        self._is_lab = is_lab_course
+        self.courses = {}       # (subject, dept) key -> course
+        self.faculty = {}       # teacher key -> faculty entry
+        self.rooms = {}         # room key -> room
+        self.allotments = {}    # (course id, faculty id) -> allotment
+        self._class_sets = {}   # (course id, faculty id) -> class ids already in the allotment
+        self._classes = {}      # (dept, semester, section) key -> class id
+        self.rows = 0
+        self.skipped_rows = 0
+
+    def add_csv(self, stream):
+        """Consume an open text stream (see text_stream) row by row."""
+        for row in csv.DictReader(stream):
+            self.add_row(row)
+        return self
+
+    def _class_id(self, dept, semester, section):
+        if self.class_ids == "section":
+            key = (section.lower(),)
+            if key not in self._classes:
+                self._classes[key] = section
+            return self._classes[key]
+        key = (dept.lower(), semester.lower(), section.lower())
+        if key not in self._classes:
+            self._classes[key] = f"{dept}-{semester}-{section.upper()}"
+        return self._classes[key]
+
+    def add_row(self, row):
+        self.rows += 1
+        row = {_clean(k): _clean(v) for k, v in row.items() if k is not None}
+        dept, subject = row.get("Department"), row.get("Subject")
+        if not dept or not subject:
+            self.skipped_rows += 1
+            return
+        semester = row.get("Semester") or "1"
+
+        course_key = (subject.lower(), dept.lower())
+        course = self.courses.get(course_key)
+        if course is None:
+            code = row.get("Course Code") or f"{dept}-{semester}-{subject[:3].upper()}"
+            is_lab = self._is_lab({"code": code, "name": subject})
+            credits = row.get("Credit Hours", "")
+            course = self.courses[course_key] = {
+                "id": f"C{len(self.courses) + 1}",
+                "code": code,
+                "name": subject,
+                "credits": int(credits) if credits.isdigit() else (1 if is_lab else 3),
+                "type": "Core",
+                "semester": semester,
+                "department": dept,
+                "requiresLab": is_lab,
+                "estimatedStudents": ESTIMATED_STUDENTS,
+            }
+
+        room_name = row.get("Room")
+        if room_name:
+            room = self.rooms.get(room_name.lower())
+            if room is None:
+                room = self.rooms[room_name.lower()] = {
+                    "id": room_name, "name": room_name, "capacity": ROOM_CAPACITY, "type": "lecture",
+                }
+            if course["requiresLab"]:
+                room["type"] = "lab"
+
+        teacher = first_teacher(row.get("Teachers"))
+        if teacher is None:
+            return
+        member = self.faculty.get(teacher.lower())
+        if member is None:
+            member = self.faculty[teacher.lower()] = {"id": f"F{len(self.faculty) + 1}", "name": teacher}
+
+        key = (course["id"], member["id"])
+        if key not in self.allotments:
+            self.allotments[key] = {"courseId": course["id"], "facultyId": member["id"], "classIds": []}
+            self._class_sets[key] = set()
+        class_id = self._class_id(dept, semester, row.get("Section") or "A")
+        if class_id not in self._class_sets[key]:
+            self._class_sets[key].add(class_id)
+            self.allotments[key]["classIds"].append(class_id)
+
+    def payload(self):
+        courses, allotments = list(self.courses.values()), list(self.allotments.values())
+        rooms = list(self.rooms.values()) or generated_rooms(*session_demand(courses, allotments))
+        return {
+            "courses": courses,
+            "faculty": list(self.faculty.values()),
+            "rooms": rooms,
+            "allotments": allotments,
+            "existing_timetables": [],
+        }
+
+    def summary(self):
+        return {
+            "rows": self.rows,
+            "skippedRows": self.skipped_rows,
+            "courses": len(self.courses),
+            "labCourses": sum(1 for course in self.courses.values() if course["requiresLab"]),
+            "faculty": len(self.faculty),
+            "classes": len(self._classes),
+            "rooms": len(self.rooms),
+            "allotments": len(self.allotments),
+        }
+
+
+def csv_payload(*paths, class_ids="qualified"):
+    """A /generate payload from one or more Allotments or Plan of Study CSV files (see CsvIngest)."""
+    ingest = CsvIngest(class_ids=class_ids)
+    for path in paths:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            ingest.add_csv(f)
+    return ingest.payload()
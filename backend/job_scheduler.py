@@ -0,0 +1,334 @@
+import atexit
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from job_store import CANCELLED, CANCELLING, COMPLETED, ERROR, FINISHED_STATES, QUEUED
+from solver_config import DEFAULT_NUM_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Concurrency limits; override with TIMETABLE_MAX_JOBS / TIMETABLE_CPU_BUDGET
+CPU_COUNT = os.cpu_count() or 1
+DEFAULT_MAX_JOBS = max(1, CPU_COUNT // DEFAULT_NUM_WORKERS)
+DEFAULT_CPU_BUDGET = CPU_COUNT
+
+# Seconds between checks that every worker process is still alive
+WORKER_CHECK_INTERVAL = 1.0
+
+
+class _ProgressForwarder(dict):
+    """Stands in for a progress record inside a worker; updates go back to the parent."""
+
+    def __init__(self, job_id, events):
+        super().__init__()
+        self._job_id = job_id
+        self._events = events
+
+    def update(self, fields):
+        self._events.put((self._job_id, "progress", dict(fields)))
+
+
+def _warm_up():
+    """Load OR-Tools and run a one-variable solve so the first job does not pay for it."""
+    from ortools.sat.python import cp_model
+
+    model = cp_model.CpModel()
+    model.Maximize(model.NewBoolVar("warm_up"))
+    cp_model.CpSolver().Solve(model)
+
+
+def _worker_main(worker_idx, tasks, events, stop_event, spawned_at):
+    """
+    Worker process loop: solve one job at a time until a None task arrives.
+    Readiness is timed from `spawned_at` in the server, so it includes the
+    interpreter start and the re-import of the main module (app.py).
+    """
+    from solver import generate_timetable
+
+    _warm_up()
+    events.put((None, "ready", (worker_idx, round(time.time() - spawned_at, 3))))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job_id, data = task
+        progress = {job_id: _ProgressForwarder(job_id, events)}
+        try:
+            result = generate_timetable(
+                data, job_id, progress, data.get("existing_timetables", []), stop_event=stop_event
+            )
+            events.put((job_id, "result", result))
+        except Exception as e:
+            logger.error(f"Error during generation: {e}")
+            events.put((job_id, "error", str(e)))
+        events.put((job_id, "idle", worker_idx))
+
+
+class JobScheduler:
+    """
+    Runs generate_timetable jobs in a fixed set of worker processes.
+
+    At most `max_jobs` solves run at once and each gets `cpu_budget // max_jobs`
+    CP-SAT search workers. Waiting jobs sit in a priority queue (higher
+    `priority` first, FIFO within a priority) and report their position.
+    Workers are started on the first submit (or by `prewarm`), import the
+    solver and run a tiny solve before taking jobs, live for the life of the
+    server and are not daemonic, so `decompose` can still fork its own pool.
+    Progress records and results go to `store` (a job_store.JobStore);
+    `on_finish(status, result)` runs for every job that finishes, whatever
+    its outcome. A worker that dies (killed for memory, crashed in native
+    code) fails its job with ERROR and is replaced by a fresh process.
+    """
+
+    def __init__(self, store, max_jobs=None, cpu_budget=None, on_finish=None):
+        self.store = store
+        self.on_finish = on_finish
+        self.max_jobs = max_jobs or int(os.environ.get("TIMETABLE_MAX_JOBS", DEFAULT_MAX_JOBS))
+        self.cpu_budget = cpu_budget or int(os.environ.get("TIMETABLE_CPU_BUDGET", DEFAULT_CPU_BUDGET))
+        self._lock = threading.Lock()
+        self._pending = []                 # heap of (-priority, seq, job_id)
+        self._payloads = {}                # job_id -> data, while queued
+        self._callbacks = {}               # job_id -> on_complete(result)
+        self._seq = itertools.count()
+        self._workers = []                 # (process, task queue, stop event)
+        self._idle = []                    # worker indices ready for a job
+        self._running = {}                 # job_id -> worker index
+        self._ready = {}                   # worker index -> seconds it took to load the solver and warm up
+        self._events = None
+        self._ctx = None
+
+    @property
+    def workers_per_job(self):
+        return max(1, self.cpu_budget // self.max_jobs)
+
+    def _start_worker(self, worker_idx):
+        """Start (or replace) the worker process at `worker_idx` and mark it idle. Caller holds the lock."""
+        tasks = self._ctx.Queue()
+        stop_event = self._ctx.Event()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_idx, tasks, self._events, stop_event, time.time()),
+            name=f"timetable-worker-{worker_idx}",
+        )
+        process.start()
+        if worker_idx < len(self._workers):
+            self._workers[worker_idx] = (process, tasks, stop_event)
+        else:
+            self._workers.append((process, tasks, stop_event))
+        self._idle.append(worker_idx)
+
+    def _start_workers(self):
+        self._ctx = multiprocessing.get_context("spawn")
+        self._events = self._ctx.Queue()
+        for worker_idx in range(self.max_jobs):
+            self._start_worker(worker_idx)
+        threading.Thread(target=self._listen, name="timetable-job-events", daemon=True).start()
+        # Registered after multiprocessing's own exit hook so it runs first and
+        # the workers are told to exit before anything joins them
+        atexit.register(self.shutdown)
+        logger.info(f"Started {self.max_jobs} solver workers, {self.workers_per_job} search workers each")
+
+    def prewarm(self):
+        """Start the workers now instead of on the first submit, so they are warm by the first job."""
+        with self._lock:
+            if not self._workers:
+                self._start_workers()
+
+    def submit(self, job_id, data, priority=0, on_complete=None):
+        """
+        Queue a job; `data["maxWorkers"]` caps its search workers to this job's CPU share.
+        `on_complete(result)` runs on the listener thread once it completes.
+        """
+        data = dict(data)
+        data["maxWorkers"] = min(data.get("maxWorkers") or self.workers_per_job, self.workers_per_job)
+        with self._lock:
+            if not self._workers:
+                self._start_workers()
+            self.store.create(job_id, {
+                "status": QUEUED,
+                "progress": 0,
+                "message": "Waiting for a free solver...",
+                "solutions_found": 0,
+                "best_objective": None,
+                "result": None,
+                "queue_position": None,
+                "submitted_at": time.time(),
+            })
+            self._payloads[job_id] = data
+            if on_complete is not None:
+                self._callbacks[job_id] = on_complete
+            heapq.heappush(self._pending, (-priority, next(self._seq), job_id))
+            self._dispatch()
+            self._update_positions()
+
+    def _dispatch(self):
+        """Hand queued jobs to idle workers. Caller holds the lock."""
+        while self._pending and self._idle:
+            _, _, job_id = heapq.heappop(self._pending)
+            worker_idx = self._idle.pop()
+            _, tasks, stop_event = self._workers[worker_idx]
+            stop_event.clear()
+            self._running[job_id] = worker_idx
+            self.store.update(job_id, {
+                "status": "initializing",
+                "message": "Setting up solver...",
+                "queue_position": None,
+            })
+            tasks.put((job_id, self._payloads.pop(job_id)))
+
+    def stats(self):
+        """Queue and worker counts for /metrics."""
+        with self._lock:
+            return {"queued": len(self._pending), "running": len(self._running), "workers": self.max_jobs,
+                    "ready": len(self._ready)}
+
+    def startup_stats(self):
+        """Worker readiness for /health: how many are warmed up and how long each took."""
+        with self._lock:
+            return {
+                "started": bool(self._workers),
+                "workers": self.max_jobs,
+                "ready": len(self._ready),
+                "warmUpSeconds": [self._ready[worker_idx] for worker_idx in sorted(self._ready)],
+            }
+
+    def _update_positions(self):
+        for position, (_, _, job_id) in enumerate(sorted(self._pending), start=1):
+            self.store.update(job_id, {"queue_position": position})
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs are dropped right away; running jobs get
+        their search stopped and finish as "cancelled" with the best
+        timetable found so far. Returns the job record, or None if unknown.
+        """
+        with self._lock:
+            record = self.store.get(job_id)
+            if record is None or record["status"] in FINISHED_STATES:
+                return record
+            if job_id in self._payloads:
+                self._callbacks.pop(job_id, None)
+                self._pending = [item for item in self._pending if item[2] != job_id]
+                heapq.heapify(self._pending)
+                del self._payloads[job_id]
+                self.store.finish(job_id, {"status": CANCELLED, "message": "Cancelled before it started", "queue_position": None})
+                self._update_positions()
+                if self.on_finish is not None:
+                    self.on_finish(CANCELLED, None)
+            elif job_id in self._running:
+                self._workers[self._running[job_id]][2].set()
+                self.store.update(job_id, {"status": CANCELLING, "message": "Stopping solver..."})
+            return self.store.get(job_id)
+
+    def _check_workers(self):
+        """
+        Replace worker processes that died without reporting back, failing
+        the job each was running. Caller holds the lock. Returns the ERROR
+        outcomes to pass to on_finish once the lock is released.
+        """
+        failed = []
+        for worker_idx, (process, _, _) in enumerate(self._workers):
+            if process.is_alive():
+                continue
+            job_id = next((job for job, idx in self._running.items() if idx == worker_idx), None)
+            logger.error(f"Solver worker {worker_idx} exited with code {process.exitcode}; starting a new one")
+            if job_id is not None:
+                del self._running[job_id]
+                self._callbacks.pop(job_id, None)
+                record = self.store.get(job_id)
+                if record is not None and record["status"] not in FINISHED_STATES:
+                    message = f"Solver process exited unexpectedly (exit code {process.exitcode})"
+                    self.store.finish(job_id, {"status": ERROR, "message": message},
+                                      {"success": False, "message": message})
+                    failed.append((ERROR, None))
+            if worker_idx in self._idle:
+                self._idle.remove(worker_idx)
+            self._ready.pop(worker_idx, None)
+            self._start_worker(worker_idx)
+        if failed or self._idle:
+            self._dispatch()
+            self._update_positions()
+        return failed
+
+    def _listen(self):
+        last_check = time.time()
+        while True:
+            failed = []
+            try:
+                job_id, kind, payload = self._events.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                kind = None
+            if kind is None or time.time() - last_check >= WORKER_CHECK_INTERVAL:
+                with self._lock:
+                    failed = self._check_workers()
+                last_check = time.time()
+            if self.on_finish is not None:
+                for outcome in failed:
+                    self.on_finish(*outcome)
+            if kind is None:
+                continue
+
+            on_complete = None
+            finished = None
+            with self._lock:
+                if kind == "ready":
+                    worker_idx, seconds = payload
+                    self._ready[worker_idx] = seconds
+                    logger.info(f"Solver worker {worker_idx} ready after {seconds}s")
+                    continue
+                if kind == "idle":
+                    # A replaced worker's last events can arrive after its successor took a job
+                    if self._running.get(job_id) == payload:
+                        del self._running[job_id]
+                    if payload not in self._idle and payload not in self._running.values():
+                        self._idle.append(payload)
+                    self._dispatch()
+                    self._update_positions()
+                    continue
+                record = self.store.get(job_id)
+                if record is None or record["status"] in FINISHED_STATES:
+                    continue
+                if kind == "progress":
+                    # Keep showing "cancelling" until the worker reports back
+                    if record["status"] != CANCELLING:
+                        self.store.update(job_id, payload)
+                elif kind == "result":
+                    cancelled = record["status"] == CANCELLING
+                    self.store.finish(job_id, {
+                        "status": CANCELLED if cancelled else COMPLETED,
+                        "progress": 100,
+                        "message": "Generation cancelled; returning the best timetable found" if cancelled
+                                   else "Generation completed!",
+                    }, payload)
+                    on_complete = self._callbacks.pop(job_id, None) if not cancelled else None
+                    self._callbacks.pop(job_id, None)
+                    finished = (CANCELLED if cancelled else COMPLETED, payload)
+                elif kind == "error":
+                    self._callbacks.pop(job_id, None)
+                    self.store.finish(job_id, {"status": ERROR, "message": payload},
+                                      {"success": False, "message": payload})
+                    finished = (ERROR, None)
+            if on_complete is not None:
+                on_complete(payload)
+            if finished is not None and self.on_finish is not None:
+                self.on_finish(*finished)
+
+    def shutdown(self):
+        """Stop running searches and let the worker processes exit."""
+        with self._lock:
+            for process, tasks, stop_event in self._workers:
+                stop_event.set()
+                tasks.put(None)
+            for process, _, _ in self._workers:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self._workers = []
+            self._ready = {}
@@ -0,0 +1,245 @@
+import collections
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+# Finished jobs are forgotten after this many seconds; override with TIMETABLE_JOB_TTL
+DEFAULT_JOB_TTL = 7 * 24 * 3600
+
+# SQLite file, by default in this app's per-user data directory (see
+# default_job_db). Override with TIMETABLE_JOB_DB (":memory:" keeps nothing
+# across restarts); every server instance on a host needs its own file.
+APP_DATA_NAME = "University Timetable Dashboard"
+JOB_DB_NAME = "jobs.sqlite3"
+
+# How often expired rows are purged, in seconds
+PURGE_INTERVAL = 600
+
+# Progress events kept per live job for /generation-stream clients that fall behind
+EVENT_BACKLOG = 256
+
+# Job states reported in /generation-status
+QUEUED = "queued"
+CANCELLING = "cancelling"
+CANCELLED = "cancelled"
+COMPLETED = "completed"
+ERROR = "error"
+FINISHED_STATES = (COMPLETED, ERROR, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    result BLOB,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def default_job_db():
+    """JOB_DB_NAME in the per-user data directory of the app, created if missing."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    directory = os.path.join(base, APP_DATA_NAME)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, JOB_DB_NAME)
+
+
+def _lock_file(path):
+    """
+    Open `path` and take an exclusive, non-blocking lock on it for as long as
+    the returned file stays open. Raises OSError if another process holds it.
+    """
+    handle = open(path, "a+b")
+    handle.seek(0)
+    try:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        raise
+    return handle
+
+
+class JobStore:
+    """
+    Progress records and results of generation jobs.
+
+    Queued and running jobs live in memory, since they are polled often and
+    updated on every solution. Once a job finishes its record is written to
+    SQLite next to its zlib-compressed result and dropped from memory, so a
+    status poll reads one small row and the timetable is only decompressed
+    when it is asked for. Rows older than `ttl` are purged.
+
+    Every update of a live job is also published as a numbered event for
+    the /generation-stream endpoint, together with the best solution so far
+    when the solver streams solution diffs.
+
+    A store owns its file: it takes a lock next to it ("<path>.lock") and
+    raises RuntimeError if another process already holds it, since opening
+    the store marks every unfinished job in the file as abandoned.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.environ.get("TIMETABLE_JOB_DB") or default_job_db()
+        self.ttl = ttl or int(os.environ.get("TIMETABLE_JOB_TTL", DEFAULT_JOB_TTL))
+        self._live = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._events = {}      # job_id -> deque of (seq, kind, payload)
+        self._solutions = {}   # job_id -> set of (session id, room id, slot id)
+        self._owner_lock = None
+        if self.path != ":memory:":
+            try:
+                self._owner_lock = _lock_file(self.path + ".lock")
+            except OSError:
+                raise RuntimeError(
+                    f"Job store {self.path} is in use by another server; "
+                    f"give each instance its own file with TIMETABLE_JOB_DB"
+                ) from None
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(_SCHEMA)
+        self._last_purge = 0
+        self._abandon_unfinished()
+
+    def _abandon_unfinished(self):
+        # Jobs that were queued or running when the server stopped cannot resume
+        rows = self._db.execute("SELECT id, record FROM jobs").fetchall()
+        for job_id, encoded in rows:
+            record = json.loads(encoded)
+            if record.get("status") not in FINISHED_STATES:
+                record.update({"status": ERROR, "message": "Server restarted before the job finished"})
+                self._db.execute("UPDATE jobs SET record = ? WHERE id = ?", (json.dumps(record), job_id))
+        self._db.commit()
+
+    def create(self, job_id, record):
+        with self._lock:
+            self._live[job_id] = dict(record)
+            # The row lets another process (or a restart) see the job exists
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, record, result, updated_at) VALUES (?, ?, NULL, ?)",
+                (job_id, json.dumps(record), time.time()),
+            )
+            self._db.commit()
+            self._purge_expired()
+
+    def update(self, job_id, fields):
+        """
+        Merge `fields` into a live job's record and publish it as an event.
+        A `solution_diff` field is applied to the job's best solution and
+        sent with the event instead of being stored. Finished jobs are left alone.
+        """
+        with self._lock:
+            record = self._live.get(job_id)
+            if record is None:
+                return
+            fields = dict(fields)
+            diff = fields.pop("solution_diff", None)
+            record.update(fields)
+            event = dict(record)
+            if diff is not None:
+                solution = self._solutions.setdefault(job_id, set())
+                solution.difference_update(tuple(p) for p in diff["removed"])
+                solution.update(tuple(p) for p in diff["added"])
+                event["solution_diff"] = diff
+            self._publish(job_id, "progress", event)
+
+    def _publish(self, job_id, kind, payload):
+        events = self._events.setdefault(job_id, collections.deque(maxlen=EVENT_BACKLOG))
+        seq = events[-1][0] + 1 if events else 1
+        events.append((seq, kind, payload))
+        self._changed.notify_all()
+
+    def wait_events(self, job_id, after_seq, timeout):
+        """
+        Events of a job newer than `after_seq`, waiting up to `timeout`
+        seconds for one to arrive. A client that is new or missed events
+        first gets a "snapshot" of the best solution so far. Once the job has
+        finished, a single "done" event with the final record and result is
+        returned. Returns (events, finished); events are (seq, kind, payload).
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._live
+                or (self._events.get(job_id) and self._events[job_id][-1][0] > after_seq),
+                timeout,
+            )
+            if job_id in self._live:
+                events = self._events.get(job_id, ())
+                fresh = [event for event in events if event[0] > after_seq]
+                missed = fresh and fresh[0][0] > after_seq + 1
+                if fresh and job_id in self._solutions and (after_seq == 0 or missed):
+                    # The snapshot already includes every diff up to the latest event
+                    snapshot = dict(self._live[job_id])
+                    snapshot["solution"] = sorted(self._solutions[job_id], key=str)
+                    return [(fresh[-1][0], "snapshot", snapshot)], False
+                return fresh, False
+            record = self._load_record(job_id)
+        if record is None:
+            return [], True
+        record["result"] = self.get_result(job_id)
+        return [(after_seq + 1, "done", record)], True
+
+    def finish(self, job_id, fields, result=None):
+        """Persist the final record and result and drop the job from memory."""
+        with self._lock:
+            record = self._live.pop(job_id, None)
+            self._events.pop(job_id, None)
+            self._solutions.pop(job_id, None)
+            self._changed.notify_all()
+            if record is None:
+                record = self._load_record(job_id) or {}
+            record.update(fields)
+            record["result"] = None
+            blob = zlib.compress(json.dumps(result).encode("utf-8")) if result is not None else None
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, record, result, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, json.dumps(record), blob, time.time()),
+            )
+            self._db.commit()
+
+    def get(self, job_id):
+        """Copy of the job's progress record without its result, or None."""
+        with self._lock:
+            record = self._live.get(job_id)
+            if record is not None:
+                return dict(record)
+            return self._load_record(job_id)
+
+    def get_result(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def _load_record(self, job_id):
+        row = self._db.execute("SELECT record FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        expired = [
+            job_id for (job_id,) in self._db.execute(
+                "SELECT id FROM jobs WHERE updated_at < ?", (now - self.ttl,)
+            )
+            if job_id not in self._live
+        ]
+        self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        self._db.commit()
@@ -0,0 +1,347 @@
+# The Flask server and its state: job store, scheduler, caches and metrics.
+# Run it through app.py. Solver workers are spawned processes that re-import
+# the main module, and app.py keeps that import free of server state.
+import time
+
+# Taken before the imports below, for the startup times reported by /health
+STARTED_AT = time.time()
+
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask_cors import CORS
+from job_scheduler import JobScheduler
+from job_store import FINISHED_STATES, JobStore
+from solver_cache import ResultCache, is_cacheable, payload_fingerprint
+from solver_metrics import MetricsRegistry
+import gzip
+import json
+import os
+import logging
+import threading
+import uuid
+
+# The solver modules pull in OR-Tools' CP-SAT wrapper and numpy, which takes
+# seconds in the packaged app. They are imported inside the routes that need
+# them and loaded on a background thread at startup, so /health answers right
+# away.
+SOLVER_MODULES = ('solver', 'solver_validate', 'solver_repair', 'solver_scenarios')
+
+app = Flask(__name__)
+CORS(app)  # Enable CORS for all routes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job progress and results; SQLite-backed with TTL eviction (TIMETABLE_JOB_DB, TIMETABLE_JOB_TTL)
+job_store = JobStore()
+
+# Prometheus metrics for /metrics, fed with the profile of every finished job
+metrics = MetricsRegistry()
+
+# Solves run in worker processes; TIMETABLE_MAX_JOBS and TIMETABLE_CPU_BUDGET bound them
+scheduler = JobScheduler(job_store, on_finish=metrics.observe_job)
+
+# Solved results keyed by payload fingerprint; set TIMETABLE_CACHE_DIR to keep them across restarts
+cache_dir = os.environ.get('TIMETABLE_CACHE_DIR')
+result_cache = ResultCache(directory=cache_dir)
+
+# Payloads built by /ingest, keyed by fingerprint (under TIMETABLE_CACHE_DIR/ingest when set)
+ingested_payloads = ResultCache(directory=os.path.join(cache_dir, 'ingest') if cache_dir else None)
+
+# Seconds from process start until the app was importable and until the solver was loaded
+startup_times = {"app": None, "solver": None, "solverError": None}
+
+def load_solver_modules():
+    """Import SOLVER_MODULES so the first solver-backed request does not wait for them."""
+    try:
+        for module in SOLVER_MODULES:
+            __import__(module)
+        startup_times["solver"] = round(time.time() - STARTED_AT, 3)
+        logger.info(f"Solver modules loaded {startup_times['solver']}s after start")
+    except Exception as e:
+        startup_times["solverError"] = str(e)
+        logger.error(f"Error loading solver modules: {e}")
+
+# JSON bodies at least this large are gzip-compressed for clients that accept it
+GZIP_MIN_BYTES = 1024
+
+def json_response(payload, status=200):
+    """Like jsonify, but compact and gzip-compressed when the client sends Accept-Encoding: gzip."""
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """
+    Liveness plus startup progress: seconds from process start until the
+    app and the solver modules were loaded, and the solver workers that are
+    warmed up. Healthy as soon as the app answers, before the solver loads.
+    """
+    return jsonify({
+        "status": "healthy",
+        "service": "timetable-solver",
+        "uptimeSeconds": round(time.time() - STARTED_AT, 3),
+        "startup": {
+            "appSeconds": startup_times["app"],
+            "solverLoaded": startup_times["solver"] is not None,
+            "solverSeconds": startup_times["solver"],
+            "solverError": startup_times["solverError"],
+            "workers": scheduler.startup_stats(),
+        },
+    })
+
+def with_ingested(data):
+    """
+    Expand `data["ingestId"]` into the payload /ingest stored under it.
+    Keys sent with the request (settings, existing_timetables, rooms, ...)
+    override the stored ones.
+    """
+    ingest_id = data.get('ingestId')
+    if not ingest_id:
+        return data
+    payload = ingested_payloads.get(ingest_id)
+    if payload is None:
+        raise ValueError(f"Unknown ingestId '{ingest_id}'; upload the CSV files to /ingest again")
+    payload.update((key, value) for key, value in data.items() if key != 'ingestId')
+    return payload
+
+def start_generation(data):
+    """
+    Register a progress entry and queue generate_timetable on the job
+    scheduler. Identical payloads are answered from result_cache right away.
+    Returns (session_id, status).
+    """
+    session_id = str(uuid.uuid4())
+    cache_key = payload_fingerprint(data)
+
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        cached["statistics"]["cached"] = True
+        metrics.inc("timetable_cache_hits_total")
+        job_store.finish(session_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": "Loaded identical timetable from cache",
+            "solutions_found": 0,
+            "best_objective": None,
+        }, cached)
+        return session_id, "completed"
+
+    def remember(result):
+        if is_cacheable(result):
+            result_cache.put(cache_key, result)
+
+    # Higher "priority" values are solved first when every solver is busy
+    scheduler.submit(session_id, data, priority=int(data.get('priority') or 0), on_complete=remember)
+    return session_id, job_store.get(session_id)["status"]
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    try:
+        data = with_ingested(request.json)
+        session_id, status = start_generation(data)
+        logger.info(f"Received generation request for {len(data.get('courses', []))} courses (session: {session_id})")
+        return jsonify({
+            "session_id": session_id,
+            "status": status,
+            "queue_position": job_store.get(session_id).get("queue_position")
+        })
+    except Exception as e:
+        logger.error(f"Error starting generation: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/repair', methods=['POST'])
+def repair():
+    """
+    Re-optimize a previous timetable after a small change. Takes the previous
+    payload plus `previousTimetable`, `delta` and `radius` (see
+    solver_repair.apply_repair_delta); progress is polled like /generate.
+    """
+    from solver_repair import apply_repair_delta
+
+    try:
+        data = apply_repair_delta(with_ingested(request.json))
+        session_id, status = start_generation(data)
+        logger.info(f"Received repair request for {len(data['repair']['previousTimetable'])} entries (session: {session_id})")
+        return jsonify({"session_id": session_id, "status": status})
+    except Exception as e:
+        logger.error(f"Error starting repair: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/scenarios', methods=['POST'])
+def scenarios():
+    """
+    Solve a base payload and what-if variants of it in one job. Takes the
+    usual /generate payload plus `scenarios`, a list of {name, delta} (see
+    solver_scenarios.py); the result carries the base timetable and, per
+    scenario, its result and a diff against the base.
+    """
+    from solver_scenarios import check_scenarios
+
+    try:
+        data = with_ingested(request.json)
+        check_scenarios(data)
+        session_id, status = start_generation(data)
+        logger.info(f"Received scenario request with {len(data['scenarios'])} scenarios (session: {session_id})")
+        return jsonify({"session_id": session_id, "status": status})
+    except Exception as e:
+        logger.error(f"Error starting scenarios: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """
+    Build a /generate payload from Allotments or Plan of Study CSVs, read
+    row by row (see csv_ingest.CsvIngest). Takes any number of uploaded
+    files (multipart/form-data) or one CSV as the raw request body. Returns
+    an `ingestId` that /generate, /repair and /scenarios accept in place of
+    courses, faculty, rooms and allotments, and the ingest counts;
+    `?include=payload` returns the payload as well. `?classIds=section`
+    uses the frontend importer's class ids instead of
+    "<dept>-<semester>-<section>".
+    """
+    from csv_ingest import CsvIngest, text_stream
+
+    try:
+        ingest = CsvIngest(class_ids=request.args.get('classIds', 'qualified'))
+        uploads = [upload for key in request.files for upload in request.files.getlist(key)]
+        for upload in uploads:
+            ingest.add_csv(text_stream(upload.stream))
+        if not uploads:
+            ingest.add_csv(text_stream(request.stream))
+        payload = ingest.payload()
+        ingest_id = payload_fingerprint(payload)
+        ingested_payloads.put(ingest_id, payload)
+        logger.info(f"Ingested {ingest.rows} CSV rows into {len(payload['allotments'])} allotments ({ingest_id[:12]})")
+        response = {"ingestId": ingest_id, "summary": ingest.summary()}
+        if request.args.get('include') == 'payload':
+            response["payload"] = payload
+        return json_response(response)
+    except Exception as e:
+        logger.error(f"Error ingesting CSV: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/ingest/<ingest_id>', methods=['GET'])
+def get_ingested(ingest_id):
+    payload = ingested_payloads.get(ingest_id)
+    if payload is None:
+        return jsonify({"error": "Ingest not found"}), 404
+    return json_response(payload)
+
+@app.route('/validate', methods=['POST'])
+def validate():
+    """
+    Check edited timetable entries for conflicts without solving. Takes
+    `entries`, optional `existing_timetables`, `courses` and `timeGrid` (see
+    solver_validate.validate_timetable); returns `valid` and `conflicts`.
+    """
+    from solver_validate import validate_timetable
+
+    try:
+        data = request.json
+        result = validate_timetable(
+            data.get('entries', []),
+            data.get('existing_timetables', []),
+            data.get('courses'),
+            data.get('timeGrid'),
+        )
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error validating timetable: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/generation-status/<session_id>', methods=['GET'])
+def get_generation_status(session_id):
+    progress_data = job_store.get(session_id)
+    if progress_data is None:
+        return jsonify({"error": "Session not found"}), 404
+
+    # Results are stored compressed and only loaded once the job is done
+    if progress_data["status"] in FINISHED_STATES:
+        progress_data["result"] = job_store.get_result(session_id)
+    return json_response(progress_data)
+
+# Seconds between keep-alive comments on an idle event stream
+STREAM_HEARTBEAT = 15
+
+@app.route('/generation-stream/<session_id>', methods=['GET'])
+def stream_generation(session_id):
+    """
+    Server-Sent Events alternative to polling /generation-status. Sends a
+    "progress" event per update (objective, best_bound, gap and, with
+    "streamSolutions" in the payload, a solution_diff of added/removed
+    [sessionId, roomId, slotId] placements), a "snapshot" of the best
+    solution so far to new or lagging clients, and a final "done" event
+    carrying the result. Reconnecting clients resume from Last-Event-ID.
+    """
+    if job_store.get(session_id) is None:
+        return jsonify({"error": "Session not found"}), 404
+    last_seq = int(request.headers.get('Last-Event-ID') or 0)
+
+    def events():
+        seq = last_seq
+        while True:
+            batch, finished = job_store.wait_events(session_id, seq, STREAM_HEARTBEAT)
+            if not batch and not finished:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, kind, payload in batch:
+                yield f"id: {seq}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n"
+            if finished:
+                return
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/generation-profile/<session_id>', methods=['GET'])
+def get_generation_profile(session_id):
+    """Phase durations, logged counts, CP-SAT search statistics and peak RSS of a finished job."""
+    progress_data = job_store.get(session_id)
+    if progress_data is None:
+        return jsonify({"error": "Session not found"}), 404
+    if progress_data["status"] not in FINISHED_STATES:
+        return jsonify({"error": "Job has not finished", "status": progress_data["status"]}), 409
+    result = job_store.get_result(session_id) or {}
+    profile = (result.get("statistics") or {}).get("profile")
+    if profile is None:
+        return jsonify({"error": "No profile recorded for this job"}), 404
+    return json_response({"session_id": session_id, "status": progress_data["status"], "profile": profile})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Job, phase and CP-SAT metrics in the Prometheus text format."""
+    queue = scheduler.stats()
+    text = metrics.render(gauges={
+        "timetable_jobs_queued": queue["queued"],
+        "timetable_jobs_running": queue["running"],
+        "timetable_solver_workers": queue["workers"],
+    })
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/generation/<session_id>', methods=['DELETE'])
+def cancel_generation(session_id):
+    """Cancel a queued or running generation; a running one keeps its best timetable so far."""
+    record = scheduler.cancel(session_id)
+    if record is None:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"session_id": session_id, "status": record["status"]})
+
+startup_times["app"] = round(time.time() - STARTED_AT, 3)
+
+def main():
+    """Run the server (see app.py, the entry point)."""
+    # Load the solver behind the running server; TIMETABLE_PREWARM=0 leaves
+    # the solver workers to start on the first job instead of right away
+    threading.Thread(target=load_solver_modules, name="timetable-solver-import", daemon=True).start()
+    if os.environ.get('TIMETABLE_PREWARM', '1') != '0':
+        scheduler.prewarm()
+    logger.info(f"App loaded {startup_times['app']}s after start")
+
+    app.run(host='0.0.0.0', port=5000, debug=False)
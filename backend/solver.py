@@ -1,16 +1,35 @@
 from ortools.sat.python import cp_model
+import numpy as np
 import logging
 import collections
-import uuid
+import copy
 import re
+import threading
 import time
 
+# Solver budgets and profiles live in solver_config.py
+from solver_config import (
+    DEFAULT_TIME_LIMIT,
+    TimeGrid,
+    problem_statistics,
+    resolve_solver_settings,
+)
+# Structured per-job profile behind the log lines (see solver_metrics.py)
+from solver_metrics import (
+    JobProfile,
+    profiling,
+    record_count,
+    record_phase,
+    record_search,
+    solver_response_statistics,
+)
+
 logger = logging.getLogger(__name__)
 
 # ANSI color codes for beautiful terminal output (bright variants for dark terminals)
 class Colors:
     HEADER = '\033[95m'      # Bright Magenta
-    BLUE = '\033[94m'        # Bright Blue  
+    BLUE = '\033[94m'        # Bright Blue
     CYAN = '\033[96m'        # Bright Cyan
     GREEN = '\033[92m'       # Bright Green
     YELLOW = '\033[93m'      # Bright Yellow
@@ -27,162 +46,387 @@ def log_phase(phase_name):
 
 def log_stat(label, value, color=Colors.WHITE):
     """Log a statistic"""
+    record_count(label, value)
     logger.info(f"{color}  ✓ {label}: {Colors.BOLD}{value}{Colors.ENDC}")
 
 def log_progress(message, color=Colors.WHITE):
     """Log progress update"""
     logger.info(f"{color}  ⚙ {message}{Colors.ENDC}")
 
+def log_timing(label, started):
+    """Log the wall time elapsed since `started`"""
+    elapsed = time.time() - started
+    record_phase(label, elapsed)
+    log_stat(label, f"{elapsed:.2f}s", Colors.CYAN)
+
+
+# Solver engines selectable per request through the "engine" payload key
+ENGINES = ("boolean", "interval")
+
+# Solve strategies selectable per request through the "mode" payload key
+MODES = ("optimal", "two_stage", "fast")
+
+# Objective formulations selectable per request through the "objective" payload key
+OBJECTIVES = ("weighted", "lexicographic")
+
+# Shapes of result["timetable"] selectable through the "responseFormat" payload key
+RESPONSE_FORMATS = ("entries", "normalized")
+
+# Lexicographic objective: share of the time budget given to stage 1 (assignment)
+LEXICOGRAPHIC_ASSIGNMENT_SHARE = 0.3
+
+# Warm start: seconds CP-SAT may take to fill in the variables the greedy hint
+# leaves open, at most this share of the solve budget, which pays for it. Large
+# models (LIGHT_PRESOLVE_VARIABLES and up) skip the completion on budgets below
+# HINT_COMPLETION_MIN_BUDGET (drafts); on small ones it takes a fraction of a second.
+HINT_COMPLETION_TIME_LIMIT = 30
+HINT_COMPLETION_SHARE = 0.2
+HINT_COMPLETION_MIN_BUDGET = 30
+
+# Once the warm start is complete, models at least this large or budgets
+# below this many seconds get a light presolve (see solver_config), so the
+# hint is not held back behind a presolve that eats most of the budget
+LIGHT_PRESOLVE_VARIABLES = 200_000
+LIGHT_PRESOLVE_TIME_LIMIT = 60
+
+# statistics.search.status when CP-SAT found no solution and the warm-start schedule is returned
+WARM_START_STATUS = "WARM_START_FALLBACK"
 
-def generate_timetable(data, session_id=None, progress_dict=None, existing_timetables=None):
+# Objective weights shared by every engine
+UNASSIGNED_PENALTY = 100_000
+NO_ROOM_PENALTY = 1_000_000
+# Repair mode: cost of moving a session away from its previous placement.
+# Above any slot cost, below leaving a session unassigned.
+MOVE_PENALTY = 20_000
+
+
+class VariableIndex:
     """
-    Solves the timetable scheduling problem using Google OR-Tools CP-SAT solver.
-    WARNING: This is slow (30-45 minutes) but finds optimal solutions.
+    Buckets of placement variables, filled once while the variables are created.
+    Every constraint family reads its terms straight from a bucket instead of
+    re-scanning all sessions x rooms x slots.
     """
 
-    # -----------------------------
-    # Progress Helper
-    # -----------------------------
-    def update_progress(status, progress, message, solutions=0, objective=None):
-        if progress_dict and session_id:
-            progress_dict[session_id].update({
-                "status": status,
-                "progress": progress,
-                "message": message,
-                "solutions_found": solutions,
-                "best_objective": objective
-            })
+    def __init__(self):
+        self.room_slot = collections.defaultdict(list)     # (r_idx, t_idx) -> vars occupying the slot
+        self.faculty_slot = collections.defaultdict(list)  # (faculty_id, t_idx) -> vars occupying the slot
+        self.class_slot = collections.defaultdict(list)    # (class_id, t_idx) -> vars occupying the slot
+        self.class_start = collections.defaultdict(list)   # (class_id, t_idx) -> vars starting in the slot
+        self.class_day = collections.defaultdict(list)     # (class_id, day_idx) -> vars starting that day
+        self.class_labs = collections.defaultdict(list)    # class_id -> lab vars
+        self.class_ids = {}                                 # class ids in first-seen order
 
-    update_progress("processing", 5, "Parsing input data...")
-    
-    # Start overall timer
-    start_time = time.time()
+    def add(self, var, session, r_idx, t_idx, day_idx):
+        """Register a placement literal. `r_idx` is None for room-less (slot only) placements."""
+        for dt in range(session["duration"]):
+            if r_idx is not None:
+                self.room_slot[(r_idx, t_idx + dt)].append(var)
+            self.faculty_slot[(session["facultyId"], t_idx + dt)].append(var)
+            self.class_slot[(session["classId"], t_idx + dt)].append(var)
+
+        self.add_start(var, session, t_idx, day_idx)
+
+    def add_start(self, var, session, t_idx, day_idx):
+        """Register a literal that is true when `session` starts in slot `t_idx`."""
+        class_id = session["classId"]
+        self.class_ids.setdefault(class_id, None)
+
+        self.class_start[(class_id, t_idx)].append(var)
+        self.class_day[(class_id, day_idx)].append(var)
+        if session["isLab"]:
+            self.class_labs[class_id].append(var)
+
+
+class TimetableProblem:
+    """Parsed input shared by every engine: lookup maps, slot grid, sessions and pre-booked slots."""
+
+    def __init__(self, courses, faculty, rooms, allotments):
+        self.courses = courses
+        self.faculty = faculty
+        self.rooms = rooms
+        self.allotments = allotments
+
+        self.course_map = {c["id"]: c for c in courses}
+        self.faculty_map = {f["id"]: f for f in faculty}
+        self.room_map = {r["id"]: r for r in rooms}
+        self.room_index = {r["id"]: r_idx for r_idx, r in enumerate(rooms)}
+
+        self.faculty_busy = collections.defaultdict(set)  # {faculty_id: {slot_index}}
+        self.room_busy = collections.defaultdict(set)      # {room_id: {slot_index}}
+
+        self.grid = None             # solver_config.TimeGrid; the fields below are views of it
+        self.days = []
+        self.all_time_slots = []
+        self.slot_lookup = {}        # (day, startTime) -> t_idx
+        self.num_slots = 0
+        self.slots_per_day = 0
+        self.slot_costs = []
+
+        self.sessions = []
+        self.compatible_rooms = []   # per session: list of r_idx, filled by find_compatible_rooms
+        self.domains = None          # solver_domains.PlacementDomains, set before a CP-SAT model is built
+        self.conflicts = []
+
+        # Repair mode (see solver_repair.py): sessions restricted to one placement,
+        # and previous placements the solver should keep where it can
+        self.pinned = {}             # s_idx -> (r_idx, t_idx)
+        self.preferred = {}          # s_idx -> (r_idx, t_idx)
+
+
+class TimetableModel:
+    """
+    A built CP-SAT model together with what the shared solve and output stages
+    need from it. Engines fill `model`, `is_assigned` and implement `placements`.
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.model = cp_model.CpModel()
+        self.is_assigned = {}
+        self.objective_terms = []
+        # Filled by solve_model: wall-clock time of the first CP-SAT solution
+        # and the number of improving solutions over every solve of the model
+        self.first_solution_at = None
+        self.solutions_found = 0
+        self._literal_arrays = {}
+
+    def placements(self, value):
+        """Return (s_idx, r_idx, t_idx) for every scheduled session, reading literals through `value`."""
+        raise NotImplementedError
+
+    def solution_placements(self, solver):
+        """
+        placements() of a finished solve, read from the response's solution
+        array in one call instead of one solver.Value call per variable.
+        """
+        values = np.asarray(solver.ResponseProto().solution, dtype=np.int64)
+        return self.placements_from_values(values)
+
+    def placements_from_values(self, values):
+        """placements() with `values` indexed by variable index; engines with large literal maps vectorize this."""
+        return self.placements(lambda var: int(values[var.Index()]))
+
+    def _selected_keys(self, literals, values):
+        """Keys of a {key: BoolVar} map whose variable is 1 in `values`, selected with numpy."""
+        cached = self._literal_arrays.get(id(literals))
+        if cached is None or len(cached[0]) != len(literals):
+            keys = list(literals)
+            indices = np.fromiter((var.Index() for var in literals.values()), dtype=np.int64, count=len(keys))
+            cached = self._literal_arrays[id(literals)] = (keys, indices)
+        keys, indices = cached
+        if not len(values):
+            return []
+        return [keys[i] for i in np.flatnonzero(values[indices] == 1)]
+
+    def add_hints(self, placements):
+        """Hint a complete solution built from (s_idx, r_idx, t_idx) placements, e.g. the greedy schedule."""
+        raise NotImplementedError
+
+    def placement_literals(self, s_idx, r_idx, t_idx):
+        """Literals whose conjunction means `s_idx` sits in room `r_idx` at slot `t_idx` ([] if impossible)."""
+        raise NotImplementedError
+
+    def complete_hints(self, time_limit=HINT_COMPLETION_TIME_LIMIT):
+        """
+        Extend the hint set by add_hints to every variable of the model:
+        interval starts of unplaced sessions, class-limit and symmetry
+        literals, objective terms. CP-SAT only starts from a hint that is
+        complete, so a solve with the hinted variables fixed fills in the
+        rest and its solution becomes the hint. Returns that solution's
+        objective, or None if the hint could not be completed (it is then
+        left as it was).
+        """
+        solver = cp_model.CpSolver()
+        solver.parameters.fix_variables_to_their_hinted_value = True
+        solver.parameters.max_time_in_seconds = time_limit
+        solver.parameters.num_search_workers = 1
+        status = solver.Solve(self.model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            logger.warning(f"Warm start could not be completed: {solver.StatusName(status)}")
+            return None
+        values = list(solver.ResponseProto().solution)
+        self.model.ClearHints()
+        hint = self.model.Proto().solution_hint
+        hint.vars.extend(range(len(values)))
+        hint.values.extend(values)
+        return solver.ObjectiveValue()
+
+    def slot_starts(self, s_idx):
+        """{t_idx: 0/1 expression that is 1 when `s_idx` starts at `t_idx`}."""
+        raise NotImplementedError
+
+    def assigned_count(self):
+        return sum(self.is_assigned.values())
+
+    def placement_cost(self):
+        """
+        The weighted objective without its penalties: the (1 - is_assigned) *
+        UNASSIGNED_PENALTY terms cancel against the added sum and the constant
+        offset removes them and the NO_ROOM_PENALTY constants, leaving slot
+        costs and repair move penalties. Without the offset the relative gap
+        limit would be met long before the slot costs are optimised.
+        """
+        with_rooms = sum(1 for s_idx in self.is_assigned if self.problem.compatible_rooms[s_idx])
+        offset = UNASSIGNED_PENALTY * with_rooms + NO_ROOM_PENALTY * (len(self.is_assigned) - with_rooms)
+        return sum(self.objective_terms) + UNASSIGNED_PENALTY * self.assigned_count() - offset
+
+
+class BooleanTimetableModel(TimetableModel):
+    """One Boolean per session x compatible room x start slot."""
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.x = {}
+        self._by_session = None
+
+    def placements(self, value):
+        return [key for key, var in self.x.items() if value(var) == 1]
+
+    def placements_from_values(self, values):
+        return self._selected_keys(self.x, values)
+
+    def slot_starts(self, s_idx):
+        if self._by_session is None:
+            self._by_session = collections.defaultdict(lambda: collections.defaultdict(list))
+            for (s, _, t_idx), var in self.x.items():
+                self._by_session[s][t_idx].append(var)
+        return {t_idx: sum(vars_at) for t_idx, vars_at in self._by_session[s_idx].items()}
+
+    def add_hints(self, placements):
+        chosen = set(placements)
+        placed = {s_idx for s_idx, _, _ in placements}
+        for key, var in self.x.items():
+            self.model.AddHint(var, int(key in chosen))
+        for s_idx, var in self.is_assigned.items():
+            self.model.AddHint(var, int(s_idx in placed))
+
+    def placement_literals(self, s_idx, r_idx, t_idx):
+        var = self.x.get((s_idx, r_idx, t_idx))
+        return [var] if var is not None else []
+
+
+def is_lab_course(course):
+    """
+    Enhanced lab detection - checks multiple patterns
+    Pattern 1: requiresLab flag is true
+    Pattern 2: Code contains L after digits (e.g., CS101L, CS101L-SE)
+    Pattern 3: Course name contains "lab"
+    """
+    code = course.get("code", "")
+    name = course.get("name", "").lower()
+
+    # Check if code has pattern like CS101L or CS101L-SE
+    has_lab_pattern = False
+    for i in range(len(code) - 1):
+        if code[i].isdigit() and code[i + 1] == 'L':
+            # Found digit followed by L
+            if i + 2 >= len(code) or code[i + 2] in ['-', '_']:
+                # L is at end or followed by separator
+                has_lab_pattern = True
+                break
+
+    return bool(
+        course.get("requiresLab", False) or
+        has_lab_pattern or
+        "lab" in name
+    )
+
+
+def prepare_problem(data, existing_timetables=None, update_progress=None):
+    """
+    PHASE 1 + 2: parse the payload, map existing timetables onto the slot grid
+    and expand allotments into sessions.
+    """
+    if update_progress is None:
+        update_progress = lambda *args, **kwargs: None
+
+    phase_start = time.time()
     log_phase("📦 PHASE 1: Loading Input Data")
 
     # -----------------------------
     # Input Data
     # -----------------------------
-    courses = data.get("courses", [])
-    faculty = data.get("faculty", [])
-    rooms = data.get("rooms", [])
-    allotments = data.get("allotments", [])
-
-    course_map = {c["id"]: c for c in courses}
-    faculty_map = {f["id"]: f for f in faculty}
-    room_map = {r["id"]: r for r in rooms}
-    
+    problem = TimetableProblem(
+        data.get("courses", []),
+        data.get("faculty", []),
+        data.get("rooms", []),
+        data.get("allotments", []),
+    )
+
     # Log data stats
-    log_stat("Courses", len(courses))
-    log_stat("Faculty", len(faculty))
-    log_stat("Rooms", len(rooms))
-    log_stat("Allotments", len(allotments))
+    log_stat("Courses", len(problem.courses))
+    log_stat("Faculty", len(problem.faculty))
+    log_stat("Rooms", len(problem.rooms))
+    log_stat("Allotments", len(problem.allotments))
 
     # Build conflict avoidance maps from existing timetables
     if existing_timetables is None:
         existing_timetables = []
-    
-    faculty_busy = collections.defaultdict(set)  # {faculty_id: {slot_index}}
-    room_busy = collections.defaultdict(set)      # {room_id: {slot_index}}
-    
+
     logger.info(f"CP-SAT: Processing {len(existing_timetables)} existing timetables for conflict avoidance")
-    
-    # Time slot mapping for conversion
-    days_list = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    times_list = ["08:30", "10:00", "11:30", "13:00", "14:30", "16:00"]
-    
+
+    # -----------------------------
+    # Time Slots
+    # -----------------------------
+    # The grid comes from the "timeGrid" payload key (default: Mon-Fri, six slots a day)
+    grid = TimeGrid.from_payload(data.get("timeGrid"))
+    problem.grid = grid
+    problem.days = grid.days
+    problem.all_time_slots = grid.slots
+    problem.slot_lookup = grid.lookup
+    problem.num_slots = grid.num_slots
+    problem.slots_per_day = grid.slots_per_day
+    problem.slot_costs = grid.costs
+    log_stat("Time slots", f"{grid.num_slots} ({len(grid.days)} days x {grid.slots_per_day}, "
+                           f"{len(grid.blocked)} blocked)")
+
+    unmapped = 0
     for existing_tt in existing_timetables:
         entries = existing_tt.get('entries', [])
         for entry in entries:
             time_slot = entry.get('timeSlot', {})
-            day = time_slot.get('day')
-            start_time = time_slot.get('startTime')
-            
-            if day and start_time:
-                try:
-                    day_idx = days_list.index(day)
-                    time_idx = times_list.index(start_time)
-                    slot_idx = day_idx * 6 + time_idx  # 6 slots per day
-                    
-                    faculty_id = entry.get('facultyId')
-                    if faculty_id:
-                        faculty_busy[faculty_id].add(slot_idx)
-                    
-                    room_id = entry.get('roomId')
-                    if room_id:
-                        room_busy[room_id].add(slot_idx)
-                except (ValueError, IndexError):
-                    pass
-    
-    logger.info(f"CP-SAT: {len(faculty_busy)} faculty with occupied slots, {len(room_busy)} rooms with occupied slots")
+            slot_idx = grid.slot_index(time_slot.get('day'), time_slot.get('startTime'))
+            if slot_idx is None:
+                unmapped += 1
+                continue
 
-    # -----------------------------
-    # Time Slots
-    # -----------------------------
-    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    time_intervals = [
-        ("08:30", "10:00"),
-        ("10:00", "11:30"),
-        ("11:30", "13:00"),
-        ("13:00", "14:30"),
-        ("14:30", "16:00"),
-        ("16:00", "17:30"),
-    ]
-
-    all_time_slots = []
-    for day in days:
-        for start, end in time_intervals:
-            all_time_slots.append({
-                "day": day,
-                "startTime": start,
-                "endTime": end,
-                "id": f"{day}-{start}"
-            })
+            faculty_id = entry.get('facultyId')
+            if faculty_id:
+                problem.faculty_busy[faculty_id].add(slot_idx)
+
+            room_id = entry.get('roomId')
+            if room_id:
+                problem.room_busy[room_id].add(slot_idx)
+
+    if unmapped:
+        logger.warning(f"CP-SAT: {unmapped} existing timetable entries do not match a slot of the time grid")
 
-    num_slots = len(all_time_slots)
-    slots_per_day = len(time_intervals)
+    logger.info(f"CP-SAT: {len(problem.faculty_busy)} faculty with occupied slots, {len(problem.room_busy)} rooms with occupied slots")
+    log_timing("Input parsing time", phase_start)
 
     # -----------------------------
     # Create Sessions
     # -----------------------------
     log_phase("🎯 PHASE 2: Creating Course Sessions")
     update_progress("processing", 10, "Creating course sessions...")
-    sessions = []
+    phase_start = time.time()
+    sessions = problem.sessions
 
-    for allot_idx, allotment in enumerate(allotments):
+    for allot_idx, allotment in enumerate(problem.allotments):
         c_id = allotment["courseId"]
         f_id = allotment["facultyId"]
         class_ids = allotment["classIds"]
 
-        course = course_map.get(c_id)
+        course = problem.course_map.get(c_id)
         if not course:
             continue
 
-        # Enhanced lab detection - checks multiple patterns
-        # Pattern 1: requiresLab flag is true
-        # Pattern 2: Code contains L after digits (e.g., CS101L, CS101L-SE)
-        # Pattern 3: Course name contains "lab"
-        code = course.get("code", "")
-        name = course.get("name", "").lower()
-        
-        # Check if code has pattern like CS101L or CS101L-SE
-        has_lab_pattern = False
-        for i in range(len(code) - 1):
-            if code[i].isdigit() and code[i + 1] == 'L':
-                # Found digit followed by L
-                if i + 2 >= len(code) or code[i + 2] in ['-', '_']:
-                    # L is at end or followed by separator
-                    has_lab_pattern = True
-                    break
-        
-        is_lab = (
-            course.get("requiresLab", False) or 
-            has_lab_pattern or
-            "lab" in name
-        )
+        is_lab = is_lab_course(course)
         credits = course.get("credits", 3)
 
         # HARD CONSTRAINT: Lab classes MUST occupy 2 consecutive time slots
-        # This is enforced by setting duration=2, which is validated in lines 145-149
+        # This is enforced by setting duration=2; every engine only allows
+        # lab starts whose slots stay on the same day.
         if is_lab:
             num_sessions = 1  # Labs scheduled once per week
             duration = 2      # CRITICAL: 2 consecutive slots (e.g., 10:00-13:00)
@@ -193,369 +437,1027 @@ def generate_timetable(data, session_id=None, progress_dict=None, existing_timet
         for class_id in class_ids:
             for s_idx in range(num_sessions):
                 sessions.append({
-                    "id": f"{c_id}-{class_id}-{s_idx}-{allot_idx}-{uuid.uuid4().hex[:8]}",
+                    "id": f"{c_id}-{class_id}-{s_idx}-{allot_idx}",
                     "courseId": c_id,
                     "facultyId": f_id,
                     "classId": class_id,
                     "duration": duration,
-                    "isLab": is_lab
+                    "isLab": is_lab,
+                    "allotIdx": allot_idx
                 })
-    
+
     # Log session stats
     log_stat("Total sessions created", len(sessions), Colors.GREEN)
     log_stat("Lab sessions", sum(1 for s in sessions if s['isLab']), Colors.YELLOW)
     log_stat("Theory sessions", sum(1 for s in sessions if not s['isLab']), Colors.BLUE)
+    log_timing("Session creation time", phase_start)
 
-    # -----------------------------
-    # Build Model
-    # -----------------------------
-    log_phase("🔧 PHASE 3: Building Constraint Model")
-    update_progress("processing", 15, "Building constraint model...")
-    model = cp_model.CpModel()
+    return problem
 
-    x = {}
-    is_assigned = {}
-    objective_terms = []
-    diagnostics_conflicts = []
 
-    # -----------------------------
-    # Variables
-    # -----------------------------
-    for s_idx, session in enumerate(sessions):
-        course = course_map[session["courseId"]]
+def find_compatible_rooms(problem):
+    """
+    Fill `problem.compatible_rooms` and report sessions that no room can
+    host. Compatibility only depends on the course and whether the session
+    is a lab, so it is worked out once per (course, lab) pair.
+    """
+    by_course = {}
+    for session in problem.sessions:
+        course = problem.course_map[session["courseId"]]
         required_type = "lab" if session["isLab"] else "lecture"
 
-        compatible_rooms = []
-        for r_idx, room in enumerate(rooms):
-            if required_type == "lab" and room["type"] == "lecture":
-                continue
-            if room["capacity"] < course.get("estimatedStudents", 0):
-                continue
-            compatible_rooms.append(r_idx)
+        key = (session["courseId"], session["isLab"])
+        if key not in by_course:
+            by_course[key] = [
+                r_idx for r_idx, room in enumerate(problem.rooms)
+                if not (required_type == "lab" and room["type"] == "lecture")
+                and room["capacity"] >= course.get("estimatedStudents", 0)
+            ]
+        compatible_rooms = list(by_course[key])
 
         if not compatible_rooms:
-            diagnostics_conflicts.append({
+            problem.conflicts.append({
                 "type": "student-clash",
                 "message": f"Course {course['code']} needs {required_type} room but none available.",
                 "severity": "error"
             })
+        problem.compatible_rooms.append(compatible_rooms)
+
+
+def is_valid_start(problem, session, t_idx):
+    """A start slot is valid when the whole session fits on the same day and avoids blocked slots."""
+    return problem.grid.fits(t_idx, session["duration"])
+
+
+def build_boolean_model(problem):
+    """
+    PHASE 3 (boolean engine): one Boolean per session x compatible room x start
+    slot, with exclusivity expressed as linear constraints over index buckets.
+    """
+    built = BooleanTimetableModel(problem)
+    model = built.model
+    x = built.x
+    is_assigned = built.is_assigned
+    objective_terms = built.objective_terms
+    sessions = problem.sessions
+    rooms = problem.rooms
+    num_slots = problem.num_slots
+    slots_per_day = problem.slots_per_day
+    var_index = VariableIndex()
+
+    # -----------------------------
+    # Variables
+    # -----------------------------
+    # Feasible (room, start) pairs come precomputed: valid starts on one day
+    # (labs: consecutive slots) clear of blocked slots and of the faculty and
+    # room bookings in "existing_timetables" (see solver_domains.py)
+    domains = problem.domains
+    if domains is None:
+        from solver_domains import PlacementDomains
+        domains = PlacementDomains(problem, prune_rooms=False)
+    phase_start = time.time()
+    for s_idx, session in enumerate(sessions):
+        if not problem.compatible_rooms[s_idx]:
             is_assigned[s_idx] = model.NewBoolVar(f"is_assigned_{s_idx}_none")
             model.Add(is_assigned[s_idx] == 0)
-            objective_terms.append(1_000_000)
+            objective_terms.append(NO_ROOM_PENALTY)
             continue
 
         vars_for_session = []
 
-        for r_idx in compatible_rooms:
-            for t_idx in range(num_slots):
-                # For multi-slot sessions (labs with duration=2):
-                # HARD CONSTRAINT ENFORCEMENT - Ensure consecutive slots on same day
-                if session["duration"] > 1:
-                    # Check if we have enough remaining slots
-                    if t_idx + session["duration"] - 1 >= num_slots:
-                        continue
-                    # CRITICAL: Verify both slots are on the same day (consecutive requirement)
-                    if all_time_slots[t_idx]["day"] != all_time_slots[t_idx + session["duration"] - 1]["day"]:
-                        continue
-
-                # ---------------------------------------------------------
-                # EXISTING TIMETABLE CONFLICT CHECK
-                # ---------------------------------------------------------
-                # Ensure we don't double-book faculty or rooms that are already
-                # occupied in the passed-in "existing_timetables".
-                is_blocked_by_existing = False
-                for dt in range(session["duration"]):
-                    check_slot = t_idx + dt
-                    
-                    # Check if faculty is already busy in this slot
-                    if check_slot in faculty_busy[session["facultyId"]]:
-                        is_blocked_by_existing = True
-                        break
-                    
-                    # Check if room is already busy in this slot
-                    # Note: rooms[r_idx] is the room object
-                    if check_slot in room_busy[rooms[r_idx]["id"]]:
-                        is_blocked_by_existing = True
-                        break
-                
-                if is_blocked_by_existing:
-                    continue
-
+        for r_idx, slots in domains.placements(s_idx):
+            for t_idx in slots:
                 v = model.NewBoolVar(f"x_s{s_idx}_r{r_idx}_t{t_idx}")
                 x[(s_idx, r_idx, t_idx)] = v
                 vars_for_session.append(v)
+                var_index.add(v, session, r_idx, t_idx, t_idx // slots_per_day)
 
         is_assigned[s_idx] = model.NewBoolVar(f"is_assigned_{s_idx}")
         model.Add(sum(vars_for_session) <= 1)
         model.Add(is_assigned[s_idx] == sum(vars_for_session))
 
-        objective_terms.append((1 - is_assigned[s_idx]) * 100_000)
-    
+        objective_terms.append((1 - is_assigned[s_idx]) * UNASSIGNED_PENALTY)
+
     # Log variable creation stats
     log_stat("Decision variables created", len(x), Colors.GREEN)
     log_stat("Sessions with placements", len(is_assigned), Colors.CYAN)
+    log_timing("Variable creation time", phase_start)
 
     # -----------------------------
     # Hard Constraints
     # -----------------------------
+    # Every family below reads its terms from the buckets filled during variable
+    # creation, so the build is linear in the number of variables.
     log_progress("Adding room conflict constraints...")
+    phase_start = time.time()
     # Room conflict
     for r_idx in range(len(rooms)):
         for t_idx in range(num_slots):
-            active = []
-            for s_idx, s in enumerate(sessions):
-                for dt in range(s["duration"]):
-                    if (s_idx, r_idx, t_idx - dt) in x:
-                        active.append(x[(s_idx, r_idx, t_idx - dt)])
+            active = var_index.room_slot.get((r_idx, t_idx))
             if active:
                 model.Add(sum(active) <= 1)
-    
+    log_timing("Room constraints time", phase_start)
+
     log_progress("Adding faculty conflict constraints...")
+    phase_start = time.time()
     # Faculty conflict
-    for f_id in faculty_map:
-        f_sessions = [i for i, s in enumerate(sessions) if s["facultyId"] == f_id]
+    for f_id in problem.faculty_map:
         for t_idx in range(num_slots):
-            active = []
-            for s_idx in f_sessions:
-                for dt in range(sessions[s_idx]["duration"]):
-                    for r_idx in range(len(rooms)):
-                        if (s_idx, r_idx, t_idx - dt) in x:
-                            active.append(x[(s_idx, r_idx, t_idx - dt)])
+            active = var_index.faculty_slot.get((f_id, t_idx))
             if active:
                 model.Add(sum(active) <= 1)
-    
+    log_timing("Faculty constraints time", phase_start)
+
     log_progress("Adding student clash constraints...")
+    phase_start = time.time()
     # Student clash - same class can't be in two places at same time
-    class_ids_unique = list(set(s["classId"] for s in sessions))
-    for class_id in class_ids_unique:
-        class_sessions = [i for i, s in enumerate(sessions) if s["classId"] == class_id]
+    for class_id in var_index.class_ids:
         for t_idx in range(num_slots):
-            active = []
-            for s_idx in class_sessions:
-                for dt in range(sessions[s_idx]["duration"]):
-                    for r_idx in range(len(rooms)):
-                        if (s_idx, r_idx, t_idx - dt) in x:
-                            active.append(x[(s_idx, r_idx, t_idx - dt)])
+            active = var_index.class_slot.get((class_id, t_idx))
             if active:
                 model.Add(sum(active) <= 1)
-    
+    log_timing("Student clash constraints time", phase_start)
+
+    add_class_limit_constraints(model, var_index, problem)
+
+    # -----------------------------
+    # Objective
+    # -----------------------------
+    for (s_idx, r_idx, t_idx), var in x.items():
+        objective_terms.append(var * problem.slot_costs[t_idx])
+
+    return built
+
+
+def session_symmetry_groups(problem):
+    """
+    Sessions that are interchangeable: same course, faculty, class and
+    duration. Sessions without rooms, and pinned or preferred sessions from a
+    repair, are left out because their placements are not interchangeable.
+    Returns lists of session indices with at least two members.
+    """
+    groups = collections.defaultdict(list)
+    for s_idx, session in enumerate(problem.sessions):
+        if not problem.compatible_rooms[s_idx] or s_idx in problem.pinned or s_idx in problem.preferred:
+            continue
+        key = (session["courseId"], session["facultyId"], session["classId"], session["duration"])
+        groups[key].append(s_idx)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def add_symmetry_breaking(built, groups, one_per_day=False):
+    """
+    Order the sessions of every symmetry group: earlier sessions are assigned
+    whenever later ones are, and start strictly earlier. `one_per_day` also
+    puts at most one session of a group on each day, which turns the
+    spread-over-days preference into a rule. Returns statistics.
+    """
+    model = built.model
+    problem = built.problem
+    is_assigned = built.is_assigned
+    ordering = 0
+    daily = 0
+    for group in groups:
+        starts = {s_idx: built.slot_starts(s_idx) for s_idx in group}
+        for first, second in zip(group, group[1:]):
+            model.Add(is_assigned[first] >= is_assigned[second])
+            first_start = sum(t_idx * lit for t_idx, lit in starts[first].items())
+            second_start = sum(t_idx * lit for t_idx, lit in starts[second].items())
+            model.Add(first_start + 1 <= second_start).OnlyEnforceIf(is_assigned[second])
+            ordering += 1
+        if one_per_day:
+            for day_idx in range(len(problem.days)):
+                on_day = [
+                    lit for s_idx in group for t_idx, lit in starts[s_idx].items()
+                    if t_idx // problem.slots_per_day == day_idx
+                ]
+                if len(on_day) > 1:
+                    model.Add(sum(on_day) <= 1)
+                    daily += 1
+
+    stats = {
+        "groups": len(groups),
+        "sessions": sum(len(group) for group in groups),
+        "orderingConstraints": ordering,
+        "onePerDayConstraints": daily,
+    }
+    log_stat("Symmetry groups", stats["groups"], Colors.CYAN)
+    log_stat("Interchangeable sessions ordered", stats["sessions"], Colors.CYAN)
+    if one_per_day:
+        log_stat("One-per-day constraints", daily, Colors.CYAN)
+    return stats
+
+
+def order_group_placements(groups, placements):
+    """Rewrite placements so every symmetry group satisfies add_symmetry_breaking's order."""
+    by_session = {s_idx: (r_idx, t_idx) for s_idx, r_idx, t_idx in placements}
+    for group in groups:
+        chosen = sorted((by_session.pop(s_idx) for s_idx in group if s_idx in by_session), key=lambda p: p[1])
+        for s_idx, placement in zip(group, chosen):
+            by_session[s_idx] = placement
+    return [(s_idx, r_idx, t_idx) for s_idx, (r_idx, t_idx) in by_session.items()]
+
+
+def add_class_limit_constraints(model, var_index, problem):
+    """Daily limit, break and weekly lab rules, read from the start buckets of `var_index`."""
+    class_ids_unique = list(var_index.class_ids)
+
     log_progress("Adding daily limit constraints (max 3 per day)...")
+    phase_start = time.time()
     # Max 3 classes per day per class
     for class_id in class_ids_unique:
-        class_sessions = [i for i, s in enumerate(sessions) if s["classId"] == class_id]
-        for day_idx in range(len(days)):
-            day_vars = []
-            for s_idx in class_sessions:
-                for r_idx in range(len(rooms)):
-                    for slot_in_day in range(slots_per_day):
-                        t_idx = day_idx * slots_per_day + slot_in_day
-                        if (s_idx, r_idx, t_idx) in x:
-                            day_vars.append(x[(s_idx, r_idx, t_idx)])
+        for day_idx in range(len(problem.days)):
+            day_vars = var_index.class_day.get((class_id, day_idx))
             if day_vars:
                 model.Add(sum(day_vars) <= 3)
-    
+    log_timing("Daily limit constraints time", phase_start)
+
     log_progress("Adding break constraints (prevent 3 consecutive classes)...")
+    phase_start = time.time()
     # Break constraint: After 2 consecutive classes, need a gap
     # Prevent 3 consecutive slot assignments for same class
+    windows = problem.grid.windows(3)  # 3 consecutive slots within one day
     for class_id in class_ids_unique:
-        class_sessions = [i for i, s in enumerate(sessions) if s["classId"] == class_id]
-        for day_idx in range(len(days)):
-            for slot_in_day in range(slots_per_day - 2):  # Check 3 consecutive slots
-                t_idx1 = day_idx * slots_per_day + slot_in_day
-                t_idx2 = t_idx1 + 1
-                t_idx3 = t_idx2 + 1
-                
-                vars_slot1 = []
-                vars_slot2 = []
-                vars_slot3 = []
-                
-                for s_idx in class_sessions:
-                    for r_idx in range(len(rooms)):
-                        if (s_idx, r_idx, t_idx1) in x:
-                            vars_slot1.append(x[(s_idx, r_idx, t_idx1)])
-                        if (s_idx, r_idx, t_idx2) in x:
-                            vars_slot2.append(x[(s_idx, r_idx, t_idx2)])
-                        if (s_idx, r_idx, t_idx3) in x:
-                            vars_slot3.append(x[(s_idx, r_idx, t_idx3)])
-                
-                # Cannot have 3 consecutive occupied slots
-                if vars_slot1 and vars_slot2 and vars_slot3:
-                    model.Add(sum(vars_slot1) + sum(vars_slot2) + sum(vars_slot3) <= 2)
-    
+        for window in windows:
+            window_vars = [var_index.class_start.get((class_id, t_idx)) for t_idx in window]
+
+            # Cannot have 3 consecutive occupied slots
+            if all(window_vars):
+                model.Add(sum(sum(vars_slot) for vars_slot in window_vars) <= 2)
+    log_timing("Break constraints time", phase_start)
+
     log_progress("Adding lab constraints (max 2 per week)...")
+    phase_start = time.time()
     # Lab constraint: Max 2 lab sessions per class per week
     for class_id in class_ids_unique:
-        lab_sessions_for_class = [i for i, s in enumerate(sessions) 
-                                  if s["classId"] == class_id and s["isLab"]]
-        if lab_sessions_for_class:
-            lab_vars = []
-            for s_idx in lab_sessions_for_class:
-                for r_idx in range(len(rooms)):
-                    for t_idx in range(num_slots):
-                        if (s_idx, r_idx, t_idx) in x:
-                            lab_vars.append(x[(s_idx, r_idx, t_idx)])
-            if lab_vars:
-                model.Add(sum(lab_vars) <= 2)  # Max 2 lab sessions per week
+        lab_vars = var_index.class_labs.get(class_id)
+        if lab_vars:
+            model.Add(sum(lab_vars) <= 2)  # Max 2 lab sessions per week
+    log_timing("Lab constraints time", phase_start)
 
 
-    # -----------------------------
-    # Objective
-    # -----------------------------
-    slot_costs = []
-    for t_idx in range(num_slots):
-        local = t_idx % slots_per_day
-        if local < 4:
-            slot_costs.append(local)
-        elif local == 4:
-            slot_costs.append(100)
-        else:
-            slot_costs.append(10_000)
+# Solution callback for live progress
+class SolutionPrinter(cp_model.CpSolverSolutionCallback):
+    def __init__(self, update_prog_func, snapshot=None):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self._solution_count = 0
+        self._start_time = time.time()
+        self._update_progress = update_prog_func
+        # Optional: snapshot(value) -> set of compact placements, streamed as diffs
+        self._snapshot = snapshot
+        self._last_solution = set()
+        self.first_solution_at = None
 
-    for (s_idx, r_idx, t_idx), var in x.items():
-        objective_terms.append(var * slot_costs[t_idx])
+    @property
+    def solution_count(self):
+        return self._solution_count
 
-    model.Minimize(sum(objective_terms))
+    def on_solution_callback(self):
+        self._solution_count += 1
+        if self.first_solution_at is None:
+            self.first_solution_at = time.time()
+        current_time = time.time() - self._start_time
+        obj = self.ObjectiveValue()
 
-    # -----------------------------
-    # Solve
-    # -----------------------------
+        # Update Dashboard Progress
+        # Start at 20%, asymptotic to 90% based on solution count
+        # This gives visual "movement" even if we don't know total solutions
+        import math
+        current_prog = 20 + int(70 * (1 - math.exp(-0.1 * self._solution_count)))
+
+        bound = self.BestObjectiveBound()
+        extra = {"best_bound": bound, "gap": abs(obj - bound) / max(1.0, abs(obj))}
+        if self._snapshot is not None:
+            solution = self._snapshot(self.Value)
+            extra["solution_diff"] = {
+                "added": sorted(solution - self._last_solution),
+                "removed": sorted(self._last_solution - solution),
+            }
+            self._last_solution = solution
+
+        self._update_progress(
+            "solving",
+            current_prog,
+            f"Optimizing... Found Solution #{self._solution_count} (Cost: {obj:.0f})",
+            self._solution_count,
+            obj,
+            **extra
+        )
+
+        logger.info(
+            f"{Colors.GREEN}  💡 Solution #{self._solution_count} "
+            f"| Objective: {obj:.0f} "
+            f"| Time: {current_time:.1f}s{Colors.ENDC}"
+        )
+
+
+def stop_when_set(solver, stop_event, finished):
+    """Watcher thread: interrupt the running search once `stop_event` is set."""
+    while not finished.is_set():
+        if stop_event.wait(0.2):
+            logger.info("Cancellation requested, stopping search")
+            solver.StopSearch()
+            return
+
+
+def compact_solution(built, value):
+    """(session id, room id, slot id) of every placement; room id is None in two-stage mode."""
+    problem = built.problem
+    return {
+        (
+            problem.sessions[s_idx]["id"],
+            problem.rooms[r_idx]["id"] if r_idx is not None else None,
+            problem.all_time_slots[t_idx]["id"],
+        )
+        for s_idx, r_idx, t_idx in built.placements(value)
+    }
+
+
+def solve_model(built, update_progress, settings, stop_event=None, stream_solutions=False):
+    """
+    PHASE 4: run CP-SAT on a built model with `settings` (a
+    solver_config.SolverSettings). Returns (solver, status).
+    Setting `stop_event` (threading or multiprocessing Event) stops the
+    search early; the best solution found so far is kept.
+    `stream_solutions` adds a diff of each improving solution to the
+    progress updates (see compact_solution).
+    """
     log_phase("🚀 PHASE 4: Solving")
     update_progress("solving", 20, "Starting solver...")
 
     solver = cp_model.CpSolver()
-    # OPTIMIZED PARAMETERS FOR SPEED
-    solver.parameters.max_time_in_seconds = 1800  # 30 min hard limit
-    solver.parameters.num_search_workers = 8
-    solver.parameters.relative_gap_limit = 0.01  # Stop at 99% optimal
-    solver.parameters.search_branching = cp_model.PORTFOLIO_SEARCH  # Try multiple strategies
-    solver.parameters.log_search_progress = False  # Use our custom logging
+    # Time limit, workers, gap and search strategy come from the profile
+    settings.apply(solver)
+    # The search log is kept in the response only, for the presolve time in the
+    # job profile; the console gets our custom logging
+    solver.parameters.log_search_progress = True
+    solver.parameters.log_to_stdout = False
+    solver.parameters.log_to_response = True
     solver.parameters.cp_model_presolve = True
-    
+
     # Log solver config
+    log_stat("Profile", f"{settings.profile} ({settings.reason})", Colors.YELLOW)
     log_stat("Max time limit", f"{solver.parameters.max_time_in_seconds}s")
     log_stat("Search workers", solver.parameters.num_search_workers)
     log_stat("Gap limit", f"{solver.parameters.relative_gap_limit*100}%", Colors.GREEN)
-    log_stat("Search strategy", "PORTFOLIO", Colors.YELLOW)
-    
-    # Solution callback for live progress
-    class SolutionPrinter(cp_model.CpSolverSolutionCallback):
-        def __init__(self, update_prog_func):
-            cp_model.CpSolverSolutionCallback.__init__(self)
-            self._solution_count = 0
-            self._start_time = time.time()
-            self._update_progress = update_prog_func
-
-        def on_solution_callback(self):
-            self._solution_count += 1
-            current_time = time.time() - self._start_time
-            obj = self.ObjectiveValue()
-            
-            # Update Dashboard Progress
-            # Start at 20%, asymptotic to 90% based on solution count
-            # This gives visual "movement" even if we don't know total solutions
-            import math
-            current_prog = 20 + int(70 * (1 - math.exp(-0.1 * self._solution_count)))
-            
-            self._update_progress(
-                "solving", 
-                current_prog, 
-                f"Optimizing... Found Solution #{self._solution_count} (Cost: {obj:.0f})", 
-                self._solution_count, 
-                obj
-            )
-            
-            logger.info(
-                f"{Colors.GREEN}  💡 Solution #{self._solution_count} "
-                f"| Objective: {obj:.0f} "
-                f"| Time: {current_time:.1f}s{Colors.ENDC}"
-            )
-    
+    log_stat("Search strategy", settings.search_branching, Colors.YELLOW)
+
     solve_start = time.time()
-    solution_printer = SolutionPrinter(update_progress)
+    snapshot = (lambda value: compact_solution(built, value)) if stream_solutions else None
+    solution_printer = SolutionPrinter(update_progress, snapshot)
 
-    status = solver.Solve(model, solution_printer)
+    finished = threading.Event()
+    if stop_event is not None:
+        threading.Thread(target=stop_when_set, args=(solver, stop_event, finished), daemon=True).start()
+    try:
+        status = solver.Solve(built.model, solution_printer)
+    finally:
+        finished.set()
+    if built.first_solution_at is None:
+        built.first_solution_at = solution_printer.first_solution_at
+    built.solutions_found += solution_printer.solution_count
+    record_search(solver_response_statistics(solver, status))
 
-    solve_time = time.time() - solve_start
-    
     log_phase("✅ PHASE 5: Results")
     status_color = Colors.GREEN if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else Colors.RED
     log_stat("Solver status", solver.StatusName(status), status_color)
-    log_stat("Solve time", f"{solve_time:.2f}s", Colors.CYAN)
+    log_timing("Solve time", solve_start)
     if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
         log_stat("Best objective", f"{solver.ObjectiveValue():.0f}", Colors.GREEN)
-    
+
     logger.info(f"Solver finished: {solver.StatusName(status)}")
     logger.info(f"Wall time: {solver.WallTime()}s")
 
-    update_progress("processing", 95, "Processing results...")
+    return solver, status
 
-    # -----------------------------
-    # Output
-    # -----------------------------
-    entries = []
+
+def _stage_report(stage, solver, status):
+    report = {"stage": stage, "status": solver.StatusName(status), "time": round(solver.WallTime(), 2)}
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        report["objective"] = solver.ObjectiveValue()
+        report["bound"] = solver.BestObjectiveBound()
+    return report
+
+
+def solve_lexicographic(built, update_progress, settings, stage_time_limits=None, stop_event=None,
+                        stream_solutions=False, hint_placements=None):
+    """
+    PHASE 4 (lexicographic objective): stage 1 maximises the number of
+    assigned sessions; stage 2 keeps at least that many assigned, starts from
+    the stage-1 solution and minimises placement cost alone, so neither stage
+    mixes big-M penalties with slot costs. `stage_time_limits` is an optional
+    (stage 1, stage 2) pair of seconds; by default stage 1 gets
+    LEXICOGRAPHIC_ASSIGNMENT_SHARE of the budget and stage 2 what is left.
+    Stage 1 is skipped when `hint_placements` (the warm start) already
+    places every session that has a compatible room.
+    Returns (solver, status, stage reports).
+    """
+    model = built.model
+    if stage_time_limits:
+        first_limit, second_limit = stage_time_limits
+    else:
+        first_limit = max(1, settings.time_limit * LEXICOGRAPHIC_ASSIGNMENT_SHARE)
+        second_limit = None
+
+    solver = status = None
+    placeable = sum(1 for rooms in built.problem.compatible_rooms if rooms)
+    if hint_placements is not None and len(hint_placements) == placeable:
+        assigned = placeable
+        stages = [{"stage": "assignment", "status": "SKIPPED", "time": 0, "objective": assigned}]
+        log_stat("Stage 1 skipped, warm start assigns every placeable session", assigned, Colors.GREEN)
+        second_limit = second_limit or settings.time_limit
+    else:
+        log_phase("🥇 Stage 1: Maximising Assigned Sessions")
+        first = copy.copy(settings)
+        first.time_limit = first_limit
+        model.Maximize(built.assigned_count())
+        solver, status = solve_model(built, update_progress, first, stop_event, stream_solutions)
+        stages = [_stage_report("assignment", solver, status)]
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or (stop_event is not None and stop_event.is_set()):
+            return solver, status, stages
+
+        assigned = int(round(solver.ObjectiveValue()))
+        log_stat("Sessions assigned in stage 1", assigned, Colors.GREEN)
+        model.ClearHints()
+        built.add_hints(built.solution_placements(solver))
+    model.Add(built.assigned_count() >= assigned)
+
+    log_phase("🥈 Stage 2: Minimising Placement Cost")
+    second = copy.copy(settings)
+    second.time_limit = second_limit or max(1, settings.time_limit - solver.WallTime())
+    model.Minimize(built.placement_cost())
+    second_solver, second_status = solve_model(built, update_progress, second, stop_event, stream_solutions)
+    stages.append(_stage_report("cost", second_solver, second_status))
+    if second_status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) and solver is not None:
+        logger.info("Stage 2 found no solution in time; keeping the stage-1 schedule")
+        return solver, status, stages
+    return second_solver, second_status, stages
+
+
+def search_statistics(built, solver, status, start_time):
+    """Outcome of the last CP-SAT solve, for benchmarks and the statistics payload."""
+    stats = {
+        "status": solver.StatusName(status) if solver is not None else "NOT_RUN",
+        "solutions": built.solutions_found,
+        "firstSolutionTime": (
+            round(built.first_solution_at - start_time, 3) if built.first_solution_at is not None else None
+        ),
+    }
     if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        for (s_idx, r_idx, t_idx), var in x.items():
-            if solver.Value(var) == 1:
-                s = sessions[s_idx]
-                r = rooms[r_idx]
-                c = course_map[s["courseId"]]
-                f = faculty_map[s["facultyId"]]
-
-                for dt in range(s["duration"]):
-                    slot = all_time_slots[t_idx + dt]
-                    
-                    # Extract department and semester from course
-                    department_code = c.get("department", "Unknown")
-                    semester = c.get("semester", 1)
-                    if isinstance(semester, str):
-                        import re
-                        match = re.search(r'\d+', semester)
-                        semester = int(match.group()) if match else 1
-                    
-                    entries.append({
-                        "id": s["id"],
-                        "courseCode": c["code"],
-                        "courseName": c.get("name", c["code"]),
-                        "facultyName": f["name"],
-                        "roomName": r["name"],
-                        "classId": s["classId"],
-                        "courseId": s["courseId"],
-                        "facultyId": s["facultyId"],
-                        "roomId": r["id"],
-                        "timeSlot": {
-                            "day": slot["day"],
-                            "startTime": slot["startTime"],
-                            "endTime": slot["endTime"]
-                        },
-                        "metadata": {
-                            "departmentCode": department_code,
-                            "semesterLevel": semester
-                        }
-                    })
+        objective, bound = solver.ObjectiveValue(), solver.BestObjectiveBound()
+        stats.update({
+            "objective": objective,
+            "bestBound": bound,
+            "gap": abs(objective - bound) / max(1.0, abs(objective)),
+        })
+    return stats
+
+
+def course_metadata(course):
+    """Department code and numeric semester level the frontend groups entries by."""
+    semester = course.get("semester", 1)
+    if isinstance(semester, str):
+        match = re.search(r'\d+', semester)
+        semester = int(match.group()) if match else 1
+    return {"departmentCode": course.get("department", "Unknown"), "semesterLevel": semester}
+
+
+class NormalizedTimetable:
+    """
+    The "normalized" response format: lookup tables of the courses, faculty,
+    rooms and slots in use, and entries as parallel columns of indices into
+    them, so no name is repeated per slot.
+    """
+
+    COLUMNS = ("id", "classId", "course", "faculty", "room", "slot")
+
+    def __init__(self):
+        self.tables = {"courses": {}, "faculty": {}, "rooms": {}, "slots": {}}  # key -> (index, record)
+        self.columns = {column: [] for column in self.COLUMNS}
+        self.num_entries = 0
+
+    def _index(self, table, key, make_record):
+        entry = self.tables[table].get(key)
+        if entry is None:
+            entry = self.tables[table][key] = (len(self.tables[table]), make_record())
+        return entry[0]
+
+    def add(self, session_id, class_id, course, faculty, room, slot, metadata):
+        columns = self.columns
+        columns["id"].append(session_id)
+        columns["classId"].append(class_id)
+        columns["course"].append(self._index("courses", course["id"], lambda: {
+            "id": course["id"], "code": course["code"], "name": course.get("name", course["code"]), **metadata,
+        }))
+        columns["faculty"].append(self._index(
+            "faculty", faculty["id"], lambda: {"id": faculty["id"], "name": faculty["name"]}))
+        columns["room"].append(self._index("rooms", room["id"], lambda: {"id": room["id"], "name": room["name"]}))
+        columns["slot"].append(self._index("slots", (slot["day"], slot["startTime"]), lambda: {
+            "day": slot["day"], "startTime": slot["startTime"], "endTime": slot["endTime"],
+        }))
+        self.num_entries += 1
+
+    def add_entry(self, entry):
+        """Add an entry of the default format (used when merging component results)."""
+        self.add(
+            entry["id"],
+            entry["classId"],
+            {"id": entry["courseId"], "code": entry["courseCode"], "name": entry["courseName"]},
+            {"id": entry["facultyId"], "name": entry["facultyName"]},
+            {"id": entry["roomId"], "name": entry["roomName"]},
+            entry["timeSlot"],
+            entry["metadata"],
+        )
+
+    def to_dict(self):
+        return {
+            "format": "normalized",
+            **{table: [record for _, record in items.values()] for table, items in self.tables.items()},
+            "entries": self.columns,
+        }
+
+
+def build_result(problem, placements, conflicts, start_time, response_format="entries"):
+    """
+    Turn (s_idx, r_idx, t_idx) placements into the `timetable`/`statistics`
+    payload. `response_format` "normalized" returns a NormalizedTimetable
+    instead of one self-contained dict per occupied slot.
+    """
+    sessions = problem.sessions
+    entries = []
+    normalized = NormalizedTimetable() if response_format == "normalized" else None
+    metadata = {}
+    for s_idx, r_idx, t_idx in placements:
+        s = sessions[s_idx]
+        r = problem.rooms[r_idx]
+        c = problem.course_map[s["courseId"]]
+        f = problem.faculty_map[s["facultyId"]]
+        if s["courseId"] not in metadata:
+            metadata[s["courseId"]] = course_metadata(c)
+        course_meta = metadata[s["courseId"]]
+
+        for dt in range(s["duration"]):
+            slot = problem.all_time_slots[t_idx + dt]
+            if normalized is not None:
+                normalized.add(s["id"], s["classId"], c, f, r, slot, course_meta)
+                continue
 
+            entries.append({
+                "id": s["id"],
+                "courseCode": c["code"],
+                "courseName": c.get("name", c["code"]),
+                "facultyName": f["name"],
+                "roomName": r["name"],
+                "classId": s["classId"],
+                "courseId": s["courseId"],
+                "facultyId": s["facultyId"],
+                "roomId": r["id"],
+                "timeSlot": {
+                    "day": slot["day"],
+                    "startTime": slot["startTime"],
+                    "endTime": slot["endTime"]
+                },
+                "metadata": dict(course_meta)
+            })
 
     # Count unique sessions (not individual slot entries)
     unique_sessions = set()
     total_slots_used = 0
-    for (s_idx, r_idx, t_idx), var in x.items():
-        if solver.Value(var) == 1:
-            unique_sessions.add(s_idx)
-            total_slots_used += sessions[s_idx]["duration"]
-    
+    for s_idx, r_idx, t_idx in placements:
+        unique_sessions.add(s_idx)
+        total_slots_used += sessions[s_idx]["duration"]
+
+    num_entries = normalized.num_entries if normalized is not None else len(entries)
+
     # Final stats
-    log_stat("Scheduled entries", len(entries), Colors.GREEN)
+    log_stat("Scheduled entries", num_entries, Colors.GREEN)
     log_stat("Unique sessions scheduled", len(unique_sessions), Colors.CYAN)
     log_stat("Total execution time", f"{time.time() - start_time:.2f}s", Colors.BOLD)
-    
+
     return {
-        "success": bool(entries),
-        "timetable": entries,
-        "conflicts": diagnostics_conflicts,
-        "message": "Schedule generated." if entries else "No feasible solution found.",
+        "success": bool(num_entries),
+        "timetable": normalized.to_dict() if normalized is not None else entries,
+        "conflicts": conflicts,
+        "message": "Schedule generated." if num_entries else "No feasible solution found.",
         "statistics": {
             "scheduledCourses": len(unique_sessions),
             "usedSlots": total_slots_used,
-            "conflictsFound": len(diagnostics_conflicts)
+            "conflictsFound": len(conflicts)
         }
     }
 
+
+def generate_timetable(data, session_id=None, progress_dict=None, existing_timetables=None, stop_event=None):
+    """
+    Run _generate_timetable under a solver_metrics.JobProfile and attach the
+    profile (phase durations, logged counts, CP-SAT response statistics and
+    the worker's peak RSS) to the result as statistics.profile.
+    """
+    profile = JobProfile()
+    with profiling(profile):
+        result = _generate_timetable(data, session_id, progress_dict, existing_timetables, stop_event)
+    result.setdefault("statistics", {})["profile"] = profile.to_dict()
+    if result["statistics"].get("export"):
+        from solver_export import finish_export
+        try:
+            finish_export(result["statistics"]["export"], result)
+        except OSError as e:
+            logger.warning(f"Could not store the result next to the exported model: {e}")
+    return result
+
+
+def _generate_timetable(data, session_id=None, progress_dict=None, existing_timetables=None, stop_event=None):
+    """
+    Solves the timetable scheduling problem using Google OR-Tools CP-SAT solver.
+    WARNING: This is slow (30-45 minutes) but finds optimal solutions.
+
+    `data["engine"]` selects the model formulation: "boolean" (default) or
+    "interval" (optional intervals + NoOverlap, see solver_interval.py).
+    `data["mode"]` selects the strategy: "optimal" (default, one model with
+    rooms) or "two_stage" (slots first, then rooms, re-solving the slots with
+    cuts while rooms run out; see solver_two_stage.py).
+    "fast" skips CP-SAT and returns the greedy schedule (see solver_greedy.py);
+    the other modes use that schedule as a warm-start hint unless
+    `data["warmStart"]` is false.
+    `data["decompose"]` splits the sessions into independent components and
+    solves them in parallel processes (see solver_decompose.py).
+    `data["repair"]` (built by solver_repair.apply_repair_delta) keeps the
+    previous timetable fixed outside the neighbourhood of a change.
+    `stop_event` cancels the CP-SAT search (see solve_model).
+    `data["objective"]` is "weighted" (default, one big-M sum) or
+    "lexicographic" (assignment first, then cost; see solve_lexicographic).
+    `data["symmetryBreaking"]` orders interchangeable sessions of the same
+    course and class; `data["onePerDay"]` also keeps them on different days.
+    `data["profile"]` picks the CP-SAT parameters ("draft", "balanced"
+    (default), "optimal" or "auto", see solver_config.py).
+    `data["precheck"]` (default on) runs the pre-solve analysis of
+    solver_precheck.py and leaves the sessions it proves surplus out of the model.
+    `data["responseFormat"]` "normalized" returns the timetable as lookup
+    tables plus integer-indexed entries (see NormalizedTimetable).
+    `data["timeGrid"]` sets the days, intervals, blocked slots and slot costs
+    (see solver_config.TimeGrid; default Monday-Friday, six slots a day).
+    `data["streamSolutions"]` adds a diff of every improving solution to the
+    progress updates, for the /generation-stream endpoint.
+    `data["race"]` (true or a process count) races differently seeded and
+    configured CP-SAT processes on the built model (see solver_race.py);
+    `data["lns"]` keeps part of the budget for a large-neighbourhood search
+    that re-solves one class/day or faculty at a time (see solver_lns.py).
+    Setting TIMETABLE_EXPORT_DIR exports every job for offline replay (see
+    solver_export.py and `benchmark.py replay`).
+    `data["scenarios"]` solves what-if variants of the payload alongside it
+    and returns each with a diff against the base (see solver_scenarios.py).
+    Wall time per phase goes to statistics.timings, model size to
+    statistics.model and the CP-SAT outcome to statistics.search.
+    """
+
+    # -----------------------------
+    # Progress Helper
+    # -----------------------------
+    def update_progress(status, progress, message, solutions=0, objective=None, **extra):
+        if progress_dict and session_id:
+            progress_dict[session_id].update({
+                "status": status,
+                "progress": progress,
+                "message": message,
+                "solutions_found": solutions,
+                "best_objective": objective,
+                **extra
+            })
+
+    engine = data.get("engine") or "boolean"
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown solver engine '{engine}'. Expected one of: {', '.join(ENGINES)}")
+    mode = data.get("mode") or "optimal"
+    if mode not in MODES:
+        raise ValueError(f"Unknown solve mode '{mode}'. Expected one of: {', '.join(MODES)}")
+    objective = data.get("objective") or "weighted"
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}'. Expected one of: {', '.join(OBJECTIVES)}")
+    response_format = data.get("responseFormat") or "entries"
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(
+            f"Unknown response format '{response_format}'. Expected one of: {', '.join(RESPONSE_FORMATS)}"
+        )
+
+    if data.get("scenarios"):
+        from solver_scenarios import check_scenarios
+        check_scenarios(data)
+
+    update_progress("processing", 5, "Parsing input data...")
+
+    # Start overall timer; `timings` records the wall time of every phase
+    start_time = time.time()
+    timings = {}
+    last_mark = start_time
+
+    def mark(phase):
+        nonlocal last_mark
+        now = time.time()
+        timings[phase] = round(now - last_mark, 3)
+        last_mark = now
+
+    problem = prepare_problem(data, existing_timetables, update_progress)
+    mark("parse")
+
+    # -----------------------------
+    # Build Model
+    # -----------------------------
+    log_phase("🔧 PHASE 3: Building Constraint Model")
+    log_stat("Mode", mode, Colors.YELLOW)
+    log_stat("Engine", engine, Colors.YELLOW)
+    update_progress("processing", 15, "Building constraint model...")
+    build_start = time.time()
+
+    find_compatible_rooms(problem)
+    repair_summary = None
+    if data.get("repair"):
+        from solver_repair import plan_repair
+        repair_summary = plan_repair(problem, data["repair"])
+    mark("rooms")
+
+    # Pre-solve analysis: report provable contradictions up front and leave
+    # the surplus sessions out, instead of having CP-SAT prove them unplaceable
+    precheck_summary = None
+    unplaceable = set()
+    if data.get("precheck", True):
+        from solver_precheck import analyze_problem
+        report = analyze_problem(problem)
+        problem.conflicts.extend(report.conflicts)
+        report.drop_surplus(problem)
+        unplaceable = report.excluded
+        precheck_summary = report.summary(len(problem.sessions))
+        mark("precheck")
+
+        if not any(problem.compatible_rooms[s] and s not in unplaceable for s in range(len(problem.sessions))):
+            logger.info("No session can be placed; skipping the solver")
+            result = build_result(problem, [], problem.conflicts, start_time, response_format)
+            result["statistics"].update({"mode": mode, "engine": engine, "precheck": precheck_summary,
+                                         "timings": timings})
+            return result
+
+    if mode == "fast":
+        from solver_greedy import greedy_schedule, unplaced_conflicts
+        placements, unplaced = greedy_schedule(problem)
+        mark("greedy")
+        conflicts = problem.conflicts + unplaced_conflicts(problem, [s for s in unplaced if s not in unplaceable])
+        result = build_result(problem, placements, conflicts, start_time, response_format)
+        mark("output")
+        result["statistics"]["mode"] = mode
+        result["statistics"]["timings"] = timings
+        if precheck_summary is not None:
+            result["statistics"]["precheck"] = precheck_summary
+        if repair_summary is not None:
+            from solver_repair import moved_sessions
+            repair_summary["movedSessions"] = moved_sessions(problem, placements)
+            result["statistics"]["repair"] = repair_summary
+        return result
+
+    def solver_settings(num_variables=None):
+        return resolve_solver_settings(data, problem_statistics(problem, num_variables))
+
+    if data.get("decompose") and repair_summary is None and not data.get("scenarios"):
+        from solver_decompose import find_components, solve_components
+        components = find_components(problem)
+        log_stat("Independent components", len(components), Colors.CYAN)
+        if len(components) > 1:
+            settings = solver_settings()
+            return solve_components(dict(data, timeLimit=settings.time_limit), problem, components,
+                                    existing_timetables, update_progress, start_time, settings, stop_event)
+
+    # Feasible placements as bitsets, with interchangeable rooms cut to the
+    # number that can be busy at once. Scenarios keep every room, since a
+    # variant that closes a kept room would need the pruned ones back.
+    domains_summary = None
+    if mode != "two_stage":
+        from solver_domains import compute_domains
+        domains_summary = compute_domains(problem, prune_rooms=not data.get("scenarios")).summary()
+        mark("domains")
+
+    if mode == "two_stage":
+        from solver_two_stage import build_time_model
+        built = build_time_model(problem)
+    elif engine == "interval":
+        from solver_interval import build_interval_model
+        built = build_interval_model(problem)
+    else:
+        built = build_boolean_model(problem)
+
+    # Repair mode: keep freed sessions where they were unless moving pays off
+    for s_idx, (r_idx, t_idx) in problem.preferred.items():
+        literals = built.placement_literals(s_idx, r_idx, t_idx)
+        for lit in literals:
+            built.objective_terms.append((1 - lit) * (MOVE_PENALTY // len(literals)))
+
+    symmetry_summary = None
+    symmetry_groups = []
+    if data.get("symmetryBreaking"):
+        symmetry_groups = session_symmetry_groups(problem)
+        symmetry_summary = add_symmetry_breaking(built, symmetry_groups, one_per_day=bool(data.get("onePerDay")))
+
+    built.model.Minimize(sum(built.objective_terms))
+    log_timing("Total model build time", build_start)
+    mark("build")
+
+    num_variables = len(built.model.Proto().variables)
+    settings = solver_settings(num_variables)
+    # A profile's budget is for the whole job, so the time spent so far comes off it
+    if not data.get("timeLimit"):
+        settings.time_limit = max(1, round(settings.time_limit - (time.time() - start_time), 1))
+
+    # Warm start: the greedy schedule, completed to every model variable, is
+    # CP-SAT's first solution and the one we fall back to if it finds none.
+    # Its time comes off the solve budget.
+    hint_placements = None
+    warm_start_summary = None
+    if data.get("warmStart", True):
+        warm_start_begin = time.time()
+        from solver_greedy import greedy_schedule, schedule_cost
+        hint_placements, _ = greedy_schedule(problem)
+        if problem.domains is not None:
+            hint_placements = problem.domains.remap(hint_placements)
+        if symmetry_groups:
+            hint_placements = order_group_placements(symmetry_groups, hint_placements)
+        built.add_hints(hint_placements)
+        hint_cost = schedule_cost(problem, hint_placements)
+        hint_start = time.time()
+        hint_objective = None
+        try_completion = (settings.time_limit >= HINT_COMPLETION_MIN_BUDGET
+                          or num_variables < LIGHT_PRESOLVE_VARIABLES)
+        if try_completion:
+            hint_objective = built.complete_hints(
+                min(HINT_COMPLETION_TIME_LIMIT, settings.time_limit * HINT_COMPLETION_SHARE)
+            )
+        warm_start_summary = {
+            "placements": len(hint_placements),
+            "cost": hint_cost,
+            "complete": hint_objective is not None,
+            "objective": hint_objective,
+            "time": round(time.time() - hint_start, 3),
+        }
+        settings.time_limit = max(1, round(settings.time_limit - (time.time() - warm_start_begin), 1))
+        if hint_objective is not None:
+            log_stat("Warm start objective", hint_objective, Colors.GREEN)
+        elif try_completion:
+            log_stat("Warm start objective", "incomplete hint", Colors.RED)
+        else:
+            log_stat("Warm start objective", "not completed (short budget)", Colors.YELLOW)
+        update_progress("processing", 18, f"Warm start ready (Cost: {hint_cost})", 0, hint_cost)
+        mark("warmStart")
+
+    # -----------------------------
+    # Solve
+    # -----------------------------
+    if warm_start_summary is not None and warm_start_summary["complete"] and (
+            num_variables >= LIGHT_PRESOLVE_VARIABLES or settings.time_limit < LIGHT_PRESOLVE_TIME_LIMIT):
+        settings.light_presolve = True
+        settings.reason += "; light presolve so the warm start is the first solution early"
+
+    # TIMETABLE_EXPORT_DIR keeps this job's input, model and parameters for
+    # `benchmark.py replay`; a failed export never fails the job
+    from solver_export import export_directory, export_job
+    export_path = None
+    if export_directory():
+        try:
+            export_path = export_job(export_directory(), data, existing_timetables, built, settings,
+                                     session_id, timings)
+            log_stat("Exported model", export_path, Colors.CYAN)
+        except OSError as e:
+            logger.warning(f"Could not export the model: {e}")
+
+    if data.get("scenarios"):
+        from solver_scenarios import solve_scenarios
+        result = solve_scenarios(data, built, settings, hint_placements, existing_timetables, update_progress,
+                                 start_time, stop_event=stop_event)
+        mark("solve")
+        proto = built.model.Proto()
+        result["statistics"].update({
+            "mode": mode,
+            "engine": engine,
+            "timings": timings,
+            "model": {"variables": len(proto.variables), "constraints": len(proto.constraints)},
+            "solver": settings.to_statistics(),
+        })
+        if precheck_summary is not None:
+            result["statistics"]["precheck"] = precheck_summary
+        if export_path is not None:
+            result["statistics"]["export"] = export_path
+        return result
+
+    # LNS takes its share off the main solve and gets whatever that leaves
+    total_time_limit = settings.time_limit
+    if data.get("lns"):
+        from solver_lns import LNS_TIME_SHARE
+        settings.time_limit = max(1, total_time_limit * (1 - LNS_TIME_SHARE))
+
+    solve_start = time.time()
+    stages = None
+    race_summary = None
+    if objective == "lexicographic":
+        solver, status, stages = solve_lexicographic(
+            built,
+            update_progress,
+            settings,
+            stage_time_limits=data.get("stageTimeLimits"),
+            stop_event=stop_event,
+            stream_solutions=bool(data.get("streamSolutions")),
+            hint_placements=hint_placements,
+        )
+    elif data.get("race"):
+        from solver_race import DEFAULT_RACE_ENTRANTS, race_model
+        entrants = DEFAULT_RACE_ENTRANTS if data["race"] is True else int(data["race"])
+        hint_objective = warm_start_summary["objective"] if warm_start_summary is not None else None
+        solver, status, race_summary = race_model(built, update_progress, settings, entrants, stop_event,
+                                                  hint_objective=hint_objective)
+    else:
+        solver, status = solve_model(
+            built,
+            update_progress,
+            settings,
+            stop_event=stop_event,
+            stream_solutions=bool(data.get("streamSolutions")),
+        )
+
+    mark("solve")
+
+    lns_summary = None
+    if data.get("lns") and not (stop_event is not None and stop_event.is_set()):
+        from solver_lns import improve_with_lns
+        solver, status, lns_summary = improve_with_lns(
+            built, solver, status, hint_placements, settings,
+            total_time_limit - (time.time() - solve_start), update_progress, stop_event,
+        )
+        mark("lns")
+    update_progress("processing", 95, "Processing results...")
+
+    # -----------------------------
+    # Output
+    # -----------------------------
+    output_start = time.time()
+    placements = []
+    conflicts = problem.conflicts
+    two_stage_summary = None
+    used_warm_start = False
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        if mode == "two_stage":
+            from solver_two_stage import ROOM_STAGE_TIME_LIMIT, assign_rooms_with_cuts
+            room_time_limit = max(ROOM_STAGE_TIME_LIMIT, total_time_limit - (time.time() - solve_start))
+            solver, status, placements, room_conflicts, two_stage_summary = assign_rooms_with_cuts(
+                built, solver, status, settings, room_time_limit, update_progress, stop_event,
+            )
+            conflicts = conflicts + room_conflicts
+        else:
+            placements = built.solution_placements(solver)
+    elif hint_placements:
+        logger.info("Solver returned no solution in time; using the warm-start schedule")
+        placements = hint_placements
+        used_warm_start = True
+
+    result = build_result(problem, placements, conflicts, start_time, response_format)
+    log_timing("Output extraction time", output_start)
+    mark("output")
+    proto = built.model.Proto()
+    result["statistics"]["mode"] = mode
+    result["statistics"]["engine"] = engine
+    result["statistics"]["timings"] = timings
+    result["statistics"]["model"] = {"variables": len(proto.variables), "constraints": len(proto.constraints)}
+    result["statistics"]["search"] = search_statistics(built, solver, status, start_time)
+    if used_warm_start:
+        # The timetable is the greedy schedule, not a CP-SAT result
+        search = result["statistics"]["search"]
+        search["solverStatus"] = search["status"]
+        search["status"] = WARM_START_STATUS
+        # An uncompleted hint has no CP-SAT objective; its schedule cost is what the model would give it
+        search["objective"] = (warm_start_summary["objective"] if warm_start_summary["objective"] is not None
+                               else warm_start_summary["cost"])
+    result["statistics"]["solver"] = settings.to_statistics()
+    result["statistics"]["objective"] = objective
+    if stages is not None:
+        result["statistics"]["stages"] = stages
+    if race_summary is not None:
+        result["statistics"]["race"] = race_summary
+    if two_stage_summary is not None:
+        result["statistics"]["twoStage"] = two_stage_summary
+    if lns_summary is not None:
+        result["statistics"]["lns"] = lns_summary
+        if lns_summary["improvements"] and lns_summary["bestBound"] is not None:
+            # An LNS solve only bounds its neighbourhood; the main solve's bound holds for the whole model
+            search = result["statistics"]["search"]
+            search["bestBound"] = lns_summary["bestBound"]
+            search["gap"] = abs(search["objective"] - search["bestBound"]) / max(1.0, abs(search["objective"]))
+    if symmetry_summary is not None:
+        result["statistics"]["symmetry"] = symmetry_summary
+    if warm_start_summary is not None:
+        result["statistics"]["warmStart"] = warm_start_summary
+    if domains_summary is not None:
+        result["statistics"]["domains"] = domains_summary
+    if precheck_summary is not None:
+        result["statistics"]["precheck"] = precheck_summary
+    if stop_event is not None and stop_event.is_set():
+        result["statistics"]["cancelled"] = True
+    if repair_summary is not None:
+        from solver_repair import moved_sessions
+        repair_summary["movedSessions"] = moved_sessions(problem, placements)
+        result["statistics"]["repair"] = repair_summary
+    if export_path is not None:
+        result["statistics"]["export"] = export_path
+    return result
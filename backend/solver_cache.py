@@ -0,0 +1,120 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+
+# Payload parts that describe the problem itself; every other top-level key is
+# a solver setting (engine, mode, timeLimit, ...) and is hashed alongside them
+INPUT_KEYS = ("courses", "faculty", "rooms", "allotments", "existing_timetables")
+
+# Settings that only decide when and on how many cores a job runs, or how
+# its progress is reported; the same problem under a different priority
+# or CPU budget is still a cache hit
+SCHEDULING_KEYS = ("priority", "maxWorkers", "maxProcesses", "streamSolutions")
+
+# In-memory tier bounds
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# On-disk tier, enabled by setting TIMETABLE_CACHE_DIR
+DEFAULT_MAX_DISK_ENTRIES = 256
+
+
+def payload_fingerprint(data):
+    """
+    Content hash of a /generate payload. Dict keys are sorted so the hash does
+    not depend on JSON key order; list order is kept because allotment and
+    room order decide session and room indices in the model. SCHEDULING_KEYS
+    are left out.
+    """
+    canonical = {key: data.get(key) or [] for key in INPUT_KEYS}
+    canonical["settings"] = {
+        k: v for k, v in data.items() if k not in INPUT_KEYS and k not in SCHEDULING_KEYS
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Solved results keyed by payload_fingerprint. The memory tier is an LRU
+    bounded by entry count and by the size of the encoded results; the
+    optional disk tier keeps one JSON file per key and drops the least
+    recently used files beyond max_disk_entries.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 directory=None, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries = collections.OrderedDict()  # key -> (encoded result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, encoded):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if len(encoded) > self.max_bytes:
+            return
+        self._entries[key] = (encoded, len(encoded))
+        self._bytes += len(encoded)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def get(self, key):
+        """Cached result for `key` or None. Every hit returns a fresh copy."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return json.loads(self._entries[key][0])
+            if not self.directory:
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    encoded = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                return None
+            self._remember(key, encoded)
+            return json.loads(encoded)
+
+    def put(self, key, result):
+        encoded = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._remember(key, encoded)
+            if self.directory:
+                self._write_disk(key, encoded)
+
+    def _write_disk(self, key, encoded):
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, self._path(key))
+
+        files = [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".json")]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_disk_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def is_cacheable(result):
+    """Failed runs are not cached so a retry gets a fresh solve."""
+    return bool(result and result.get("success"))
@@ -0,0 +1,320 @@
+import os
+
+# Fallback solver budget, used by anything that runs outside a profile
+DEFAULT_TIME_LIMIT = 1800
+DEFAULT_NUM_WORKERS = 8
+
+# Named CP-SAT setups selectable per request through the "profile" payload key.
+# "timeLimit", "numWorkers" and "relativeGap" in the payload still override them.
+# A profile's time limit covers the whole job, model building included; an
+# explicit "timeLimit" is the solve's own budget, as it always was.
+PROFILES = {
+    # Interactive: a usable timetable in seconds, stop at 5% from the bound
+    "draft": {
+        "time_limit": 20,
+        "num_workers": 4,
+        "relative_gap": 0.05,
+        "search_branching": "AUTOMATIC_SEARCH",
+    },
+    # The original defaults: 30 minutes, 8 workers, stop at 1%
+    "balanced": {
+        "time_limit": DEFAULT_TIME_LIMIT,
+        "num_workers": DEFAULT_NUM_WORKERS,
+        "relative_gap": 0.01,
+        "search_branching": "PORTFOLIO_SEARCH",
+    },
+    # Overnight: run until proven optimal or 8 hours pass, on every core
+    "optimal": {
+        "time_limit": 8 * 3600,
+        "num_workers": max(DEFAULT_NUM_WORKERS, os.cpu_count() or 1),
+        "relative_gap": 0.0,
+        "search_branching": "PORTFOLIO_SEARCH",
+    },
+}
+AUTO_PROFILE = "auto"
+# Requests without a "profile" keep the original defaults
+DEFAULT_PROFILE = "balanced"
+
+# Auto profile thresholds
+AUTO_SMALL_VARIABLES = 5_000       # small enough to prove optimality quickly
+AUTO_LARGE_VARIABLES = 200_000     # large enough to deserve every core
+AUTO_TIGHT_UTILISATION = 0.85      # share of room x slot capacity the sessions need
+AUTO_MIN_TIME_LIMIT = 60
+AUTO_SECONDS_PER_1K_VARIABLES = 5
+
+# Presolve passes cut by SolverSettings.light_presolve. On large models
+# full presolve can outlast a short budget, and CP-SAT only reports a
+# complete warm-start hint as a solution once presolve is done. Symmetry
+# detection is the slowest pass on the many interchangeable room literals,
+# and CP-SAT gives up after presolve once it has used half the budget.
+LIGHT_PRESOLVE_PARAMETERS = {
+    "max_presolve_iterations": 1,
+    "cp_model_probing_level": 0,
+    "find_big_linear_overlap": False,
+    "presolve_inclusion_work_limit": 0,
+    "symmetry_level": 0,
+}
+
+
+# Default weekly grid: five days of six 90-minute slots
+DEFAULT_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+DEFAULT_INTERVALS = [
+    ("08:30", "10:00"),
+    ("10:00", "11:30"),
+    ("11:30", "13:00"),
+    ("13:00", "14:30"),
+    ("14:30", "16:00"),
+    ("16:00", "17:30"),
+]
+# Default slot costs by position in the day: the first four slots cost their
+# position, the fifth is discouraged and anything later strongly so
+PREFERRED_SLOTS_PER_DAY = 4
+LATE_SLOT_COST = 100
+EVENING_SLOT_COST = 10_000
+
+
+def _minutes(clock):
+    hours, _, minutes = clock.partition(":")
+    return int(hours) * 60 + int(minutes)
+
+
+class TimeGrid:
+    """
+    Weekly slot grid of one request. Every day has the same intervals; slot
+    t_idx is interval t_idx % slots_per_day of day t_idx // slots_per_day.
+    The slot lookup, day of every slot, valid starts per session length and
+    break-rule windows are computed once here and shared by existing
+    timetable conversion, every engine, the pre-solve analysis and the
+    validator. `blocked` slots cannot be occupied by any session.
+    """
+
+    def __init__(self, days=None, intervals=None, slot_costs=None, blocked=()):
+        self.days = list(days or DEFAULT_DAYS)
+        self.intervals = [tuple(interval) for interval in (intervals or DEFAULT_INTERVALS)]
+        if len(set(self.days)) != len(self.days):
+            raise ValueError("timeGrid days must be unique")
+        previous_end = None
+        for start, end in self.intervals:
+            if _minutes(start) >= _minutes(end):
+                raise ValueError(f"timeGrid interval {start}-{end} ends before it starts")
+            if previous_end is not None and _minutes(start) < previous_end:
+                raise ValueError(f"timeGrid interval {start}-{end} overlaps the one before it")
+            previous_end = _minutes(end)
+
+        self.slots_per_day = len(self.intervals)
+        self.num_slots = len(self.days) * self.slots_per_day
+        self.slots = [
+            {"day": day, "startTime": start, "endTime": end, "id": f"{day}-{start}"}
+            for day in self.days
+            for start, end in self.intervals
+        ]
+        self.lookup = {(slot["day"], slot["startTime"]): t_idx for t_idx, slot in enumerate(self.slots)}
+        self.day_of = [t_idx // self.slots_per_day for t_idx in range(self.num_slots)]
+        self.blocked = frozenset(blocked)
+        self.open_slots = [t_idx for t_idx in range(self.num_slots) if t_idx not in self.blocked]
+
+        if slot_costs is None:
+            slot_costs = [
+                position if position < PREFERRED_SLOTS_PER_DAY
+                else LATE_SLOT_COST if position == PREFERRED_SLOTS_PER_DAY
+                else EVENING_SLOT_COST
+                for position in range(self.slots_per_day)
+            ]
+        if len(slot_costs) == self.slots_per_day:
+            slot_costs = list(slot_costs) * len(self.days)
+        if len(slot_costs) != self.num_slots:
+            raise ValueError(
+                f"timeGrid slotCosts needs {self.slots_per_day} (per interval) or {self.num_slots} (per slot) values"
+            )
+        self.costs = [int(cost) for cost in slot_costs]
+        self._starts = {}
+
+    @classmethod
+    def from_payload(cls, spec):
+        """
+        Grid from the "timeGrid" payload key:
+            {"days": [...], "intervals": [["08:30", "10:00"], ...],
+             "slotCosts": [...], "blocked": [{"day": "Friday", "startTime": "13:00"}, ...]}
+        Every key is optional; a blocked entry without startTime blocks the whole day.
+        """
+        if not spec:
+            return cls()
+        intervals = spec.get("intervals")
+        if intervals:
+            intervals = [
+                (interval["start"], interval["end"]) if isinstance(interval, dict) else tuple(interval)
+                for interval in intervals
+            ]
+        grid = cls(spec.get("days"), intervals, spec.get("slotCosts"))
+        blocked = set()
+        for item in spec.get("blocked") or []:
+            day, start = item.get("day"), item.get("startTime")
+            if day not in grid.days:
+                raise ValueError(f"timeGrid blocks unknown day '{day}'")
+            if start is None:
+                first = grid.days.index(day) * grid.slots_per_day
+                blocked.update(range(first, first + grid.slots_per_day))
+            elif (day, start) in grid.lookup:
+                blocked.add(grid.lookup[(day, start)])
+            else:
+                raise ValueError(f"timeGrid blocks unknown slot {day} {start}")
+        return cls(grid.days, grid.intervals, grid.costs, blocked)
+
+    def slot_index(self, day, start_time):
+        """t_idx of the slot starting at `start_time` on `day`, or None."""
+        return self.lookup.get((day, start_time))
+
+    def fits(self, t_idx, duration):
+        """A session of `duration` slots can start at `t_idx`: it stays on one day and avoids blocked slots."""
+        last = t_idx + duration - 1
+        if t_idx < 0 or last >= self.num_slots or self.day_of[last] != self.day_of[t_idx]:
+            return False
+        return not any(t in self.blocked for t in range(t_idx, last + 1))
+
+    def valid_starts(self, duration):
+        """Every start slot where a session of `duration` slots fits, cached per duration."""
+        starts = self._starts.get(duration)
+        if starts is None:
+            starts = self._starts[duration] = [t_idx for t_idx in range(self.num_slots) if self.fits(t_idx, duration)]
+        return starts
+
+    def day_slots(self, day_idx):
+        first = day_idx * self.slots_per_day
+        return range(first, first + self.slots_per_day)
+
+    def windows(self, width):
+        """Runs of `width` consecutive slots within one day, for the break rule."""
+        return [
+            range(t_idx, t_idx + width)
+            for day_idx in range(len(self.days))
+            for t_idx in range(day_idx * self.slots_per_day, (day_idx + 1) * self.slots_per_day - width + 1)
+        ]
+
+
+class SolverSettings:
+    """CP-SAT parameters for one solve plus the profile and reason they came from."""
+
+    def __init__(self, profile, time_limit, num_workers, relative_gap, search_branching, reason, random_seed=None,
+                 light_presolve=False):
+        self.profile = profile
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.relative_gap = relative_gap
+        self.search_branching = search_branching
+        self.reason = reason
+        self.random_seed = random_seed
+        self.light_presolve = light_presolve
+
+    def apply(self, solver):
+        from ortools.sat.python import cp_model  # lazy: the server imports this module at startup
+
+        solver.parameters.max_time_in_seconds = self.time_limit
+        solver.parameters.num_search_workers = self.num_workers
+        solver.parameters.relative_gap_limit = self.relative_gap
+        solver.parameters.search_branching = getattr(cp_model, self.search_branching)
+        if self.random_seed is not None:
+            solver.parameters.random_seed = self.random_seed
+        if self.light_presolve:
+            for name, value in LIGHT_PRESOLVE_PARAMETERS.items():
+                setattr(solver.parameters, name, value)
+
+    def to_statistics(self):
+        stats = {
+            "profile": self.profile,
+            "reason": self.reason,
+            "timeLimit": self.time_limit,
+            "numWorkers": self.num_workers,
+            "relativeGap": self.relative_gap,
+        }
+        if self.random_seed is not None:
+            stats["seed"] = self.random_seed
+        if self.light_presolve:
+            stats["lightPresolve"] = True
+        return stats
+
+
+def problem_statistics(problem, num_variables=None):
+    """Size figures the auto profile decides on. Without a built model the
+    variable count is estimated as sessions x compatible rooms x valid starts."""
+    sessions = problem.sessions
+    grid = problem.grid
+    if num_variables is None:
+        num_variables = sum(
+            len(problem.compatible_rooms[s_idx]) * len(grid.valid_starts(session["duration"]))
+            for s_idx, session in enumerate(sessions)
+        )
+    demand = sum(session["duration"] for s_idx, session in enumerate(sessions) if problem.compatible_rooms[s_idx])
+    open_slots = set(grid.open_slots)
+    capacity = sum(len(open_slots - problem.room_busy[room["id"]]) for room in problem.rooms)
+    return {
+        "variables": num_variables,
+        "sessions": len(sessions),
+        "utilisation": demand / capacity if capacity else 1.0,
+    }
+
+
+def choose_auto_profile(stats):
+    """Returns (profile name, time limit or None for the profile default, reason)."""
+    variables, utilisation = stats["variables"], stats["utilisation"]
+    time_limit = AUTO_MIN_TIME_LIMIT + AUTO_SECONDS_PER_1K_VARIABLES * variables // 1000
+    if variables <= AUTO_SMALL_VARIABLES:
+        return "optimal", time_limit, (
+            f"small model ({variables} variables, {stats['sessions']} sessions) can chase optimality within {time_limit}s"
+        )
+    if utilisation >= AUTO_TIGHT_UTILISATION:
+        return "balanced", None, (
+            f"rooms are {utilisation:.0%} booked, so the full balanced budget is kept to fit every session"
+        )
+    time_limit = min(time_limit, PROFILES["balanced"]["time_limit"])
+    if variables >= AUTO_LARGE_VARIABLES:
+        return "optimal", time_limit, (
+            f"large model ({variables} variables) gets every core, budget scaled to {time_limit}s"
+        )
+    return "balanced", time_limit, (
+        f"{variables} variables at {utilisation:.0%} room utilisation, budget scaled to {time_limit}s"
+    )
+
+
+def resolve_solver_settings(data, stats):
+    """
+    Settings for one solve: the requested profile ("draft", "balanced",
+    the default, "optimal" or "auto"), then explicit "timeLimit",
+    "numWorkers" and "relativeGap" overrides, then the "maxWorkers" cap
+    set by the job scheduler. "seed" fixes CP-SAT's random seed, which
+    makes runs repeatable with a single search worker.
+    """
+    requested = data.get("profile") or DEFAULT_PROFILE
+    if requested != AUTO_PROFILE and requested not in PROFILES:
+        raise ValueError(
+            f"Unknown solver profile '{requested}'. Expected one of: {', '.join((*PROFILES, AUTO_PROFILE))}"
+        )
+
+    if requested == AUTO_PROFILE:
+        name, time_limit, reason = choose_auto_profile(stats)
+        params = dict(PROFILES[name])
+        if time_limit is not None:
+            params["time_limit"] = time_limit
+        profile = f"{AUTO_PROFILE}:{name}"
+    else:
+        params = dict(PROFILES[requested])
+        profile = requested
+        reason = "requested"
+
+    overrides = []
+    if data.get("timeLimit"):
+        params["time_limit"] = data["timeLimit"]
+        overrides.append("timeLimit")
+    if data.get("numWorkers"):
+        params["num_workers"] = data["numWorkers"]
+        overrides.append("numWorkers")
+    if data.get("relativeGap") is not None:
+        params["relative_gap"] = data["relativeGap"]
+        overrides.append("relativeGap")
+    if data.get("seed") is not None:
+        params["random_seed"] = int(data["seed"])
+    if data.get("maxWorkers"):
+        params["num_workers"] = min(params["num_workers"], data["maxWorkers"])
+    if overrides:
+        reason += f"; {', '.join(overrides)} set explicitly"
+
+    return SolverSettings(profile=profile, reason=reason, **params)
@@ -0,0 +1,207 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import threading
+import time
+
+from solver import (
+    Colors,
+    DEFAULT_TIME_LIMIT,
+    NormalizedTimetable,
+    log_phase,
+    log_stat,
+)
+from solver_race import StopFlag
+
+# Smallest time budget handed to a single component, in seconds
+MIN_COMPONENT_TIME_LIMIT = 5
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, node):
+        self.parent.setdefault(node, node)
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+def find_components(problem):
+    """
+    Group allotments into independent sub-problems. Two allotments end up in
+    the same component when their sessions share a faculty member, a class or
+    a room either of them could use. Returns lists of allotment indices,
+    largest component first.
+    """
+    uf = _UnionFind()
+    for s_idx, session in enumerate(problem.sessions):
+        node = ("allotment", session["allotIdx"])
+        uf.union(node, ("faculty", session["facultyId"]))
+        uf.union(node, ("class", session["classId"]))
+        for r_idx in problem.compatible_rooms[s_idx]:
+            uf.union(node, ("room", r_idx))
+
+    components = {}
+    sizes = {}
+    for session in problem.sessions:
+        root = uf.find(("allotment", session["allotIdx"]))
+        components.setdefault(root, {})[session["allotIdx"]] = None
+        sizes[root] = sizes.get(root, 0) + 1
+
+    ordered = sorted(components, key=lambda root: -sizes[root])
+    return [list(components[root]) for root in ordered]
+
+
+# Stop flag of the job, shared with every process of the pool (see _init_component_process)
+_component_stop = None
+
+
+def _init_component_process(stop):
+    global _component_stop
+    _component_stop = stop
+
+
+def _solve_component(sub_data, existing_timetables):
+    # Imported here so the worker process loads the solver on its own
+    from solver import generate_timetable
+    return generate_timetable(sub_data, None, None, existing_timetables, stop_event=_component_stop)
+
+
+def _forward_stop(stop_event, stop, futures, finished):
+    """Watcher thread: pass a cancellation on to the component processes and drop components not started yet."""
+    while not finished.is_set():
+        if stop_event.wait(0.2):
+            stop.set()
+            for future in futures:
+                future.cancel()
+            return
+
+
+def solve_components(data, problem, components, existing_timetables, update_progress, start_time, settings,
+                     stop_event=None):
+    """
+    Solve every component in its own process and merge timetables, conflicts
+    and statistics. The time budget is split by session count so all
+    components finish within the requested budget even when they have to
+    queue for a process. The job's search workers (`settings.num_workers`,
+    already capped by the scheduler's "maxWorkers") are split evenly
+    between processes, so a decomposed job uses no more cores than a
+    single solve. Setting `stop_event` stops the running components and
+    skips the queued ones.
+    """
+    log_phase("🧩 PHASE 4: Solving Independent Components")
+
+    budget = data.get("timeLimit") or DEFAULT_TIME_LIMIT
+    cpus = max(1, settings.num_workers)
+    max_processes = max(1, min(len(components), data.get("maxProcesses") or cpus, cpus))
+    workers_each = max(1, cpus // max_processes)
+
+    sessions_per_allotment = {}
+    for session in problem.sessions:
+        sessions_per_allotment[session["allotIdx"]] = sessions_per_allotment.get(session["allotIdx"], 0) + 1
+    total_sessions = sum(sessions_per_allotment.values())
+
+    log_stat("Processes", max_processes, Colors.CYAN)
+    log_stat("Search workers per process", workers_each, Colors.CYAN)
+
+    sub_payloads = []
+    for component in components:
+        size = sum(sessions_per_allotment[a] for a in component)
+        share = budget * max_processes * size / total_sessions
+        sub_data = dict(data)
+        sub_data.update({
+            "allotments": [problem.allotments[a] for a in component],
+            "decompose": False,
+            "timeLimit": min(budget, max(MIN_COMPONENT_TIME_LIMIT, share)),
+            "numWorkers": workers_each,
+            "maxWorkers": workers_each,
+            # Components return plain entries; the merged timetable is normalized below if asked
+            "responseFormat": "entries",
+        })
+        sub_payloads.append(sub_data)
+
+    update_progress("solving", 20, f"Solving {len(components)} independent components...")
+    results = [None] * len(components)
+    ctx = multiprocessing.get_context()
+    stop = StopFlag(ctx)
+    finished = threading.Event()
+    with ProcessPoolExecutor(max_workers=max_processes, mp_context=ctx, initializer=_init_component_process,
+                             initargs=(stop,)) as pool:
+        futures = {
+            pool.submit(_solve_component, sub_data, existing_timetables): c_idx
+            for c_idx, sub_data in enumerate(sub_payloads)
+        }
+        if stop_event is not None:
+            threading.Thread(target=_forward_stop, args=(stop_event, stop, list(futures), finished),
+                             daemon=True).start()
+        try:
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                c_idx = futures[future]
+                if future.cancelled():
+                    continue
+                results[c_idx] = future.result()
+                stats = results[c_idx]["statistics"]
+                log_stat(
+                    f"Component {c_idx + 1}/{len(components)}",
+                    f"{stats['scheduledCourses']} sessions scheduled",
+                    Colors.GREEN,
+                )
+                update_progress(
+                    "solving",
+                    20 + int(70 * done_count / len(components)),
+                    f"Solved {done_count} of {len(components)} components",
+                )
+        finally:
+            finished.set()
+
+    timetable = []
+    conflicts = []
+    scheduled = 0
+    used_slots = 0
+    solved = [result for result in results if result is not None]
+    for result in solved:
+        timetable.extend(result["timetable"])
+        conflicts.extend(result["conflicts"])
+        scheduled += result["statistics"]["scheduledCourses"]
+        used_slots += result["statistics"]["usedSlots"]
+
+    log_stat("Scheduled entries", len(timetable), Colors.GREEN)
+    log_stat("Total execution time", f"{time.time() - start_time:.2f}s", Colors.BOLD)
+
+    success = bool(timetable)
+    if data.get("responseFormat") == "normalized":
+        normalized = NormalizedTimetable()
+        for entry in timetable:
+            normalized.add_entry(entry)
+        timetable = normalized.to_dict()
+
+    statistics = {
+        "scheduledCourses": scheduled,
+        "usedSlots": used_slots,
+        "conflictsFound": len(conflicts),
+        "mode": data.get("mode") or "optimal",
+        "engine": data.get("engine") or "boolean",
+        "components": len(components),
+        "solver": dict(settings.to_statistics(), processes=max_processes, workersPerProcess=workers_each),
+    }
+    if len(solved) < len(components):
+        statistics["skippedComponents"] = len(components) - len(solved)
+    if stop_event is not None and stop_event.is_set():
+        statistics["cancelled"] = True
+
+    return {
+        "success": success,
+        "timetable": timetable,
+        "conflicts": conflicts,
+        "message": "Schedule generated." if success else "No feasible solution found.",
+        "statistics": statistics,
+    }
@@ -0,0 +1,188 @@
+import collections
+import time
+
+from solver import (
+    Colors,
+    is_valid_start,
+    log_stat,
+    log_timing,
+)
+
+
+def slot_mask(slots):
+    """Bitset with bit t set for every t_idx in `slots`."""
+    mask = 0
+    for t_idx in slots:
+        mask |= 1 << t_idx
+    return mask
+
+
+def run_starts(mask, duration):
+    """Bits t of `mask` where t .. t + duration - 1 are all set: the starts a free mask leaves open."""
+    starts = mask
+    for dt in range(1, duration):
+        starts &= mask >> dt
+    return starts
+
+
+def mask_slots(mask):
+    """Ascending t_idx of the set bits of `mask`."""
+    slots = []
+    while mask:
+        low = mask & -mask
+        slots.append(low.bit_length() - 1)
+        mask ^= low
+    return slots
+
+
+class PlacementDomains:
+    """
+    Feasible (room, start slot) pairs of every session, worked out before
+    any model variable exists. Existing-timetable bookings become one free
+    bitset per faculty member and per room, and the starts of a session in
+    a room are the AND of the grid's valid starts, the faculty's free runs
+    and the room's free runs, computed once per (faculty or room, duration).
+
+    With `prune_rooms`, rooms that are interchangeable (compatible with
+    exactly the same sessions and booked in exactly the same slots) are
+    cut down to as many as could ever be busy at once. Those are the
+    distinct classes, or if fewer the distinct faculty members, among the
+    sessions they can host. Sessions on one day are intervals, so any
+    schedule can be recoloured onto that many identical rooms (see remap).
+    Pruning is for the CP-SAT models only; the greedy schedule, the
+    pre-solve analysis and room assignment keep every compatible room.
+    """
+
+    def __init__(self, problem, prune_rooms=True):
+        started = time.time()
+        self.problem = problem
+        grid = problem.grid
+        every_slot = (1 << problem.num_slots) - 1
+        self._grid_starts = {}
+        self._faculty_starts = {}
+        self._room_starts = {}
+        self.faculty_free = {
+            f_id: every_slot & ~slot_mask(busy) for f_id, busy in problem.faculty_busy.items()
+        }
+        self.room_free = [
+            every_slot & ~slot_mask(problem.room_busy.get(room["id"], ())) for room in problem.rooms
+        ]
+        self._every_slot = every_slot
+        self._grid = grid
+
+        self.model_rooms = [list(rooms) for rooms in problem.compatible_rooms]
+        self.kept_rooms = {}     # pruned r_idx -> rooms of its group that stay in the model
+        if prune_rooms and not problem.pinned and not problem.preferred:
+            self._prune_interchangeable_rooms()
+        self.build_time = time.time() - started
+
+    def _starts(self, cache, key, free, duration):
+        if (key, duration) not in cache:
+            cache[(key, duration)] = run_starts(free, duration)
+        return cache[(key, duration)]
+
+    def _valid_starts(self, duration):
+        if duration not in self._grid_starts:
+            self._grid_starts[duration] = slot_mask(self._grid.valid_starts(duration))
+        return self._grid_starts[duration]
+
+    def _prune_interchangeable_rooms(self):
+        problem = self.problem
+        hosts = collections.defaultdict(list)   # r_idx -> sessions that may use it
+        for s_idx, rooms in enumerate(problem.compatible_rooms):
+            for r_idx in rooms:
+                hosts[r_idx].append(s_idx)
+
+        groups = collections.defaultdict(list)  # (sessions, free mask) -> interchangeable rooms
+        for r_idx, sessions in hosts.items():
+            groups[(tuple(sessions), self.room_free[r_idx])].append(r_idx)
+
+        pruned = set()
+        for (sessions, _), rooms in groups.items():
+            classes = {problem.sessions[s_idx]["classId"] for s_idx in sessions}
+            faculty = {problem.sessions[s_idx]["facultyId"] for s_idx in sessions}
+            needed = min(len(classes), len(faculty))
+            if needed >= len(rooms):
+                continue
+            kept = sorted(rooms)[:needed]
+            for r_idx in sorted(rooms)[needed:]:
+                self.kept_rooms[r_idx] = kept
+                pruned.add(r_idx)
+        if pruned:
+            self.model_rooms = [[r_idx for r_idx in rooms if r_idx not in pruned] for rooms in self.model_rooms]
+
+    def placements(self, s_idx):
+        """[(r_idx, [t_idx, ...]), ...] a session may take; pinned sessions only keep their own placement."""
+        session = self.problem.sessions[s_idx]
+        duration = session["duration"]
+        rooms = self.model_rooms[s_idx]
+        allowed = self._valid_starts(duration)
+        if s_idx in self.problem.pinned:
+            pinned_room, pinned_slot = self.problem.pinned[s_idx]
+            rooms = [pinned_room]
+            allowed = (1 << pinned_slot) if is_valid_start(self.problem, session, pinned_slot) else 0
+
+        f_id = session["facultyId"]
+        allowed &= self._starts(self._faculty_starts, f_id, self.faculty_free.get(f_id, self._every_slot), duration)
+        domain = []
+        for r_idx in rooms:
+            starts = allowed & self._starts(self._room_starts, r_idx, self.room_free[r_idx], duration)
+            if starts:
+                domain.append((r_idx, mask_slots(starts)))
+        return domain
+
+    def remap(self, placements):
+        """
+        Move placements out of pruned rooms, e.g. a greedy hint, by
+        recolouring each day's sessions of a room group onto its kept
+        rooms in start order. A placement that finds no free kept room
+        (only if the input clashes) stays where it was.
+        """
+        if not self.kept_rooms:
+            return placements
+        sessions = self.problem.sessions
+        day_of = self._grid.day_of
+        group_of = {}
+        for r_idx, kept in self.kept_rooms.items():
+            group_of[r_idx] = tuple(kept)
+            for k_idx in kept:
+                group_of[k_idx] = tuple(kept)
+
+        result = []
+        by_group_day = collections.defaultdict(list)
+        for placement in placements:
+            s_idx, r_idx, t_idx = placement
+            if r_idx in group_of:
+                by_group_day[(group_of[r_idx], day_of[t_idx])].append(placement)
+            else:
+                result.append(placement)
+        for (kept, _), day_placements in by_group_day.items():
+            free_from = {r_idx: -1 for r_idx in kept}   # r_idx -> first slot it is free again
+            for s_idx, r_idx, t_idx in sorted(day_placements, key=lambda p: p[2]):
+                room = next((k_idx for k_idx in kept if free_from[k_idx] <= t_idx), None)
+                if room is None:
+                    result.append((s_idx, r_idx, t_idx))
+                    continue
+                free_from[room] = t_idx + sessions[s_idx]["duration"]
+                result.append((s_idx, room, t_idx))
+        return result
+
+    def summary(self):
+        return {
+            "prunedRooms": len(self.kept_rooms),
+            "roomChoices": sum(len(rooms) for rooms in self.model_rooms),
+            "compatibleRoomChoices": sum(len(rooms) for rooms in self.problem.compatible_rooms),
+            "time": round(self.build_time, 4),
+        }
+
+
+def compute_domains(problem, prune_rooms=True):
+    """Attach PlacementDomains to `problem` (as problem.domains) and log what the pruning removed."""
+    phase_start = time.time()
+    domains = PlacementDomains(problem, prune_rooms=prune_rooms)
+    problem.domains = domains
+    summary = domains.summary()
+    log_stat("Interchangeable rooms pruned", summary["prunedRooms"], Colors.CYAN)
+    log_stat("Room choices kept", f"{summary['roomChoices']} of {summary['compatibleRoomChoices']}", Colors.CYAN)
+    log_timing("Domain precomputation time", phase_start)
+    return domains
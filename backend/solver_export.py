@@ -0,0 +1,82 @@
+import gzip
+import json
+import os
+import time
+
+from ortools.sat.python import cp_model
+
+from solver_cache import payload_fingerprint
+
+# Every job is exported when TIMETABLE_EXPORT_DIR is set (one directory per job)
+EXPORT_DIR_ENV = "TIMETABLE_EXPORT_DIR"
+
+# Files of one export; the model is CP-SAT text format, since the proto
+# objects of the Python wrapper cannot be serialized to bytes
+PAYLOAD_FILE = "payload.json"
+MODEL_FILE = "model.pbtxt.gz"
+PARAMETERS_FILE = "parameters.json"
+RESULT_FILE = "result.json"
+
+
+def export_directory():
+    return os.environ.get(EXPORT_DIR_ENV) or None
+
+
+def export_job(directory, data, existing_timetables, built, settings, session_id=None, timings=None):
+    """
+    Persist what is needed to reproduce one solve offline: the payload with
+    its existing timetables (PAYLOAD_FILE), the built CP-SAT model including
+    the warm-start hint (MODEL_FILE) and the resolved solver settings with
+    the exact CP-SAT parameters (PARAMETERS_FILE). Exports are named by time
+    and payload fingerprint, since session ids are random. Returns the path.
+    """
+    fingerprint = payload_fingerprint(data)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{fingerprint[:12]}")
+    os.makedirs(path, exist_ok=True)
+
+    with open(os.path.join(path, PAYLOAD_FILE), "w", encoding="utf-8") as f:
+        json.dump(dict(data, existing_timetables=existing_timetables or []), f)
+    proto = built.model.Proto()
+    with gzip.open(os.path.join(path, MODEL_FILE), "wt", encoding="utf-8") as f:
+        f.write(str(proto))
+
+    solver = cp_model.CpSolver()
+    settings.apply(solver)
+    from ortools import __version__ as ortools_version
+    with open(os.path.join(path, PARAMETERS_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "sessionId": session_id,
+            "fingerprint": fingerprint,
+            "exportedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ortools": ortools_version,
+            "engine": data.get("engine") or "boolean",
+            "mode": data.get("mode") or "optimal",
+            "objective": data.get("objective") or "weighted",
+            "solver": settings.to_statistics(),
+            "satParameters": str(solver.parameters),
+            "model": {"variables": len(proto.variables), "constraints": len(proto.constraints)},
+            "timings": dict(timings or {}),
+        }, f, indent=2)
+    return path
+
+
+def finish_export(path, result):
+    """Store the finished job's statistics (timings, search, profile) next to its export."""
+    with open(os.path.join(path, RESULT_FILE), "w", encoding="utf-8") as f:
+        json.dump(result.get("statistics", {}), f, indent=2, default=str)
+
+
+def load_export(path):
+    """(payload, CpModel, parameters dict) of an export; the result statistics are under parameters["result"]."""
+    with open(os.path.join(path, PAYLOAD_FILE), encoding="utf-8") as f:
+        payload = json.load(f)
+    model = cp_model.CpModel()
+    with gzip.open(os.path.join(path, MODEL_FILE), "rt", encoding="utf-8") as f:
+        model.Proto().parse_text_format(f.read())
+    with open(os.path.join(path, PARAMETERS_FILE), encoding="utf-8") as f:
+        parameters = json.load(f)
+    result_path = os.path.join(path, RESULT_FILE)
+    if os.path.exists(result_path):
+        with open(result_path, encoding="utf-8") as f:
+            parameters["result"] = json.load(f)
+    return payload, model, parameters
@@ -0,0 +1,199 @@
+import collections
+import time
+
+from solver import (
+    Colors,
+    NO_ROOM_PENALTY,
+    UNASSIGNED_PENALTY,
+    is_valid_start,
+    log_phase,
+    log_stat,
+    log_timing,
+)
+
+# Scheduling priority by course type (lower goes first), as in TIMETABLE_SYSTEM_DOCS.md
+TYPE_PRIORITY = {"Core": 0, "Major": 1, "Elective": 2}
+
+MAX_PER_DAY = 3
+MAX_LABS_PER_WEEK = 2
+
+
+class _GreedyState:
+    """Occupancy of everything placed so far, checked in O(duration) per candidate."""
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.room_used = set()                         # (r_idx, t_idx)
+        self.faculty_used = set()                      # (faculty_id, t_idx)
+        self.class_used = set()                        # (class_id, t_idx)
+        self.class_starts = set()                      # (class_id, t_idx)
+        self.class_day_count = collections.Counter()   # (class_id, day_idx)
+        self.class_labs = collections.Counter()        # class_id
+        self.course_days = collections.defaultdict(set)  # (class_id, course_id) -> {day_idx}
+
+    def can_start(self, session, t_idx):
+        problem = self.problem
+        class_id = session["classId"]
+        day_idx = t_idx // problem.slots_per_day
+
+        if not is_valid_start(problem, session, t_idx):
+            return False
+        if self.class_day_count[(class_id, day_idx)] >= MAX_PER_DAY:
+            return False
+        if session["isLab"] and self.class_labs[class_id] >= MAX_LABS_PER_WEEK:
+            return False
+
+        busy = problem.faculty_busy[session["facultyId"]]
+        for dt in range(session["duration"]):
+            slot = t_idx + dt
+            if slot in busy or (session["facultyId"], slot) in self.faculty_used:
+                return False
+            if (class_id, slot) in self.class_used:
+                return False
+
+        # Break rule: no three consecutive starts for a class on one day
+        first_in_day = day_idx * problem.slots_per_day
+        last_in_day = first_in_day + problem.slots_per_day - 1
+        for window_start in range(t_idx - 2, t_idx + 1):
+            window = range(window_start, window_start + 3)
+            if window_start < first_in_day or window_start + 2 > last_in_day:
+                continue
+            if all(t == t_idx or (class_id, t) in self.class_starts for t in window):
+                return False
+        return True
+
+    def room_is_free(self, r_idx, session, t_idx):
+        busy = self.problem.room_busy[self.problem.rooms[r_idx]["id"]]
+        return all(
+            t_idx + dt not in busy and (r_idx, t_idx + dt) not in self.room_used
+            for dt in range(session["duration"])
+        )
+
+    def free_room(self, s_idx, session, t_idx):
+        """Smallest compatible room free for the whole session, or None."""
+        problem = self.problem
+        for r_idx in sorted(problem.compatible_rooms[s_idx], key=lambda r: problem.rooms[r]["capacity"]):
+            if self.room_is_free(r_idx, session, t_idx):
+                return r_idx
+        return None
+
+    def place(self, session, r_idx, t_idx):
+        class_id = session["classId"]
+        day_idx = t_idx // self.problem.slots_per_day
+        for dt in range(session["duration"]):
+            self.room_used.add((r_idx, t_idx + dt))
+            self.faculty_used.add((session["facultyId"], t_idx + dt))
+            self.class_used.add((class_id, t_idx + dt))
+        self.class_starts.add((class_id, t_idx))
+        self.class_day_count[(class_id, day_idx)] += 1
+        if session["isLab"]:
+            self.class_labs[class_id] += 1
+        self.course_days[(class_id, session["courseId"])].add(day_idx)
+
+
+def session_priority(problem, s_idx):
+    session = problem.sessions[s_idx]
+    course = problem.course_map[session["courseId"]]
+    return (
+        TYPE_PRIORITY.get(course.get("type"), len(TYPE_PRIORITY)),
+        -course.get("credits", 3),
+        session["allotIdx"],
+        s_idx,
+    )
+
+
+def greedy_schedule(problem):
+    """
+    Priority-ordered greedy placer (Core > Major > Elective, higher credits
+    first). Each session takes the cheapest start slot that passes every hard
+    rule of the CP-SAT model, preferring days on which the class does not
+    have that course yet, and the smallest free room that fits. In repair
+    mode pinned sessions are placed first and freed sessions try their
+    previous placement before anything else.
+    Returns (placements, unplaced session indices).
+    """
+    log_phase("⚡ Greedy Construction")
+    phase_start = time.time()
+    state = _GreedyState(problem)
+
+    slot_order = sorted(range(problem.num_slots), key=lambda t: (problem.slot_costs[t], t))
+    placements = []
+    unplaced = []
+
+    # Repair mode: pinned sessions go in first, exactly where they were
+    for s_idx, (r_idx, t_idx) in problem.pinned.items():
+        state.place(problem.sessions[s_idx], r_idx, t_idx)
+        placements.append((s_idx, r_idx, t_idx))
+
+    order = sorted(
+        (s for s in range(len(problem.sessions)) if s not in problem.pinned),
+        key=lambda s: session_priority(problem, s),
+    )
+    for s_idx in order:
+        session = problem.sessions[s_idx]
+        if not problem.compatible_rooms[s_idx]:
+            unplaced.append(s_idx)
+            continue
+
+        preferred = problem.preferred.get(s_idx)
+        if preferred is not None and state.can_start(session, preferred[1]):
+            r_idx, t_idx = preferred
+            if state.room_is_free(r_idx, session, t_idx):
+                state.place(session, r_idx, t_idx)
+                placements.append((s_idx, r_idx, t_idx))
+                continue
+
+        used_days = state.course_days[(session["classId"], session["courseId"])]
+        placed = False
+        # Two passes: first spread the course over different days, then allow repeats
+        for spread in (True, False):
+            for t_idx in slot_order:
+                if spread and t_idx // problem.slots_per_day in used_days:
+                    continue
+                if not state.can_start(session, t_idx):
+                    continue
+                r_idx = state.free_room(s_idx, session, t_idx)
+                if r_idx is None:
+                    continue
+                state.place(session, r_idx, t_idx)
+                placements.append((s_idx, r_idx, t_idx))
+                placed = True
+                break
+            if placed:
+                break
+        if not placed:
+            unplaced.append(s_idx)
+
+    log_stat("Greedy placements", len(placements), Colors.GREEN)
+    log_stat("Greedy unplaced", len(unplaced), Colors.YELLOW if unplaced else Colors.GREEN)
+    log_timing("Greedy time", phase_start)
+    return placements, unplaced
+
+
+def unplaced_conflicts(problem, unplaced):
+    """Conflict entries for sessions the greedy placer could not fit."""
+    conflicts = []
+    for s_idx in unplaced:
+        session = problem.sessions[s_idx]
+        if not problem.compatible_rooms[s_idx]:
+            continue  # already reported by find_compatible_rooms
+        course = problem.course_map[session["courseId"]]
+        conflicts.append({
+            "type": "unscheduled",
+            "message": f"Course {course['code']} ({session['classId']}) could not be placed in any free slot.",
+            "affectedEntries": [session["id"]],
+            "severity": "error"
+        })
+    return conflicts
+
+
+def schedule_cost(problem, placements):
+    """Objective value the CP-SAT models assign to `placements`."""
+    placed = {s_idx for s_idx, _, _ in placements}
+    cost = sum(problem.slot_costs[t_idx] for _, _, t_idx in placements)
+    for s_idx in range(len(problem.sessions)):
+        if not problem.compatible_rooms[s_idx]:
+            cost += NO_ROOM_PENALTY
+        elif s_idx not in placed:
+            cost += UNASSIGNED_PENALTY
+    return cost
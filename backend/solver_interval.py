@@ -0,0 +1,194 @@
+from ortools.sat.python import cp_model
+import collections
+import time
+
+from solver import (
+    Colors,
+    NO_ROOM_PENALTY,
+    TimetableModel,
+    UNASSIGNED_PENALTY,
+    VariableIndex,
+    add_class_limit_constraints,
+    log_progress,
+    log_stat,
+    log_timing,
+)
+
+
+class IntervalTimetableModel(TimetableModel):
+    """
+    One optional interval per session with a start-slot variable and a room
+    choice. Exclusivity is expressed with NoOverlap instead of per-slot sums.
+    """
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.starts = {}         # s_idx -> IntVar (start slot)
+        self.room_choice = {}    # s_idx -> {r_idx: BoolVar}
+        self.start_literals = {} # s_idx -> {t_idx: BoolVar}
+
+    def placements(self, value):
+        result = []
+        for s_idx, present in self.is_assigned.items():
+            if s_idx not in self.starts or value(present) != 1:
+                continue
+            t_idx = value(self.starts[s_idx])
+            r_idx = next(r for r, lit in self.room_choice[s_idx].items() if value(lit) == 1)
+            result.append((s_idx, r_idx, t_idx))
+        return result
+
+    def add_hints(self, placements):
+        chosen = {s_idx: (r_idx, t_idx) for s_idx, r_idx, t_idx in placements}
+        for s_idx, present in self.is_assigned.items():
+            if s_idx not in self.starts:
+                continue
+            placement = chosen.get(s_idx)
+            self.model.AddHint(present, int(placement is not None))
+            if placement is None:
+                continue
+            r_idx, t_idx = placement
+            self.model.AddHint(self.starts[s_idx], t_idx)
+            for r, lit in self.room_choice[s_idx].items():
+                self.model.AddHint(lit, int(r == r_idx))
+            for t, lit in self.start_literals[s_idx].items():
+                self.model.AddHint(lit, int(t == t_idx))
+
+    def slot_starts(self, s_idx):
+        return dict(self.start_literals.get(s_idx, {}))
+
+    def placement_literals(self, s_idx, r_idx, t_idx):
+        start_lit = self.start_literals.get(s_idx, {}).get(t_idx)
+        room_lit = self.room_choice.get(s_idx, {}).get(r_idx)
+        if start_lit is None or room_lit is None:
+            return []
+        return [start_lit, room_lit]
+
+
+def day_start_domain(problem, session):
+    """
+    Start slots that keep the whole session inside one day and off blocked
+    slots, taken from the time grid instead of enumerating room x slot pairs.
+    """
+    return cp_model.Domain.FromValues(problem.grid.valid_starts(session["duration"]))
+
+
+def build_interval_model(problem):
+    """
+    PHASE 3 (interval engine): optional intervals with AddNoOverlap per room,
+    per faculty and per class. Produces the same feasible schedules and
+    objective as the boolean engine with sessions x (rooms + slots) variables
+    instead of sessions x rooms x slots.
+    """
+    built = IntervalTimetableModel(problem)
+    model = built.model
+    sessions = problem.sessions
+    var_index = VariableIndex()
+
+    room_intervals = collections.defaultdict(list)
+    faculty_intervals = collections.defaultdict(list)
+    class_intervals = collections.defaultdict(list)
+
+    # -----------------------------
+    # Variables
+    # -----------------------------
+    phase_start = time.time()
+    num_literals = 0
+    for s_idx, session in enumerate(sessions):
+        compatible_rooms = problem.compatible_rooms[s_idx]
+        duration = session["duration"]
+
+        if not compatible_rooms:
+            built.is_assigned[s_idx] = model.NewBoolVar(f"is_assigned_{s_idx}_none")
+            model.Add(built.is_assigned[s_idx] == 0)
+            built.objective_terms.append(NO_ROOM_PENALTY)
+            continue
+        if problem.domains is not None:
+            compatible_rooms = problem.domains.model_rooms[s_idx]  # interchangeable rooms pruned
+
+        # Day-boundary domain, minus the slots where the faculty is already booked
+        domain = day_start_domain(problem, session)
+        busy = problem.faculty_busy[session["facultyId"]]
+        blocked = {t - dt for t in busy for dt in range(duration)}
+        if blocked:
+            domain = domain.intersection_with(
+                cp_model.Domain.FromValues(sorted(blocked)).complement()
+            )
+        if s_idx in problem.pinned:
+            # Pinned sessions (repair mode) may only keep their placement
+            pinned_room, pinned_slot = problem.pinned[s_idx]
+            compatible_rooms = [pinned_room]
+            domain = domain.intersection_with(cp_model.Domain.FromValues([pinned_slot]))
+        start_values = domain.FlattenedIntervals()
+        starts = [t for lo, hi in zip(start_values[::2], start_values[1::2]) for t in range(lo, hi + 1)]
+
+        present = model.NewBoolVar(f"is_assigned_{s_idx}")
+        built.is_assigned[s_idx] = present
+        built.objective_terms.append((1 - present) * UNASSIGNED_PENALTY)
+
+        if not starts:
+            model.Add(present == 0)
+            continue
+
+        start = model.NewIntVarFromDomain(domain, f"start_s{s_idx}")
+        built.starts[s_idx] = start
+
+        interval = model.NewOptionalFixedSizeIntervalVar(start, duration, present, f"iv_s{s_idx}")
+        faculty_intervals[session["facultyId"]].append(interval)
+        class_intervals[session["classId"]].append(interval)
+
+        # Room choice: one optional interval per compatible room, sharing the start
+        rooms_for_session = {}
+        for r_idx in compatible_rooms:
+            lit = model.NewBoolVar(f"room_s{s_idx}_r{r_idx}")
+            rooms_for_session[r_idx] = lit
+            room_intervals[r_idx].append(
+                model.NewOptionalFixedSizeIntervalVar(start, duration, lit, f"iv_s{s_idx}_r{r_idx}")
+            )
+        model.Add(sum(rooms_for_session.values()) == present)
+        built.room_choice[s_idx] = rooms_for_session
+
+        # Start-slot literals feed the daily, break and lab rules and the slot cost
+        slot_literals = {}
+        for t_idx in starts:
+            lit = model.NewBoolVar(f"at_s{s_idx}_t{t_idx}")
+            model.Add(start == t_idx).OnlyEnforceIf(lit)
+            slot_literals[t_idx] = lit
+            var_index.add_start(lit, session, t_idx, t_idx // problem.slots_per_day)
+            built.objective_terms.append(lit * problem.slot_costs[t_idx])
+        model.Add(sum(slot_literals.values()) == present)
+        built.start_literals[s_idx] = slot_literals
+
+        num_literals += len(rooms_for_session) + len(slot_literals)
+
+    log_stat("Interval sessions", len(built.starts), Colors.GREEN)
+    log_stat("Room/slot literals created", num_literals, Colors.GREEN)
+    log_timing("Variable creation time", phase_start)
+
+    # -----------------------------
+    # Hard Constraints
+    # -----------------------------
+    log_progress("Adding room NoOverlap constraints...")
+    phase_start = time.time()
+    for r_idx, intervals in room_intervals.items():
+        # Slots already booked by existing timetables become fixed intervals
+        for t_idx in sorted(problem.room_busy[problem.rooms[r_idx]["id"]]):
+            intervals.append(model.NewFixedSizeIntervalVar(t_idx, 1, f"busy_r{r_idx}_t{t_idx}"))
+        model.AddNoOverlap(intervals)
+    log_timing("Room constraints time", phase_start)
+
+    log_progress("Adding faculty NoOverlap constraints...")
+    phase_start = time.time()
+    for f_id in problem.faculty_map:
+        if faculty_intervals.get(f_id):
+            model.AddNoOverlap(faculty_intervals[f_id])
+    log_timing("Faculty constraints time", phase_start)
+
+    log_progress("Adding student clash NoOverlap constraints...")
+    phase_start = time.time()
+    for intervals in class_intervals.values():
+        model.AddNoOverlap(intervals)
+    log_timing("Student clash constraints time", phase_start)
+
+    add_class_limit_constraints(model, var_index, problem)
+
+    return built
@@ -0,0 +1,122 @@
+import collections
+import copy
+import random
+import time
+
+from ortools.sat.python import cp_model
+
+from solver import (
+    Colors,
+    log_phase,
+    log_stat,
+)
+from solver_metrics import record_search, solver_response_statistics
+
+# Share of the time budget kept back for the LNS phase when "lns" is on
+LNS_TIME_SHARE = 0.3
+
+# Budget of one neighbourhood re-solve, in seconds
+LNS_ITERATION_TIME_LIMIT = 5
+
+# solver_response_statistics fields summed over the re-solves
+LNS_COUNTERS = ("conflicts", "branches", "booleans", "propagations", "wallTime", "userTime", "deterministicTime")
+
+
+def neighbourhoods(problem, placements):
+    """
+    Candidate neighbourhoods of an incumbent: every (class, day) with a
+    placement and every faculty member teaching a session. Each maps to the
+    sessions it frees.
+    """
+    by_class_day = collections.defaultdict(list)
+    by_faculty = collections.defaultdict(list)
+    for s_idx, _, t_idx in placements:
+        session = problem.sessions[s_idx]
+        by_class_day[("class-day", session["classId"], problem.grid.day_of[t_idx])].append(s_idx)
+        by_faculty[("faculty", session["facultyId"])].append(s_idx)
+    return [dict(by_class_day), dict(by_faculty)]
+
+
+def improve_with_lns(built, solver, status, hint_placements, settings, time_budget, update_progress,
+                     stop_event=None):
+    """
+    Large-neighbourhood search after the main solve. Each iteration frees
+    the sessions of one class on one day or of one faculty member (the two
+    kinds alternate), fixes every other placed session of the incumbent on
+    a clone of the built model, hints the incumbent and re-solves for at
+    most LNS_ITERATION_TIME_LIMIT seconds. Unplaced sessions are always
+    free. A strictly better objective becomes the new incumbent.
+    Starts from the solver's solution, or from `hint_placements` (the warm
+    start) when the main solve found none. Returns (solver, status,
+    summary) with the solver of the last improvement.
+    """
+    log_phase("🔁 LNS Improvement")
+    problem = built.problem
+    feasible = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    incumbent = built.solution_placements(solver) if feasible else list(hint_placements or [])
+    objective = solver.ObjectiveValue() if feasible else None
+    summary = {"iterations": 0, "improvements": 0, "objectiveBefore": objective,
+               "bestBound": solver.BestObjectiveBound() if feasible else None}
+    skip = None
+    if not incumbent:
+        skip = "no incumbent"
+    elif feasible and objective - summary["bestBound"] <= settings.relative_gap * max(1.0, abs(objective)):
+        skip = "gap already closed"
+    if skip:
+        summary["objectiveAfter"] = objective
+        log_stat("LNS skipped", skip, Colors.YELLOW)
+        return solver, status, summary
+
+    # Search counters of every re-solve, recorded as one search in the job profile
+    totals = collections.Counter()
+    rng = random.Random(settings.random_seed or 0)
+    iteration_settings = copy.copy(settings)
+    deadline = time.time() + time_budget
+    lns_start = time.time()
+    while time.time() < deadline - 0.5 and not (stop_event is not None and stop_event.is_set()):
+        kinds = [kind for kind in neighbourhoods(problem, incumbent) if kind]
+        if not kinds:
+            break
+        candidates = kinds[summary["iterations"] % len(kinds)]
+        name = rng.choice(sorted(candidates))
+        freed = set(candidates[name])
+
+        built.model.ClearHints()
+        built.add_hints(incumbent)
+        model = built.model.Clone()
+        for s_idx, r_idx, t_idx in incumbent:
+            if s_idx in freed:
+                continue
+            for lit in built.placement_literals(s_idx, r_idx, t_idx):
+                model.Add(model.GetBoolVarFromProtoIndex(lit.Index()) == 1)
+
+        iteration_settings.time_limit = min(LNS_ITERATION_TIME_LIMIT, max(0.5, deadline - time.time()))
+        if settings.random_seed is not None:
+            iteration_settings.random_seed = settings.random_seed + summary["iterations"]
+        candidate = cp_model.CpSolver()
+        iteration_settings.apply(candidate)
+        candidate_status = candidate.Solve(model)
+        stats = solver_response_statistics(candidate, candidate_status)
+        totals.update({key: stats[key] for key in LNS_COUNTERS})
+        summary["iterations"] += 1
+
+        if candidate_status in (cp_model.OPTIMAL, cp_model.FEASIBLE) and (
+            objective is None or candidate.ObjectiveValue() < objective - 1e-6
+        ):
+            objective = candidate.ObjectiveValue()
+            incumbent = built.solution_placements(candidate)
+            solver, status = candidate, cp_model.FEASIBLE
+            summary["improvements"] += 1
+            built.solutions_found += 1
+            log_stat(f"LNS {'/'.join(str(part) for part in name)}", f"cost {objective:.0f}", Colors.GREEN)
+            update_progress("solving", 90, f"Improving... LNS cost {objective:.0f}", built.solutions_found, objective)
+
+    summary["objectiveAfter"] = objective
+    summary["time"] = round(time.time() - lns_start, 3)
+    record_search(dict(
+        {key: round(totals[key], 3) for key in LNS_COUNTERS},
+        status="LNS", presolveTime=None, iterations=summary["iterations"],
+    ))
+    log_stat("LNS iterations", summary["iterations"], Colors.CYAN)
+    log_stat("LNS improvements", summary["improvements"], Colors.GREEN)
+    return solver, status, summary
@@ -0,0 +1,216 @@
+import collections
+import contextlib
+import re
+import sys
+import threading
+import time
+
+# Histogram buckets for phase and job durations, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800, 3600)
+
+# Prometheus metric types and help texts; anything rendered must be listed here
+METRICS = {
+    "timetable_jobs_total": ("counter", "Generation jobs finished, by final status"),
+    "timetable_cache_hits_total": ("counter", "Generation requests answered from the result cache"),
+    "timetable_job_duration_seconds": ("histogram", "Wall time of finished generation jobs"),
+    "timetable_phase_duration_seconds": ("histogram", "Wall time of each generate_timetable phase"),
+    "timetable_solver_conflicts_total": ("counter", "CP-SAT conflicts over all solves"),
+    "timetable_solver_branches_total": ("counter", "CP-SAT branches over all solves"),
+    "timetable_solver_presolve_seconds_total": ("counter", "CP-SAT presolve wall time over all solves"),
+    "timetable_solver_wall_seconds_total": ("counter", "CP-SAT wall time over all solves"),
+    "timetable_worker_peak_rss_bytes": ("gauge", "Highest peak RSS reported by a solver worker"),
+    "timetable_jobs_queued": ("gauge", "Jobs waiting for a free solver"),
+    "timetable_jobs_running": ("gauge", "Jobs being solved"),
+    "timetable_solver_workers": ("gauge", "Solver worker processes"),
+}
+
+_active = threading.local()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where `resource` is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def metric_key(label):
+    """'Room constraints time' -> 'room_constraints'."""
+    label = re.sub(r"\s+time$", "", label.strip(), flags=re.IGNORECASE)
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+class JobProfile:
+    """
+    Structured record of one generate_timetable run: the duration of every
+    phase in the order they ran, the counts logged along the way and the
+    response statistics of every CP-SAT solve. Solver workers are
+    persistent, so their peak RSS covers every job they ran; the profile
+    reports it as workerPeakRssMb and, as this job's share, by how much the
+    job raised it (0 when the job stayed under an earlier job's peak).
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.rss_baseline = peak_rss_mb()
+        self.phases = []    # (phase key, seconds)
+        self.counts = {}
+        self.searches = []
+
+    def add_phase(self, label, seconds):
+        self.phases.append((metric_key(label), seconds))
+
+    def add_count(self, label, value):
+        self.counts[metric_key(label)] = value
+
+    def add_search(self, stats):
+        self.searches.append(stats)
+
+    def to_dict(self):
+        peak_rss = peak_rss_mb()
+        return {
+            "totalSeconds": round(time.time() - self.started, 3),
+            "phases": [{"phase": phase, "seconds": round(seconds, 4)} for phase, seconds in self.phases],
+            "counts": dict(self.counts),
+            "search": list(self.searches),
+            "workerPeakRssMb": peak_rss,
+            "peakRssGrowthMb": (round(peak_rss - self.rss_baseline, 1)
+                                if peak_rss is not None and self.rss_baseline is not None else None),
+        }
+
+
+@contextlib.contextmanager
+def profiling(profile):
+    """Send record_* calls made on this thread to `profile` for the duration of the block."""
+    previous = getattr(_active, "profile", None)
+    _active.profile = profile
+    try:
+        yield profile
+    finally:
+        _active.profile = previous
+
+
+def record_phase(label, seconds):
+    profile = getattr(_active, "profile", None)
+    if profile is not None:
+        profile.add_phase(label, seconds)
+
+
+def record_count(label, value):
+    profile = getattr(_active, "profile", None)
+    if profile is not None and isinstance(value, int) and not isinstance(value, bool):
+        profile.add_count(label, value)
+
+
+def record_search(stats):
+    profile = getattr(_active, "profile", None)
+    if profile is not None:
+        profile.add_search(stats)
+
+
+def solver_response_statistics(solver, status):
+    """Search counters of a finished CP-SAT solve. Presolve time is read from the solve log."""
+    response = solver.ResponseProto()
+    match = re.search(r"Starting search at ([\d.]+)s", response.solve_log)
+    return {
+        "status": solver.StatusName(status),
+        "conflicts": response.num_conflicts,
+        "branches": response.num_branches,
+        "booleans": response.num_booleans,
+        "propagations": response.num_binary_propagations + response.num_integer_propagations,
+        "presolveTime": float(match.group(1)) if match else None,
+        "wallTime": round(response.wall_time, 3),
+        "userTime": round(response.user_time, 3),
+        "deterministicTime": round(response.deterministic_time, 3),
+    }
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide Prometheus counters, gauges and histograms, fed with the
+    profiles of finished jobs and rendered in the text exposition format.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = collections.defaultdict(float)   # (name, labels) -> counter or gauge value
+        self._histograms = {}                            # (name, labels) -> [bucket counts, sum, count]
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] += value
+
+    def set_max(self, name, value, **labels):
+        with self._lock:
+            key = (name, tuple(sorted(labels.items())))
+            self._values[key] = max(self._values[key], value)
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            key = (name, tuple(sorted(labels.items())))
+            histogram = self._histograms.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for b_idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][b_idx] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def observe_job(self, status, result):
+        """Count a finished job and fold in the profile carried by its result, if any."""
+        self.inc("timetable_jobs_total", status=status)
+        profile = ((result or {}).get("statistics") or {}).get("profile")
+        if not profile:
+            return
+        self.observe("timetable_job_duration_seconds", profile["totalSeconds"])
+        for phase in profile["phases"]:
+            self.observe("timetable_phase_duration_seconds", phase["seconds"], phase=phase["phase"])
+        for search in profile["search"]:
+            self.inc("timetable_solver_conflicts_total", search["conflicts"])
+            self.inc("timetable_solver_branches_total", search["branches"])
+            self.inc("timetable_solver_wall_seconds_total", search["wallTime"])
+            if search["presolveTime"] is not None:
+                self.inc("timetable_solver_presolve_seconds_total", search["presolveTime"])
+        if profile.get("workerPeakRssMb") is not None:
+            self.set_max("timetable_worker_peak_rss_bytes", int(profile["workerPeakRssMb"] * 1024 * 1024))
+
+    def render(self, gauges=None):
+        """Prometheus text format; `gauges` adds point-in-time values such as queue length."""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+        for name, value in (gauges or {}).items():
+            values[(name, ())] = value
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            samples = sorted((labels, v) for (n, labels), v in values.items() if n == name)
+            series = sorted((labels, h) for (n, labels), h in histograms.items() if n == name)
+            if not samples and not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for labels, (counts, total, count) in series:
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,192 @@
+import collections
+import time
+
+from solver import (
+    Colors,
+    is_valid_start,
+    log_phase,
+    log_stat,
+    log_timing,
+)
+from solver_greedy import MAX_LABS_PER_WEEK, MAX_PER_DAY
+
+
+class PrecheckReport:
+    """Findings of analyze_problem: conflict entries plus the sessions to leave out of the model."""
+
+    def __init__(self):
+        self.conflicts = []
+        self.unplaceable = set()   # sessions with no start slot and room left at all
+        self.surplus = set()       # sessions beyond a proven limit, left out so the rest keep the budget
+
+    @property
+    def excluded(self):
+        return self.unplaceable | self.surplus
+
+    def add(self, conflict_type, message, session_ids):
+        self.conflicts.append({
+            "type": conflict_type,
+            "message": message,
+            "affectedEntries": session_ids,
+            "severity": "error"
+        })
+
+    def summary(self, num_sessions):
+        return {
+            "contradictions": len(self.conflicts),
+            "unplaceableSessions": len(self.unplaceable),
+            "surplusSessions": len(self.surplus),
+            "placeableSessions": num_sessions - len(self.excluded),
+        }
+
+    def drop_surplus(self, problem):
+        """
+        Leave the surplus sessions out of every model: a session without
+        compatible rooms gets no variables, no greedy placement and no
+        share of the room utilisation the auto profile sizes the budget by.
+        Its contradiction is already among the conflicts.
+        """
+        for s_idx in self.surplus:
+            problem.compatible_rooms[s_idx] = []
+
+
+def _free_lab_starts(problem, r_idx):
+    """Non-overlapping 2-slot lab placements a room can still host in a week."""
+    busy = problem.room_busy[problem.rooms[r_idx]["id"]] | problem.grid.blocked
+    count = 0
+    for day_idx in range(len(problem.days)):
+        t_idx = day_idx * problem.slots_per_day
+        day_end = t_idx + problem.slots_per_day
+        while t_idx + 1 < day_end:
+            if t_idx not in busy and t_idx + 1 not in busy:
+                count += 1
+                t_idx += 2
+            else:
+                t_idx += 1
+    return count
+
+
+def analyze_problem(problem):
+    """
+    PHASE 2b: counting arguments that prove, in milliseconds, that some
+    sessions can never all be scheduled:
+      - a class needs more labs than MAX_LABS_PER_WEEK, or more session
+        starts than its open days allow (MAX_PER_DAY each, fewer on a day
+        with fewer open slots; days the timeGrid blocks count for nothing)
+      - a faculty member teaches more slots than they have free after
+        existing timetables are blocked out
+      - lab sessions need more lab-room slots than the lab-capable rooms have
+      - a session has no start slot where its faculty and some compatible
+        room are both free
+    Each count only proves how many sessions are too many, so just that many
+    (the last ones of the group, after earlier findings) become surplus; the
+    rest are solved with the full budget. Returns a PrecheckReport; its
+    conflicts use the frontend conflict types.
+    """
+    log_phase("🔎 PHASE 2b: Pre-solve Analysis")
+    phase_start = time.time()
+    report = PrecheckReport()
+    sessions = problem.sessions
+
+    by_class = collections.defaultdict(list)
+    by_faculty = collections.defaultdict(list)
+    for s_idx, session in enumerate(sessions):
+        if problem.compatible_rooms[s_idx]:
+            by_class[session["classId"]].append(s_idx)
+            by_faculty[session["facultyId"]].append(s_idx)
+
+    def remaining(group):
+        # Pinned sessions (repair mode) go first, so the surplus is taken from the others
+        return sorted((s for s in group if s not in report.surplus), key=lambda s: s not in problem.pinned)
+
+    # Class load; a class's sessions never overlap, so a day holds at most
+    # as many of its starts as it has open slots
+    open_per_day = collections.Counter(problem.grid.day_of[t_idx] for t_idx in problem.grid.valid_starts(1))
+    max_starts = sum(min(MAX_PER_DAY, open_slots) for open_slots in open_per_day.values())
+    for class_id, class_sessions in by_class.items():
+        labs = remaining(s for s in class_sessions if sessions[s]["isLab"])
+        if len(labs) > MAX_LABS_PER_WEEK:
+            report.surplus.update(labs[MAX_LABS_PER_WEEK:])
+            report.add(
+                "daily-limit",
+                f"Class {class_id} has {len(labs)} labs but at most {MAX_LABS_PER_WEEK} are allowed per week; "
+                f"{len(labs) - MAX_LABS_PER_WEEK} left unscheduled.",
+                [sessions[s]["id"] for s in labs],
+            )
+        kept = remaining(class_sessions)
+        if len(kept) > max_starts:
+            report.surplus.update(kept[max_starts:])
+            report.add(
+                "daily-limit",
+                f"Class {class_id} has {len(kept)} sessions but at most {max_starts} fit "
+                f"({len(open_per_day)} open days, at most {MAX_PER_DAY} per day); "
+                f"{len(kept) - max_starts} left unscheduled.",
+                [sessions[s]["id"] for s in class_sessions],
+            )
+
+    # Faculty load (only faculty in the payload are constrained by the model)
+    for f_id, faculty_sessions in by_faculty.items():
+        if f_id not in problem.faculty_map:
+            continue
+        kept = remaining(faculty_sessions)
+        needed = sum(sessions[s]["duration"] for s in kept)
+        free = len(problem.grid.open_slots) - len(problem.faculty_busy[f_id] - problem.grid.blocked)
+        if needed > free:
+            report.add(
+                "faculty-clash",
+                f"{problem.faculty_map[f_id]['name']} teaches {needed} slots but only {free} are free "
+                f"after existing timetables; sessions beyond that are left unscheduled.",
+                [sessions[s]["id"] for s in faculty_sessions],
+            )
+            while needed > free:
+                s_idx = kept.pop()
+                needed -= sessions[s_idx]["duration"]
+                report.surplus.add(s_idx)
+
+    # Lab room capacity
+    lab_sessions = [s for s, session in enumerate(sessions) if session["isLab"] and problem.compatible_rooms[s]]
+    if lab_sessions:
+        lab_rooms = {r_idx for s in lab_sessions for r_idx in problem.compatible_rooms[s]}
+        capacity = sum(_free_lab_starts(problem, r_idx) for r_idx in lab_rooms)
+        kept = remaining(lab_sessions)
+        if len(kept) > capacity:
+            report.surplus.update(kept[capacity:])
+            report.add(
+                "capacity-overflow",
+                f"{len(kept)} lab sessions need a lab room but the lab-capable rooms only have "
+                f"{capacity} free double slots; {len(kept) - capacity} left unscheduled.",
+                [sessions[s]["id"] for s in lab_sessions],
+            )
+
+    # Sessions blocked out entirely by existing timetables
+    for s_idx, session in enumerate(sessions):
+        compatible_rooms = problem.compatible_rooms[s_idx]
+        if not compatible_rooms or s_idx in report.surplus:
+            continue  # already reported by find_compatible_rooms or above
+        busy = problem.faculty_busy[session["facultyId"]]
+        duration = session["duration"]
+        placeable = any(
+            is_valid_start(problem, session, t_idx)
+            and all(t_idx + dt not in busy for dt in range(duration))
+            and any(
+                all(t_idx + dt not in problem.room_busy[problem.rooms[r_idx]["id"]] for dt in range(duration))
+                for r_idx in compatible_rooms
+            )
+            for t_idx in problem.grid.valid_starts(duration)
+        )
+        if not placeable:
+            report.unplaceable.add(s_idx)
+            course = problem.course_map[session["courseId"]]
+            report.add(
+                "no-slot",
+                f"Course {course['code']} ({session['classId']}) has no slot where its faculty and a "
+                f"suitable room are both free.",
+                [session["id"]],
+            )
+
+    log_stat("Contradictions found", len(report.conflicts), Colors.RED if report.conflicts else Colors.GREEN)
+    log_stat("Sessions with no possible slot", len(report.unplaceable),
+             Colors.YELLOW if report.unplaceable else Colors.GREEN)
+    log_stat("Surplus sessions left out", len(report.surplus), Colors.YELLOW if report.surplus else Colors.GREEN)
+    log_timing("Analysis time", phase_start)
+    return report
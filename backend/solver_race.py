@@ -0,0 +1,368 @@
+import copy
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import numpy as np
+from google.protobuf.descriptor import FieldDescriptor
+from ortools.sat import cp_model_pb2
+from ortools.sat.python import cp_model
+
+from solver import (
+    Colors,
+    log_phase,
+    log_stat,
+    stop_when_set,
+)
+from solver_metrics import record_search, solver_response_statistics
+
+logger = logging.getLogger(__name__)
+
+# Racing processes per solve when the payload just says "race": true
+DEFAULT_RACE_ENTRANTS = 4
+
+# Search setups the entrants cycle through; entrant i also gets seed + i.
+# Each one is a different bet: the default portfolio, a tighter LP
+# relaxation, core-based bounds that prove the gap sooner, and no presolve
+# (presolve alone can take most of a short budget on large models).
+RACE_CONFIGS = (
+    {"name": "portfolio", "search_branching": "PORTFOLIO_SEARCH"},
+    {"name": "lp", "search_branching": "AUTOMATIC_SEARCH", "linearization_level": 2},
+    {"name": "core", "search_branching": "PORTFOLIO_SEARCH", "optimize_with_core": True},
+    {"name": "no-presolve", "search_branching": "AUTOMATIC_SEARCH", "cp_model_presolve": False},
+)
+
+
+# Seconds past an entrant's own time limit before the race stops waiting for it
+RACE_GRACE_PERIOD = 10
+
+
+def _gap_closed(objective, bound, relative_gap):
+    if math.isinf(objective) or math.isinf(bound):
+        return False  # no solution or no bound yet
+    return objective - bound <= relative_gap * max(1.0, abs(objective))
+
+
+class StopFlag:
+    """
+    Stop signal shared with child processes (race entrants, decomposed
+    components). A lock-free byte rather than a multiprocessing.Event: the
+    Event's internal lock could be left held by a CP-SAT callback thread
+    and then block every other process on set(). Quacks like an Event for
+    stop_when_set.
+    """
+
+    def __init__(self, ctx):
+        self._flag = ctx.RawValue("b", 0)
+
+    def set(self):
+        self._flag.value = 1
+
+    def is_set(self):
+        return bool(self._flag.value)
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        while not self.is_set() and time.time() < deadline:
+            time.sleep(0.05)
+        return self.is_set()
+
+
+class _RaceCallback(cp_model.CpSolverSolutionCallback):
+    """Publishes every improving solution of one entrant and stops the race once the shared gap is closed."""
+
+    def __init__(self, entrant, shared, events, relative_gap):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self._entrant = entrant
+        self._shared = shared
+        self._events = events
+        self._relative_gap = relative_gap
+
+    def on_solution_callback(self):
+        best, bound, stop = self._shared
+        objective = self.ObjectiveValue()
+        with best.get_lock():
+            improved = objective < best.value
+            if improved:
+                best.value = objective
+        # Bounds are only shared here: CP-SAT's bound callback runs on a
+        # search thread and can deadlock against the GIL in a child process
+        with bound.get_lock():
+            bound.value = max(bound.value, self.BestObjectiveBound())
+        if improved:
+            self._events.put(("solution", self._entrant, objective, bound.value))
+        if _gap_closed(best.value, bound.value, self._relative_gap):
+            stop.set()
+
+
+def _copy_message(source, target, skip=()):
+    """Copy a protobuf message field by field into the matching CP-SAT wrapper message."""
+    for field, value in source.ListFields():
+        if field.name in skip:
+            continue
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            if field.is_repeated:
+                items = getattr(target, field.name)
+                for item in value:
+                    _copy_message(item, items.add())
+            else:
+                _copy_message(value, getattr(target, field.name))
+        elif field.is_repeated:
+            getattr(target, field.name).extend(value)
+        else:
+            setattr(target, field.name, value)
+
+
+def load_model(path):
+    """
+    CpModel from a binary file written by CpModel.ExportToFile. The Python
+    wrapper only parses text, and the text of a large model (variable names
+    included) takes seconds to parse, so the file is read with the protobuf
+    classes and copied over. The variables, by far the most numerous, are
+    copied through one compact text parse and lose their names.
+    """
+    source = cp_model_pb2.CpModelProto()
+    with open(path, "rb") as f:
+        source.ParseFromString(f.read())
+    model = cp_model.CpModel()
+    proto = model.Proto()
+    variable_text = {}   # domain -> text of a nameless variable with it
+    parts = []
+    for variable in source.variables:
+        domain = tuple(variable.domain)
+        if domain not in variable_text:
+            variable_text[domain] = "variables{" + " ".join(f"domain:{value}" for value in domain) + "}"
+        parts.append(variable_text[domain])
+    proto.parse_text_format("".join(parts))
+    _copy_message(source, proto, skip=("variables",))
+    return model
+
+
+def _race_entrant(entrant, model_path, settings, extra, shared, events, race_start):
+    """
+    Body of one racing process: load the model file, solve it with its own
+    setup and report back. Loading comes off the entrant's time limit; once
+    loaded it reports when its solve will stop, so the race waits for it.
+    """
+    model = load_model(model_path)
+    stop = shared[2]
+
+    solver = cp_model.CpSolver()
+    settings.apply(solver)
+    for name, value in extra.items():
+        setattr(solver.parameters, name, value)
+    time_limit = max(1, settings.time_limit - (time.time() - race_start))
+    # The race may have ended while this entrant was loading
+    solver.parameters.max_time_in_seconds = 0 if stop.is_set() else time_limit
+    events.put(("started", entrant, time.time() + time_limit))
+    solver.parameters.log_search_progress = True
+    solver.parameters.log_to_stdout = False
+    solver.parameters.log_to_response = True
+
+    finished = threading.Event()
+    threading.Thread(target=stop_when_set, args=(solver, stop, finished), daemon=True).start()
+    try:
+        status = solver.Solve(model, _RaceCallback(entrant, shared, events, settings.relative_gap))
+    finally:
+        finished.set()
+    if status in (cp_model.OPTIMAL, cp_model.INFEASIBLE):
+        stop.set()  # proven; the other entrants cannot do better
+
+    feasible = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    events.put(("done", entrant, {
+        "status": status,
+        "objective": solver.ObjectiveValue() if feasible else None,
+        "bound": solver.BestObjectiveBound() if feasible else None,
+        "wallTime": solver.WallTime(),
+        "solution": np.asarray(solver.ResponseProto().solution, dtype=np.int64) if feasible else None,
+        "statistics": solver_response_statistics(solver, status),
+    }))
+
+
+class RaceOutcome:
+    """
+    The winning entrant's result, standing in for the CpSolver the output
+    stage reads (status name, objective, bound, wall time and the solution
+    array behind TimetableModel.solution_placements).
+    """
+
+    def __init__(self, report, wall_time):
+        self._report = report
+        self._solution = cp_model_pb2.CpSolverResponse()
+        if report["solution"] is not None:
+            self._solution.solution.extend(report["solution"].tolist())
+        self._wall_time = wall_time
+
+    def ResponseProto(self):
+        return self._solution
+
+    def StatusName(self, status=None):
+        return cp_model_pb2.CpSolverStatus.Name(self._report["status"] if status is None else status)
+
+    def ObjectiveValue(self):
+        return self._report["objective"]
+
+    def BestObjectiveBound(self):
+        return self._report["bound"]
+
+    def WallTime(self):
+        return self._wall_time
+
+
+def race_model(built, update_progress, settings, entrants, stop_event=None, hint_objective=None):
+    """
+    PHASE 4 (racing): solve the built model in `entrants` processes at once,
+    each with its own seed and RACE_CONFIGS setup and an equal share of
+    `settings.num_workers`. The model is written once to a binary file that
+    every entrant loads (see load_model). Entrants share the best objective
+    and bound through shared memory, not their solutions, and all stop once
+    one proves optimality or the shared gap reaches `settings.relative_gap`,
+    so one stalled seed no longer decides the wall time.
+
+    `hint_objective` is the objective of a complete warm-start hint. Every
+    entrant starts from that hint, so it counts as the race's first
+    solution right away instead of once the entrants have started up. If
+    no entrant reports back, the outcome is UNKNOWN and the caller falls
+    back to the warm start. Returns (RaceOutcome, status, summary).
+    """
+    log_phase("🏁 PHASE 4: Racing Solvers")
+    entrants = max(2, int(entrants))
+    workers_each = max(1, settings.num_workers // entrants)
+    log_stat("Racing processes", entrants, Colors.CYAN)
+    log_stat("Search workers per process", workers_each, Colors.CYAN)
+    log_stat("Max time limit", f"{settings.time_limit}s")
+    update_progress("solving", 20, f"Racing {entrants} solvers...")
+
+    race_start = time.time()
+    if hint_objective is not None:
+        built.solutions_found += 1
+        built.first_solution_at = race_start
+        update_progress("solving", 20, f"Racing {entrants} solvers from the warm start (Cost: {hint_objective:.0f})",
+                        built.solutions_found, hint_objective)
+    model_file = tempfile.NamedTemporaryFile(prefix="timetable-race-", suffix=".pb", delete=False)
+    model_file.close()
+    try:
+        built.model.ExportToFile(model_file.name)
+        return _run_race(built, update_progress, settings, entrants, stop_event, hint_objective,
+                         model_file.name, race_start)
+    finally:
+        os.unlink(model_file.name)
+
+
+def _run_race(built, update_progress, settings, entrants, stop_event, hint_objective, model_path, race_start):
+    """Start the entrants on the model file at `model_path` and collect their reports (see race_model)."""
+    workers_each = max(1, settings.num_workers // entrants)
+    base_seed = settings.random_seed or 0
+    ctx = multiprocessing.get_context("spawn")
+    stop = StopFlag(ctx)
+    best = hint_objective if hint_objective is not None else math.inf
+    shared = (ctx.Value("d", best), ctx.Value("d", -math.inf), stop)
+    events = ctx.Queue()
+
+    processes = []
+    for entrant in range(entrants):
+        config = dict(RACE_CONFIGS[entrant % len(RACE_CONFIGS)])
+        name = config.pop("name")
+        entrant_settings = copy.copy(settings)
+        entrant_settings.num_workers = workers_each
+        entrant_settings.random_seed = base_seed + entrant
+        entrant_settings.search_branching = config.pop("search_branching")
+        process = ctx.Process(
+            target=_race_entrant,
+            args=(entrant, model_path, entrant_settings, config, shared, events, race_start),
+            name=f"timetable-race-{entrant}",
+        )
+        process.start()
+        processes.append((process, name, entrant_settings.random_seed))
+
+    reports = {}
+    solve_ends = {}   # entrant -> when its solve stops on its own, reported once it has loaded the model
+    while len(reports) < entrants:
+        # Entrants stop themselves at their time limit; past the grace period the stragglers are cut off
+        deadline = max([race_start + settings.time_limit, *solve_ends.values()]) + RACE_GRACE_PERIOD
+        if (stop_event is not None and stop_event.is_set()) or time.time() > deadline:
+            stop.set()
+        if time.time() > deadline + RACE_GRACE_PERIOD:
+            break
+        try:
+            kind, entrant, payload, *rest = events.get(timeout=0.2)
+        except queue.Empty:
+            if not any(process.is_alive() for process, _, _ in processes) and events.empty():
+                break  # an entrant died without reporting
+            continue
+        if kind == "started":
+            solve_ends[entrant] = payload
+        elif kind == "solution":
+            built.solutions_found += 1
+            if built.first_solution_at is None:
+                built.first_solution_at = time.time()
+            bound = rest[0]
+            update_progress(
+                "solving",
+                20 + int(70 * (1 - math.exp(-0.1 * built.solutions_found))),
+                f"Racing... Found Solution #{built.solutions_found} (Cost: {payload:.0f}, solver {entrant + 1})",
+                built.solutions_found,
+                payload,
+                best_bound=bound,
+                gap=abs(payload - bound) / max(1.0, abs(payload)),
+            )
+        else:
+            reports[entrant] = payload
+    cut_off = set()
+    for entrant, (process, _, _) in enumerate(processes):
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+            cut_off.add(entrant)
+
+    def missing(entrant):
+        # An entrant that never reported was either still running past the grace period or died
+        _, name, seed = processes[entrant]
+        return {"entrant": entrant, "config": name, "seed": seed,
+                "status": "CUT_OFF" if entrant in cut_off else "CRASHED", "exitCode": processes[entrant][0].exitcode}
+
+    if not reports:
+        logger.warning("No racing solver process reported a result")
+        report = {"status": cp_model.UNKNOWN, "objective": None, "bound": None, "solution": None}
+        summary = {"entrants": [missing(entrant) for entrant in range(entrants)], "winner": None}
+        return RaceOutcome(report, time.time() - race_start), cp_model.UNKNOWN, summary
+
+    def rank(entrant):
+        report = reports[entrant]
+        feasible = report["objective"] is not None
+        return (not feasible, report["objective"] if feasible else 0, report["status"] != cp_model.OPTIMAL)
+
+    winner = min(reports, key=rank)
+    summary = {"entrants": [], "winner": winner}
+    for entrant, (_, name, seed) in enumerate(processes):
+        report = reports.get(entrant)
+        if report is None:
+            summary["entrants"].append(missing(entrant))
+            continue
+        record_search(report["statistics"])
+        summary["entrants"].append({
+            "entrant": entrant,
+            "config": name,
+            "seed": seed,
+            "status": cp_model_pb2.CpSolverStatus.Name(report["status"]),
+            "objective": report["objective"],
+            "bound": report["bound"],
+            "wallTime": round(report["wallTime"], 3),
+        })
+        log_stat(f"Solver {entrant + 1} ({name}, seed {seed})",
+                 f"{summary['entrants'][-1]['status']} {report['objective']}",
+                 Colors.GREEN if entrant == winner else Colors.WHITE)
+
+    status = reports[winner]["status"]
+    outcome = RaceOutcome(reports[winner], time.time() - race_start)
+    log_phase("✅ PHASE 5: Results")
+    log_stat("Winning solver", f"{winner + 1} ({processes[winner][1]})", Colors.GREEN)
+    log_stat("Race time", f"{outcome.WallTime():.2f}s", Colors.BOLD)
+    logger.info(f"Race finished: {outcome.StatusName()}")
+    return outcome, status, summary
@@ -0,0 +1,220 @@
+import collections
+
+from solver import (
+    Colors,
+    is_valid_start,
+    log_phase,
+    log_stat,
+)
+
+# Repairs are expected to come back in seconds, not the full generation budget
+DEFAULT_REPAIR_TIME_LIMIT = 60
+
+
+def allotment_key(allotment):
+    return (allotment["courseId"], tuple(sorted(allotment.get("classIds", []))))
+
+
+def merge_allotments(allotments, changes):
+    """
+    Apply delta allotments: each replaces the allotment with the same
+    courseId and classIds (or is appended), `"removed": true` drops it.
+    Unchanged allotments keep their position. Returns (allotments, keys of
+    the changed ones).
+    """
+    allotments = list(allotments)
+    positions = {allotment_key(a): i for i, a in enumerate(allotments)}
+    changed = set()
+    removed = set()
+    for allotment in changes:
+        key = allotment_key(allotment)
+        if allotment.get("removed"):
+            removed.add(key)
+            continue
+        allotment = {k: v for k, v in allotment.items() if k != "removed"}
+        if key in positions:
+            allotments[positions[key]] = allotment
+        else:
+            positions[key] = len(allotments)
+            allotments.append(allotment)
+        changed.add(key)
+    return [a for a in allotments if allotment_key(a) not in removed], changed
+
+
+def apply_repair_delta(payload):
+    """
+    Turn a /repair request into a generate_timetable payload.
+
+    `payload` is the payload of the previous run plus:
+      previousTimetable  timetable entries returned by that run
+      delta.allotments   new or changed allotments; replaces the allotment with
+                         the same courseId and classIds, `"removed": true` drops it
+      delta.removedRooms room ids taken offline
+      delta.pinnedEntries entry ids that must keep their slot and room
+      radius             how many class/faculty hops around the change are re-optimized
+    """
+    delta = payload.get("delta", {})
+    data = dict(payload)
+    data.pop("delta", None)
+    data.pop("previousTimetable", None)
+
+    data["allotments"], changed = merge_allotments(payload.get("allotments", []), delta.get("allotments", []))
+    changed_idx = [i for i, a in enumerate(data["allotments"]) if allotment_key(a) in changed]
+
+    removed_rooms = set(delta.get("removedRooms", []))
+    data["rooms"] = [r for r in payload.get("rooms", []) if r["id"] not in removed_rooms]
+
+    data["repair"] = {
+        "previousTimetable": payload.get("previousTimetable", []),
+        "changedAllotments": changed_idx,
+        "pinnedEntries": delta.get("pinnedEntries", []),
+        "radius": payload.get("radius", 1),
+    }
+    data.setdefault("timeLimit", DEFAULT_REPAIR_TIME_LIMIT)
+    return data
+
+
+def _previous_placements(problem, entries):
+    """
+    Map previous timetable entries onto the new sessions. Returns (matched,
+    released): s_idx -> (entry id, previous placement), and the previous
+    placements no session took over, e.g. those of a removed allotment.
+    """
+    by_entry = collections.OrderedDict()
+    for entry in entries:
+        time_slot = entry.get("timeSlot", {})
+        t_idx = problem.slot_lookup.get((time_slot.get("day"), time_slot.get("startTime")))
+        if t_idx is None:
+            continue
+        previous = by_entry.setdefault(entry.get("id"), {
+            "courseId": entry.get("courseId"),
+            "classId": entry.get("classId"),
+            "facultyId": entry.get("facultyId"),
+            "roomId": entry.get("roomId"),
+            "start": t_idx,
+        })
+        previous["start"] = min(previous["start"], t_idx)
+
+    # Exact session id matches first, then the remaining entries of the same
+    # course and class in slot order
+    session_ids = {s["id"]: s_idx for s_idx, s in enumerate(problem.sessions)}
+    matched = {}
+    leftovers = collections.defaultdict(list)
+    for entry_id, previous in by_entry.items():
+        s_idx = session_ids.get(entry_id)
+        if s_idx is not None:
+            matched[s_idx] = (entry_id, previous)
+        else:
+            leftovers[(previous["courseId"], previous["classId"])].append((entry_id, previous))
+
+    for key in leftovers:
+        leftovers[key].sort(key=lambda item: item[1]["start"])
+    for s_idx, session in enumerate(problem.sessions):
+        if s_idx in matched:
+            continue
+        queue = leftovers.get((session["courseId"], session["classId"]))
+        if queue:
+            matched[s_idx] = queue.pop(0)
+    released = [previous for queue in leftovers.values() for _, previous in queue]
+    return matched, released
+
+
+def _placement_is_valid(problem, s_idx, room_id, t_idx):
+    session = problem.sessions[s_idx]
+    r_idx = problem.room_index.get(room_id)
+    if r_idx is None or r_idx not in problem.compatible_rooms[s_idx]:
+        return None
+    if not is_valid_start(problem, session, t_idx):
+        return None
+    for dt in range(session["duration"]):
+        if t_idx + dt in problem.faculty_busy[session["facultyId"]]:
+            return None
+        if t_idx + dt in problem.room_busy[room_id]:
+            return None
+    return r_idx
+
+
+def plan_repair(problem, repair):
+    """
+    Decide which sessions keep their previous placement. Seeds are sessions of
+    changed allotments and sessions whose previous placement is gone or no
+    longer valid (removed room, new clash with an existing timetable). The
+    neighbourhood adds every session sharing a class, faculty member or
+    previous room with a seed, `radius` hops out. Previous entries no session
+    takes over (a removed allotment) free time for their class, faculty
+    member and room, so they count as seeds' classes, faculty and rooms.
+    Everything else is pinned to its previous placement; freed sessions get
+    it as a preference.
+    Fills problem.pinned / problem.preferred and returns a summary dict.
+    """
+    log_phase("🩹 Repair Planning")
+    sessions = problem.sessions
+    matched, released = _previous_placements(problem, repair.get("previousTimetable", []))
+    changed_allotments = set(repair.get("changedAllotments", []))
+    pinned_entries = set(repair.get("pinnedEntries", []))
+
+    valid = {}
+    seeds = set()
+    for s_idx, session in enumerate(sessions):
+        if session["allotIdx"] in changed_allotments:
+            seeds.add(s_idx)
+        if s_idx not in matched:
+            seeds.add(s_idx)
+            continue
+        _, previous = matched[s_idx]
+        r_idx = _placement_is_valid(problem, s_idx, previous["roomId"], previous["start"])
+        if r_idx is None:
+            seeds.add(s_idx)
+        else:
+            valid[s_idx] = (r_idx, previous["start"])
+
+    # Previous rooms of seeds whose entries are gone also count as touched,
+    # as do the class, faculty and room time released by dropped entries
+    touched_rooms = {matched[s][1]["roomId"] for s in seeds if s in matched}
+    touched_rooms |= {previous["roomId"] for previous in released}
+    released_classes = {previous["classId"] for previous in released}
+    released_faculty = {previous["facultyId"] for previous in released}
+
+    freed = set(seeds)
+    frontier = set(seeds)
+    for _ in range(max(0, int(repair.get("radius", 1)))):
+        classes = {sessions[s]["classId"] for s in frontier} | released_classes
+        faculty = {sessions[s]["facultyId"] for s in frontier} | released_faculty
+        released_classes = released_faculty = set()
+        reached = {
+            s_idx for s_idx, session in enumerate(sessions)
+            if s_idx not in freed and (
+                session["classId"] in classes
+                or session["facultyId"] in faculty
+                or (s_idx in matched and matched[s_idx][1]["roomId"] in touched_rooms)
+            )
+        }
+        if not reached:
+            break
+        freed |= reached
+        frontier = reached
+
+    for s_idx, placement in valid.items():
+        entry_id = matched[s_idx][0]
+        if s_idx not in freed or entry_id in pinned_entries:
+            problem.pinned[s_idx] = placement
+        else:
+            problem.preferred[s_idx] = placement
+
+    summary = {
+        "seedSessions": len(seeds),
+        "releasedEntries": len(released),
+        "freedSessions": len(sessions) - len(problem.pinned),
+        "pinnedSessions": len(problem.pinned),
+    }
+    log_stat("Changed sessions", summary["seedSessions"], Colors.YELLOW)
+    log_stat("Previous entries released", summary["releasedEntries"], Colors.YELLOW)
+    log_stat("Sessions re-optimized", summary["freedSessions"], Colors.CYAN)
+    log_stat("Sessions kept fixed", summary["pinnedSessions"], Colors.GREEN)
+    return summary
+
+
+def moved_sessions(problem, placements):
+    """Number of sessions that kept a previous placement available to them but moved."""
+    chosen = {s_idx: (r_idx, t_idx) for s_idx, r_idx, t_idx in placements}
+    return sum(1 for s_idx, placement in problem.preferred.items() if chosen.get(s_idx) != placement)
@@ -0,0 +1,350 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import collections
+import copy
+import threading
+import time
+
+from ortools.sat.python import cp_model
+
+from solver import (
+    Colors,
+    NormalizedTimetable,
+    WARM_START_STATUS,
+    build_result,
+    log_phase,
+    log_stat,
+    stop_when_set,
+)
+from solver_metrics import record_search, solver_response_statistics
+from solver_repair import allotment_key, merge_allotments
+
+# Upper bound on scenarios per request; each one is a full solve
+MAX_SCENARIOS = 16
+
+# Smallest time budget handed to one scenario when they have to queue for cores
+MIN_SCENARIO_TIME_LIMIT = 5
+
+# Delta keys that only forbid placements of the base model
+RESTRICTION_KEYS = ("removedRooms", "blockedSlots", "unavailableFaculty", "allotments")
+# Delta keys that change sessions or faculty, so the scenario gets its own model
+STRUCTURAL_KEYS = ("facultySwaps",)
+
+
+def check_scenarios(data):
+    """Validate data["scenarios"]; raises ValueError with the first problem found."""
+    scenarios = data.get("scenarios")
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ValueError("scenarios must be a non-empty list")
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} scenarios can be solved in one request")
+    if (data.get("mode") or "optimal") != "optimal" or (data.get("objective") or "weighted") != "weighted":
+        raise ValueError("scenarios are solved with mode 'optimal' and objective 'weighted' only")
+    for sc_idx, scenario in enumerate(scenarios):
+        unknown = set(scenario.get("delta") or {}) - set(RESTRICTION_KEYS + STRUCTURAL_KEYS)
+        if unknown:
+            raise ValueError(f"Scenario {sc_idx + 1} has unknown delta keys: {', '.join(sorted(unknown))}")
+
+
+def is_structural(delta):
+    """Faculty swaps and new or changed allotments change the sessions themselves."""
+    if any(delta.get(key) for key in STRUCTURAL_KEYS):
+        return True
+    return any(not allotment.get("removed") for allotment in delta.get("allotments", []))
+
+
+def scenario_payload(data, delta):
+    """
+    The base payload with `delta` applied, for scenarios that need their own
+    model. Removed rooms leave the room list, blocked slots join
+    timeGrid.blocked and unavailable faculty become existing-timetable
+    bookings, so every delta key means the same as in the shared model.
+    """
+    payload = {key: value for key, value in data.items() if key != "scenarios"}
+
+    allotments, _ = merge_allotments(data.get("allotments", []), delta.get("allotments", []))
+    for swap in delta.get("facultySwaps", []):
+        allotments = [
+            dict(a, facultyId=swap["to"])
+            if a["facultyId"] == swap["from"] and swap.get("courseId") in (None, a["courseId"]) else a
+            for a in allotments
+        ]
+    payload["allotments"] = allotments
+
+    removed_rooms = set(delta.get("removedRooms", []))
+    payload["rooms"] = [r for r in data.get("rooms", []) if r["id"] not in removed_rooms]
+
+    if delta.get("blockedSlots"):
+        time_grid = dict(data.get("timeGrid") or {})
+        time_grid["blocked"] = list(time_grid.get("blocked") or []) + list(delta["blockedSlots"])
+        payload["timeGrid"] = time_grid
+
+    bookings = [
+        {"facultyId": item["facultyId"], "timeSlot": {"day": item["day"], "startTime": start}}
+        for item in delta.get("unavailableFaculty", [])
+        for start in _start_times(data, item)
+    ]
+    if bookings:
+        payload["existing_timetables"] = list(data.get("existing_timetables") or []) + [{"entries": bookings}]
+    return payload
+
+
+def _start_times(data, item):
+    """Start times an unavailableFaculty item covers; no startTime means the whole day."""
+    if item.get("startTime"):
+        return [item["startTime"]]
+    from solver_config import TimeGrid
+    return [start for start, _ in TimeGrid.from_payload(data.get("timeGrid")).intervals]
+
+
+def _closed_slots(grid, items):
+    """t_idx of every {day, startTime?} item; an item without startTime closes the whole day."""
+    closed = set()
+    for item in items:
+        if item.get("day") not in grid.days:
+            raise ValueError(f"Unknown day '{item.get('day')}' in scenario delta")
+        if item.get("startTime") is None:
+            closed.update(grid.day_slots(grid.days.index(item["day"])))
+            continue
+        t_idx = grid.slot_index(item["day"], item["startTime"])
+        if t_idx is None:
+            raise ValueError(f"Unknown slot {item['day']} {item['startTime']} in scenario delta")
+        closed.add(t_idx)
+    return closed
+
+
+class _Restrictions:
+    """What a restriction-only delta takes away, in model indices."""
+
+    def __init__(self, problem, delta):
+        grid = problem.grid
+        self.removed_rooms = {
+            problem.room_index[r_id] for r_id in delta.get("removedRooms", []) if r_id in problem.room_index
+        }
+        self.blocked = _closed_slots(grid, delta.get("blockedSlots", []))
+        self.faculty_closed = collections.defaultdict(set)
+        for item in delta.get("unavailableFaculty", []):
+            self.faculty_closed[item["facultyId"]] |= _closed_slots(grid, [item])
+        removed_keys = {allotment_key(a) for a in delta.get("allotments", []) if a.get("removed")}
+        self.removed_allotments = {
+            a_idx for a_idx, a in enumerate(problem.allotments) if allotment_key(a) in removed_keys
+        }
+
+    def closed_slots(self, session):
+        return self.blocked | self.faculty_closed.get(session["facultyId"], set())
+
+
+def restrict_model(built, restrictions):
+    """
+    Clone the built base model and forbid what the delta takes away:
+    placements in removed rooms, in blocked slots or while the faculty member
+    is unavailable, and every session of a removed allotment. The clone keeps
+    the variable indices of the base model, so the base model's extraction
+    reads its solutions. Returns (clone, number of forbidden placements).
+    """
+    problem = built.problem
+    model = built.model.Clone()
+
+    def literal(var):
+        return model.GetBoolVarFromProtoIndex(var.Index())
+
+    forbidden = 0
+    for s_idx, session in enumerate(problem.sessions):
+        if session["allotIdx"] in restrictions.removed_allotments:
+            model.Add(literal(built.is_assigned[s_idx]) == 0)
+            continue
+        closed = restrictions.closed_slots(session)
+        compatible_rooms = problem.compatible_rooms[s_idx]
+        if not closed and not restrictions.removed_rooms.intersection(compatible_rooms):
+            continue
+        duration = session["duration"]
+        for t_idx in problem.grid.valid_starts(duration):
+            slot_closed = any(t in closed for t in range(t_idx, t_idx + duration))
+            for r_idx in compatible_rooms:
+                if not slot_closed and r_idx not in restrictions.removed_rooms:
+                    continue
+                literals = built.placement_literals(s_idx, r_idx, t_idx)
+                if literals:
+                    model.AddBoolOr([literal(lit).Not() for lit in literals])
+                    forbidden += 1
+    return model, forbidden
+
+
+def restricted_greedy(problem, restrictions):
+    """
+    Greedy schedule of the base problem under `restrictions`, the fallback
+    when a scenario's solve finds nothing in time (the base warm start may
+    use what the scenario takes away). Closed slots are booked for the
+    faculty and every room on a shallow copy of the problem.
+    """
+    from solver_greedy import greedy_schedule
+
+    scenario = copy.copy(problem)
+    scenario.faculty_busy = collections.defaultdict(set, {f: set(busy) for f, busy in problem.faculty_busy.items()})
+    scenario.room_busy = collections.defaultdict(set, {r: set(busy) for r, busy in problem.room_busy.items()})
+    for room in problem.rooms:
+        scenario.room_busy[room["id"]] |= restrictions.blocked
+    for f_id, closed in restrictions.faculty_closed.items():
+        scenario.faculty_busy[f_id] |= closed
+    scenario.compatible_rooms = [
+        [] if session["allotIdx"] in restrictions.removed_allotments
+        else [r_idx for r_idx in rooms if r_idx not in restrictions.removed_rooms]
+        for session, rooms in zip(problem.sessions, problem.compatible_rooms)
+    ]
+    placements, _ = greedy_schedule(scenario)
+    return placements
+
+
+def _solve(model, settings, stop_event):
+    """One CP-SAT solve on a worker thread; CP-SAT releases the GIL while it searches."""
+    solver = cp_model.CpSolver()
+    settings.apply(solver)
+    solver.parameters.log_search_progress = True
+    solver.parameters.log_to_stdout = False
+    solver.parameters.log_to_response = True
+
+    finished = threading.Event()
+    if stop_event is not None:
+        threading.Thread(target=stop_when_set, args=(solver, stop_event, finished), daemon=True).start()
+    try:
+        status = solver.Solve(model)
+    finally:
+        finished.set()
+    return solver, status
+
+
+def _solve_payload(payload, existing_timetables):
+    from solver import generate_timetable
+    result = generate_timetable(payload, None, None, existing_timetables)
+    result["statistics"].pop("profile", None)
+    return result
+
+
+def timetable_diff(base_entries, entries):
+    """
+    Placements added and removed relative to the base timetable, as
+    [courseId, classId, roomId, slotId] per occupied slot. Keys avoid session
+    ids, which depend on allotment order and so differ between models.
+    """
+    def keys(rows):
+        return collections.Counter(
+            (e["courseId"], e["classId"], e["roomId"], f"{e['timeSlot']['day']}-{e['timeSlot']['startTime']}")
+            for e in rows
+        )
+
+    base, other = keys(base_entries), keys(entries)
+    return {
+        "added": sorted(list(key) for key in (other - base).elements()),
+        "removed": sorted(list(key) for key in (base - other).elements()),
+    }
+
+
+def solve_scenarios(data, built, settings, hint_placements, existing_timetables, update_progress, start_time,
+                    stop_event=None):
+    """
+    PHASE 4 (scenarios): solve the built base model and every scenario of
+    data["scenarios"] concurrently. Restriction-only scenarios solve a clone
+    of the base model (see restrict_model); structural ones are rebuilt from
+    scenario_payload. `settings.num_workers` is the CPU budget of the whole
+    batch and is split between the concurrent solves; when there are more
+    runs than cores the time budget is split as well.
+    """
+    log_phase("🔀 PHASE 4: Solving Scenarios")
+    problem = built.problem
+    scenarios = data["scenarios"]
+    runs = 1 + len(scenarios)
+    parallel = max(1, min(runs, settings.num_workers))
+    workers_each = max(1, settings.num_workers // parallel)
+    time_limit = settings.time_limit
+    if runs > parallel:
+        time_limit = min(time_limit, max(MIN_SCENARIO_TIME_LIMIT, time_limit * parallel / runs))
+
+    run_settings = copy.copy(settings)
+    run_settings.num_workers = workers_each
+    run_settings.time_limit = time_limit
+    log_stat("Scenarios", len(scenarios), Colors.CYAN)
+    log_stat("Concurrent solves", parallel, Colors.CYAN)
+    log_stat("Search workers per solve", workers_each, Colors.CYAN)
+    log_stat("Time limit per solve", f"{time_limit:.0f}s", Colors.CYAN)
+
+    update_progress("solving", 20, f"Solving the base and {len(scenarios)} scenarios...")
+    shared = {}       # run index -> (restrictions, forbidden placements), for runs on a clone of the base model
+    futures = {}
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures[pool.submit(_solve, built.model, run_settings, stop_event)] = 0
+        for sc_idx, scenario in enumerate(scenarios, start=1):
+            delta = scenario.get("delta") or {}
+            if is_structural(delta):
+                payload = scenario_payload(data, delta)
+                payload.update({"timeLimit": time_limit, "numWorkers": workers_each, "maxWorkers": workers_each,
+                                "responseFormat": "entries"})
+                futures[pool.submit(_solve_payload, payload, payload.get("existing_timetables", []))] = sc_idx
+            else:
+                restrictions = _Restrictions(problem, delta)
+                model, forbidden = restrict_model(built, restrictions)
+                shared[sc_idx] = (restrictions, forbidden)
+                futures[pool.submit(_solve, model, run_settings, stop_event)] = sc_idx
+
+        outcomes = [None] * runs
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            outcomes[futures[future]] = future.result()
+            update_progress("solving", 20 + int(70 * done_count / runs), f"Solved {done_count} of {runs} runs")
+
+    results = []
+    for run_idx, outcome in enumerate(outcomes):
+        if run_idx and run_idx not in shared:
+            results.append(outcome)
+            continue
+        solver, status = outcome
+        record_search(solver_response_statistics(solver, status))
+        placements = []
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            placements = built.solution_placements(solver)
+        elif run_idx == 0 and hint_placements:
+            placements = hint_placements
+        elif run_idx:
+            placements = restricted_greedy(problem, shared[run_idx][0])
+        result = build_result(problem, placements, problem.conflicts, start_time)
+        result["statistics"]["search"] = {"status": solver.StatusName(status)}
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            result["statistics"]["search"]["objective"] = solver.ObjectiveValue()
+        elif placements:
+            # A greedy schedule, not a CP-SAT result
+            result["statistics"]["search"] = {"status": WARM_START_STATUS, "solverStatus": solver.StatusName(status)}
+        if run_idx:
+            result["statistics"]["forbiddenPlacements"] = shared[run_idx][1]
+        results.append(result)
+
+    base = results[0]
+    scenario_results = []
+    for scenario, result in zip(scenarios, results[1:]):
+        diff = timetable_diff(base["timetable"], result["timetable"])
+        diff["scheduledDelta"] = result["statistics"]["scheduledCourses"] - base["statistics"]["scheduledCourses"]
+        scenario_results.append({
+            "name": scenario.get("name"),
+            "model": "rebuilt" if is_structural(scenario.get("delta") or {}) else "shared",
+            "result": result,
+            "diff": diff,
+        })
+        log_stat(
+            f"Scenario {scenario.get('name') or len(scenario_results)}",
+            f"{result['statistics']['scheduledCourses']} sessions, "
+            f"+{len(diff['added'])}/-{len(diff['removed'])} placements vs base",
+            Colors.GREEN,
+        )
+
+    if data.get("responseFormat") == "normalized":
+        for result in results:
+            normalized = NormalizedTimetable()
+            for entry in result["timetable"]:
+                normalized.add_entry(entry)
+            result["timetable"] = normalized.to_dict()
+
+    log_stat("Total execution time", f"{time.time() - start_time:.2f}s", Colors.BOLD)
+    return {
+        "success": base["success"],
+        "timetable": base["timetable"],
+        "conflicts": base["conflicts"],
+        "message": base["message"],
+        "scenarios": scenario_results,
+        "statistics": dict(base["statistics"], scenarios=len(scenarios), concurrentSolves=parallel),
+    }
@@ -0,0 +1,421 @@
+from ortools.sat.python import cp_model
+import bisect
+import collections
+import copy
+import threading
+import time
+
+from solver import (
+    Colors,
+    NO_ROOM_PENALTY,
+    TimetableModel,
+    UNASSIGNED_PENALTY,
+    VariableIndex,
+    add_class_limit_constraints,
+    is_valid_start,
+    log_phase,
+    log_progress,
+    log_stat,
+    log_timing,
+    solve_model,
+    stop_when_set,
+)
+
+# Stage 2 gets what stage 1 left of the budget, but never less than this
+ROOM_STAGE_TIME_LIMIT = 10
+
+# Times stage 1 is re-solved with room cuts when stage 2 cannot room every session
+ROOM_CUT_ROUNDS = 3
+
+
+class TimeSlotTimetableModel(TimetableModel):
+    """Stage 1: one Boolean per session x start slot, rooms aggregated into capacity classes."""
+
+    def __init__(self, problem):
+        super().__init__(problem)
+        self.y = {}
+
+    def placements(self, value):
+        # Rooms are chosen in stage 2 (assign_rooms)
+        return [(s_idx, None, t_idx) for (s_idx, t_idx), var in self.y.items() if value(var) == 1]
+
+    def placements_from_values(self, values):
+        return [(s_idx, None, t_idx) for s_idx, t_idx in self._selected_keys(self.y, values)]
+
+    def add_hints(self, placements):
+        chosen = {(s_idx, t_idx) for s_idx, _, t_idx in placements}
+        placed = {s_idx for s_idx, _ in chosen}
+        for key, var in self.y.items():
+            self.model.AddHint(var, int(key in chosen))
+        for s_idx, var in self.is_assigned.items():
+            self.model.AddHint(var, int(s_idx in placed))
+
+    def slot_starts(self, s_idx):
+        return {t_idx: var for (s, t_idx), var in self.y.items() if s == s_idx}
+
+    def placement_literals(self, s_idx, r_idx, t_idx):
+        # Stage 1 has no rooms; stage 2 prefers the previous room
+        var = self.y.get((s_idx, t_idx))
+        return [var] if var is not None else []
+
+
+def room_is_free(problem, r_idx, t_idx, duration):
+    busy = problem.room_busy[problem.rooms[r_idx]["id"]]
+    return all(t_idx + dt not in busy for dt in range(duration))
+
+
+def build_time_model(problem):
+    """
+    PHASE 3 (two-stage mode, stage 1): assign sessions to start slots only.
+    Per-room exclusivity is replaced by aggregated Hall-style capacity
+    constraints per slot: the sessions needing a lab-capable room of
+    capacity >= k, plus those needing any room of capacity >= k', can never
+    outnumber the free rooms able to host them.
+    """
+    built = TimeSlotTimetableModel(problem)
+    model = built.model
+    y = built.y
+    sessions = problem.sessions
+    num_slots = problem.num_slots
+    var_index = VariableIndex()
+
+    # -----------------------------
+    # Variables
+    # -----------------------------
+    phase_start = time.time()
+    for s_idx, session in enumerate(sessions):
+        compatible_rooms = problem.compatible_rooms[s_idx]
+
+        if not compatible_rooms:
+            built.is_assigned[s_idx] = model.NewBoolVar(f"is_assigned_{s_idx}_none")
+            model.Add(built.is_assigned[s_idx] == 0)
+            built.objective_terms.append(NO_ROOM_PENALTY)
+            continue
+
+        slots = problem.grid.valid_starts(session["duration"])
+        if s_idx in problem.pinned:
+            # Pinned sessions (repair mode) may only keep their slot
+            compatible_rooms = [problem.pinned[s_idx][0]]
+            pinned_slot = problem.pinned[s_idx][1]
+            slots = [pinned_slot] if is_valid_start(problem, session, pinned_slot) else []
+
+        busy = problem.faculty_busy[session["facultyId"]]
+        vars_for_session = []
+        for t_idx in slots:
+            if any(t_idx + dt in busy for dt in range(session["duration"])):
+                continue
+            # At least one compatible room must be free for the whole session
+            if not any(room_is_free(problem, r_idx, t_idx, session["duration"]) for r_idx in compatible_rooms):
+                continue
+
+            v = model.NewBoolVar(f"y_s{s_idx}_t{t_idx}")
+            y[(s_idx, t_idx)] = v
+            vars_for_session.append(v)
+            var_index.add(v, session, None, t_idx, t_idx // problem.slots_per_day)
+            built.objective_terms.append(v * problem.slot_costs[t_idx])
+
+        built.is_assigned[s_idx] = model.NewBoolVar(f"is_assigned_{s_idx}")
+        model.Add(sum(vars_for_session) <= 1)
+        model.Add(built.is_assigned[s_idx] == sum(vars_for_session))
+        built.objective_terms.append((1 - built.is_assigned[s_idx]) * UNASSIGNED_PENALTY)
+
+    log_stat("Slot variables created", len(y), Colors.GREEN)
+    log_timing("Variable creation time", phase_start)
+
+    # -----------------------------
+    # Hard Constraints
+    # -----------------------------
+    log_progress("Adding aggregated room capacity constraints...")
+    phase_start = time.time()
+    num_capacity = add_room_capacity_constraints(model, problem, y)
+    log_stat("Room-class capacity constraints", num_capacity, Colors.CYAN)
+    log_timing("Room capacity constraints time", phase_start)
+
+    log_progress("Adding faculty conflict constraints...")
+    phase_start = time.time()
+    for f_id in problem.faculty_map:
+        for t_idx in range(num_slots):
+            active = var_index.faculty_slot.get((f_id, t_idx))
+            if active:
+                model.Add(sum(active) <= 1)
+    log_timing("Faculty constraints time", phase_start)
+
+    log_progress("Adding student clash constraints...")
+    phase_start = time.time()
+    for class_id in var_index.class_ids:
+        for t_idx in range(num_slots):
+            active = var_index.class_slot.get((class_id, t_idx))
+            if active:
+                model.Add(sum(active) <= 1)
+    log_timing("Student clash constraints time", phase_start)
+
+    add_class_limit_constraints(model, var_index, problem)
+
+    return built
+
+
+def add_room_capacity_constraints(model, problem, y):
+    """
+    For every slot and every pair of thresholds (k_lab, k_lecture):
+        #labs needing >= k_lab + #lectures needing >= k_lecture
+            <= free non-lecture rooms with capacity >= min(k_lab, k_lecture)
+             + free lecture rooms with capacity >= k_lecture
+    Lectures may use any room, labs only non-lecture rooms, so these
+    threshold pairs are exactly Hall's condition for a per-slot room matching.
+    Constraints that can never bind are skipped. Returns the number added.
+    """
+    sessions = problem.sessions
+    need = {}
+    covering = collections.defaultdict(list)  # t_idx -> [(s_idx, var)]
+    for (s_idx, t_idx), var in y.items():
+        session = sessions[s_idx]
+        need[s_idx] = problem.course_map[session["courseId"]].get("estimatedStudents", 0)
+        for dt in range(session["duration"]):
+            covering[t_idx + dt].append((s_idx, var))
+
+    infinity = float("inf")
+    added = 0
+    for t_idx, entries in covering.items():
+        lab_caps = sorted(
+            r["capacity"] for r in problem.rooms
+            if r["type"] != "lecture" and t_idx not in problem.room_busy[r["id"]]
+        )
+        lecture_caps = sorted(
+            r["capacity"] for r in problem.rooms
+            if r["type"] == "lecture" and t_idx not in problem.room_busy[r["id"]]
+        )
+
+        def rooms_at_least(caps, k):
+            return len(caps) - bisect.bisect_left(caps, k)
+
+        lab_entries = [(need[s], s, v) for s, v in entries if sessions[s]["isLab"]]
+        lecture_entries = [(need[s], s, v) for s, v in entries if not sessions[s]["isLab"]]
+        lab_thresholds = sorted({n for n, _, _ in lab_entries}) + [infinity]
+        lecture_thresholds = sorted({n for n, _, _ in lecture_entries}) + [infinity]
+
+        for k_lab in lab_thresholds:
+            for k_lecture in lecture_thresholds:
+                if k_lab == infinity and k_lecture == infinity:
+                    continue
+                chosen = [(s, v) for n, s, v in lab_entries if n >= k_lab]
+                chosen += [(s, v) for n, s, v in lecture_entries if n >= k_lecture]
+                capacity = rooms_at_least(lab_caps, min(k_lab, k_lecture)) + rooms_at_least(lecture_caps, k_lecture)
+                # A session covers a slot with at most one variable, so the
+                # constraint only binds when more sessions than rooms compete
+                if len({s for s, _ in chosen}) <= capacity:
+                    continue
+                model.Add(sum(v for _, v in chosen) <= capacity)
+                added += 1
+    return added
+
+
+def assign_rooms(problem, slot_placements, settings, time_limit=ROOM_STAGE_TIME_LIMIT, stop_event=None):
+    """
+    Stage 2: give every slot placement a concrete room. Days are independent
+    (no session crosses a day), so one small CP-SAT solve per day maximises
+    the number of sessions that keep their slot. Each solve runs with
+    `settings` (workers, search strategy) and an even share of what is left
+    of `time_limit`; setting `stop_event` stops the current solve and skips
+    the remaining days. Returns (placements, conflicts, proven_days), the
+    last being the days whose solve proved it roomed all it could (OPTIMAL).
+    """
+    log_phase("🏫 PHASE 4b: Assigning Rooms")
+    phase_start = time.time()
+
+    by_day = collections.defaultdict(list)
+    for s_idx, _, t_idx in slot_placements:
+        by_day[t_idx // problem.slots_per_day].append((s_idx, t_idx))
+
+    placements = []
+    conflicts = []
+    proven_days = set()
+    days = sorted(by_day)
+    for day_number, day_idx in enumerate(days):
+        model = cp_model.CpModel()
+        z = {}
+        room_slot = collections.defaultdict(list)
+        for s_idx, t_idx in by_day[day_idx]:
+            duration = problem.sessions[s_idx]["duration"]
+            choices = []
+            rooms_for_session = problem.compatible_rooms[s_idx]
+            if s_idx in problem.pinned:
+                rooms_for_session = [problem.pinned[s_idx][0]]
+            for r_idx in rooms_for_session:
+                if not room_is_free(problem, r_idx, t_idx, duration):
+                    continue
+                v = model.NewBoolVar(f"z_s{s_idx}_r{r_idx}")
+                z[(s_idx, r_idx, t_idx)] = v
+                choices.append(v)
+                for dt in range(duration):
+                    room_slot[(r_idx, t_idx + dt)].append(v)
+            if choices:
+                model.Add(sum(choices) <= 1)
+        for active in room_slot.values():
+            if len(active) > 1:
+                model.Add(sum(active) <= 1)
+        # Every roomed session counts; keeping a repair's previous room only breaks ties
+        kept = [var for (s_idx, r_idx, t_idx), var in z.items() if problem.preferred.get(s_idx) == (r_idx, t_idx)]
+        model.Maximize(sum(z.values()) * (len(kept) + 1) + sum(kept))
+
+        day_settings = copy.copy(settings)
+        day_settings.time_limit = max(1, (time_limit - (time.time() - phase_start)) / (len(days) - day_number))
+        solver = cp_model.CpSolver()
+        day_settings.apply(solver)
+        # A gap would let the solve stop with sessions it could still room
+        solver.parameters.relative_gap_limit = 0
+        status = cp_model.UNKNOWN
+        if stop_event is None or not stop_event.is_set():
+            finished = threading.Event()
+            if stop_event is not None:
+                threading.Thread(target=stop_when_set, args=(solver, stop_event, finished), daemon=True).start()
+            try:
+                status = solver.Solve(model)
+            finally:
+                finished.set()
+
+        roomed = set()
+        if status == cp_model.OPTIMAL:
+            proven_days.add(day_idx)
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            for key, var in z.items():
+                if solver.Value(var) == 1:
+                    placements.append(key)
+                    roomed.add(key[0])
+
+        for s_idx, t_idx in by_day[day_idx]:
+            if s_idx in roomed:
+                continue
+            session = problem.sessions[s_idx]
+            course = problem.course_map[session["courseId"]]
+            conflicts.append({
+                "type": "no-room",
+                "message": f"Course {course['code']} ({session['classId']}) got slot "
+                           f"{problem.all_time_slots[t_idx]['id']} but no free room was left.",
+                "affectedEntries": [session["id"]],
+                "severity": "error"
+            })
+
+    log_stat("Sessions given a room", len(placements), Colors.GREEN)
+    log_stat("Sessions left without a room", len(conflicts), Colors.RED if conflicts else Colors.GREEN)
+    log_timing("Room assignment time", phase_start)
+    return placements, conflicts, proven_days
+
+
+def overlap_clusters(problem, day_placements):
+    """
+    Split one day's (s_idx, t_idx) placements into groups whose sessions
+    overlap in time, directly or through each other. Sessions of different
+    groups never compete for a room, so each group is roomed independently.
+    """
+    clusters = []
+    cluster_end = None
+    for s_idx, t_idx in sorted(day_placements, key=lambda p: p[1]):
+        end = t_idx + problem.sessions[s_idx]["duration"]
+        if cluster_end is None or t_idx >= cluster_end:
+            clusters.append([])
+            cluster_end = end
+        clusters[-1].append((s_idx, t_idx))
+        cluster_end = max(cluster_end, end)
+    return clusters
+
+
+def room_options(problem, s_idx):
+    """Rooms stage 2 may give a session: its compatible rooms, or its own room if pinned."""
+    if s_idx in problem.pinned:
+        return (problem.pinned[s_idx][0],)
+    return tuple(problem.compatible_rooms[s_idx])
+
+
+def add_room_cuts(built, slot_placements, unroomed):
+    """
+    Forbid stage 1 from repeating slot layouts stage 2 could not room. Stage
+    2 maximises the roomed sessions of a day, so on a day it solved to
+    optimality an overlap cluster holding an unroomed session has no room
+    assignment at all, and neither has any layout containing it. `unroomed`
+    must only hold sessions of such proven days: a day that ran out of time
+    proves nothing, and cutting it could remove feasible layouts. Its rooming only depends on each session's start,
+    length and room options, so the cut covers every session with the same
+    length and options: for each such kind k needed c_k times at slot t, a
+    literal b_k is forced on once c_k of them start at t, and not every b_k
+    may be on. This covers what the per-slot capacity constraints miss,
+    such as a 2-slot lab that must keep one room. Returns the number of cuts.
+    """
+    problem = built.problem
+    sessions_of_kind = collections.defaultdict(list)
+    for s_idx, session in enumerate(problem.sessions):
+        sessions_of_kind[(session["duration"], room_options(problem, s_idx))].append(s_idx)
+
+    by_day = collections.defaultdict(list)
+    for s_idx, _, t_idx in slot_placements:
+        by_day[t_idx // problem.slots_per_day].append((s_idx, t_idx))
+
+    added = 0
+    for day_placements in by_day.values():
+        for cluster in overlap_clusters(problem, day_placements):
+            if not any(s_idx in unroomed for s_idx, _ in cluster):
+                continue
+            needed = collections.Counter(
+                (t_idx, problem.sessions[s_idx]["duration"], room_options(problem, s_idx)) for s_idx, t_idx in cluster
+            )
+            present = []
+            for (t_idx, duration, rooms), count in needed.items():
+                literals = [built.y[(s, t_idx)] for s in sessions_of_kind[(duration, rooms)] if (s, t_idx) in built.y]
+                b = built.model.NewBoolVar(f"room_cut_{added}_{len(present)}")
+                built.model.Add(sum(literals) <= count - 1 + (len(literals) - count + 1) * b)
+                present.append(b)
+            built.model.Add(sum(present) <= len(present) - 1)
+            added += 1
+    return added
+
+
+def assign_rooms_with_cuts(built, solver, status, settings, time_limit, update_progress, stop_event=None):
+    """
+    Stage 2 with feedback: assign rooms to stage 1's solution and, while
+    sessions are left without a room, cut the failing slot layouts from the
+    stage 1 model (see add_room_cuts) and re-solve it warm-started from the
+    previous layout, at most ROOM_CUT_ROUNDS times within `time_limit`.
+    Only days stage 2 solved to optimality are cut; when the unroomed
+    sessions all sit on days it did not finish, the rounds stop there. The
+    round rooming the most sessions wins. Returns (solver, status,
+    placements, conflicts, summary).
+    """
+    problem = built.problem
+    started = time.time()
+    slot_placements = built.solution_placements(solver)
+    best = None
+    rounds = []
+    while True:
+        remaining = max(ROOM_STAGE_TIME_LIMIT, time_limit - (time.time() - started))
+        placements, conflicts, proven_days = assign_rooms(problem, slot_placements, settings, remaining, stop_event)
+        if best is None or len(placements) > len(best[2]):
+            best = (solver, status, placements, conflicts)
+        if not conflicts or len(rounds) >= ROOM_CUT_ROUNDS:
+            break
+        if stop_event is not None and stop_event.is_set():
+            break
+        if time_limit - (time.time() - started) < ROOM_STAGE_TIME_LIMIT:
+            break
+
+        roomed = {s_idx for s_idx, _, _ in placements}
+        unroomed = {s_idx for s_idx, _, _ in slot_placements} - roomed
+        unproven = {s_idx for s_idx, _, t_idx in slot_placements
+                    if s_idx in unroomed and t_idx // problem.slots_per_day not in proven_days}
+        cuts = add_room_cuts(built, slot_placements, unroomed - unproven)
+        rounds.append({"unroomed": len(unroomed), "unproven": len(unproven), "cuts": cuts})
+        if not cuts:
+            break
+
+        log_progress(f"Re-solving stage 1 with {cuts} room cuts...")
+        update_progress("processing", 95, f"Re-solving slots with {cuts} room cuts...")
+        built.model.ClearHints()
+        built.add_hints(slot_placements)
+        round_settings = copy.copy(settings)
+        round_settings.time_limit = time_limit - (time.time() - started)
+        solver, status = solve_model(built, lambda *args, **kwargs: None, round_settings, stop_event=stop_event)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            break
+        slot_placements = built.solution_placements(solver)
+
+    solver, status, placements, conflicts = best
+    summary = {"cutRounds": len(rounds), "rounds": rounds, "unroomed": len(conflicts)}
+    return solver, status, placements, conflicts, summary
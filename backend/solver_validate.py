@@ -0,0 +1,199 @@
+import collections
+import time
+
+from solver import is_lab_course
+from solver_config import TimeGrid
+from solver_greedy import MAX_LABS_PER_WEEK, MAX_PER_DAY
+
+
+def _slot_label(grid, t_idx):
+    slot = grid.slots[t_idx]
+    return f"{slot['day']} {slot['startTime']}"
+
+
+class _Violations:
+    """Conflict entries in the shape the solver and the frontend use, one per clash."""
+
+    def __init__(self):
+        self.conflicts = []
+
+    def add(self, conflict_type, message, entry_ids):
+        self.conflicts.append({
+            "type": conflict_type,
+            "message": message,
+            "affectedEntries": sorted(set(entry_ids)),
+            "severity": "error"
+        })
+
+
+def _lab_sessions(grid, slots):
+    """
+    Split the occupied slots of one class's lab course into sessions: runs
+    of consecutive slots on one day, cut into pairs. Returns (sessions,
+    broken) where `broken` holds the slots of runs that do not pair up.
+    """
+    sessions, broken = [], []
+    run = []
+    for t_idx in sorted(set(slots)) + [None]:
+        if run and (t_idx is None or t_idx != run[-1] + 1 or grid.day_of[t_idx] != grid.day_of[run[0]]):
+            for pair_start in range(0, len(run) - 1, 2):
+                sessions.append(run[pair_start])
+            if len(run) % 2:
+                broken.append(run[-1])
+            run = []
+        if t_idx is not None:
+            run.append(t_idx)
+    return sessions, broken
+
+
+def validate_timetable(entries, existing_timetables=None, courses=None, time_grid=None):
+    """
+    Check hand-edited timetable entries against every hard rule the solver
+    enforces, in one indexed pass:
+      - a room, faculty member or class booked twice in a slot (rooms and
+        faculty also against `existing_timetables`)
+      - more than MAX_PER_DAY session starts for a class on a day
+      - three consecutive session starts for a class (break rule)
+      - lab slots that are not consecutive pairs on one day
+      - more than MAX_LABS_PER_WEEK labs for a class
+      - entries in slots the time grid blocks
+    `time_grid` is the "timeGrid" payload the timetable was generated with.
+    `courses` (optional) decides which courses are labs; otherwise the
+    entry's courseCode/courseName is used. Existing entries that share an id
+    with an edited entry are taken to be its old copy and ignored.
+    Returns {"valid", "conflicts", "statistics"}.
+    """
+    started = time.time()
+    grid = TimeGrid.from_payload(time_grid)
+    violations = _Violations()
+    course_map = {c["id"]: c for c in courses or []}
+    lab_flags = {}
+
+    def is_lab(entry):
+        course_id = entry.get("courseId")
+        if course_id not in lab_flags:
+            course = course_map.get(course_id) or {"code": entry.get("courseCode", ""), "name": entry.get("courseName", "")}
+            lab_flags[course_id] = is_lab_course(course)
+        return lab_flags[course_id]
+
+    # Index every edited entry by the resources it occupies
+    room_slot = collections.defaultdict(list)     # (room id, t_idx) -> entry ids
+    faculty_slot = collections.defaultdict(list)  # (faculty id, t_idx) -> entry ids
+    class_slot = collections.defaultdict(list)    # (class id, t_idx) -> entry ids
+    class_starts = collections.defaultdict(lambda: collections.defaultdict(list))  # class -> t_idx -> ids
+    class_labs = collections.defaultdict(lambda: collections.defaultdict(list))    # class -> course -> t_idx
+    lab_entry_ids = collections.defaultdict(list)  # (class id, course id, t_idx) -> entry ids
+    edited_ids = set()
+    skipped = 0
+
+    for e_idx, entry in enumerate(entries):
+        time_slot = entry.get("timeSlot") or {}
+        t_idx = grid.slot_index(time_slot.get("day"), time_slot.get("startTime"))
+        if t_idx is None:
+            skipped += 1
+            continue
+        entry_id = entry.get("id") or f"entry-{e_idx}"
+        edited_ids.add(entry_id)
+        if t_idx in grid.blocked:
+            violations.add("no-slot", f"{_slot_label(grid, t_idx)} is blocked in the time grid.", [entry_id])
+        class_id = entry.get("classId")
+        if entry.get("roomId"):
+            room_slot[(entry["roomId"], t_idx)].append(entry_id)
+        if entry.get("facultyId"):
+            faculty_slot[(entry["facultyId"], t_idx)].append(entry_id)
+        if class_id:
+            class_slot[(class_id, t_idx)].append(entry_id)
+            if is_lab(entry):
+                class_labs[class_id][entry.get("courseId")].append(t_idx)
+                lab_entry_ids[(class_id, entry.get("courseId"), t_idx)].append(entry_id)
+            else:
+                class_starts[class_id][t_idx].append(entry_id)
+
+    # Rooms and faculty already booked by other timetables
+    booked_rooms = collections.defaultdict(set)
+    booked_faculty = collections.defaultdict(set)
+    for existing in existing_timetables or []:
+        for entry in existing.get("entries", []):
+            if entry.get("id") in edited_ids:
+                continue
+            time_slot = entry.get("timeSlot") or {}
+            t_idx = grid.slot_index(time_slot.get("day"), time_slot.get("startTime"))
+            if t_idx is None:
+                continue
+            if entry.get("roomId"):
+                booked_rooms[(entry["roomId"], t_idx)].add(entry.get("id"))
+            if entry.get("facultyId"):
+                booked_faculty[(entry["facultyId"], t_idx)].add(entry.get("id"))
+
+    # Double booking: distinct ids in one cell; a lab's two slots share an id but not a cell
+    for conflict_type, label, index, booked in (
+        ("room-clash", "Room", room_slot, booked_rooms),
+        ("faculty-clash", "Faculty", faculty_slot, booked_faculty),
+        ("student-clash", "Class", class_slot, None),
+    ):
+        for (owner, t_idx), ids in index.items():
+            others = booked.get((owner, t_idx), ()) if booked is not None else ()
+            if len(set(ids)) > 1 or others:
+                where = " and in an existing timetable" if others else ""
+                violations.add(
+                    conflict_type,
+                    f"{label} {owner} is booked {len(set(ids)) + len(others)} times on {_slot_label(grid, t_idx)}{where}.",
+                    ids,
+                )
+
+    # Labs become one start per consecutive pair; odd slots break lab continuity
+    for class_id, labs in class_labs.items():
+        num_labs = 0
+        lab_ids = []
+        for course_id, slots in labs.items():
+            sessions, broken = _lab_sessions(grid, slots)
+            num_labs += len(sessions)
+            for t_idx in sessions:
+                class_starts[class_id][t_idx].extend(lab_entry_ids[(class_id, course_id, t_idx)])
+                lab_ids.extend(lab_entry_ids[(class_id, course_id, t_idx)])
+            for t_idx in broken:
+                ids = lab_entry_ids[(class_id, course_id, t_idx)]
+                violations.add(
+                    "lab-continuity",
+                    f"Lab for class {class_id} on {_slot_label(grid, t_idx)} is not part of two consecutive slots on one day.",
+                    ids,
+                )
+                class_starts[class_id][t_idx].extend(ids)
+        if num_labs > MAX_LABS_PER_WEEK:
+            violations.add(
+                "daily-limit",
+                f"Class {class_id} has {num_labs} labs but at most {MAX_LABS_PER_WEEK} are allowed per week.",
+                lab_ids,
+            )
+
+    # Daily limit and break rule, on session starts per class
+    windows = grid.windows(3)
+    for class_id, starts in class_starts.items():
+        for day_idx, day in enumerate(grid.days):
+            day_starts = [t_idx for t_idx in grid.day_slots(day_idx) if starts.get(t_idx)]
+            if len(day_starts) > MAX_PER_DAY:
+                violations.add(
+                    "daily-limit",
+                    f"Class {class_id} has {len(day_starts)} sessions on {day} but at most {MAX_PER_DAY} are allowed.",
+                    [entry_id for t_idx in day_starts for entry_id in starts[t_idx]],
+                )
+        for window in windows:
+            if all(starts.get(t_idx) for t_idx in window):
+                violations.add(
+                    "break-requirement",
+                    f"Class {class_id} has three consecutive sessions from {_slot_label(grid, window[0])}.",
+                    [entry_id for t_idx in window for entry_id in starts[t_idx]],
+                )
+
+    conflicts = violations.conflicts
+    return {
+        "valid": not conflicts,
+        "conflicts": conflicts,
+        "statistics": {
+            "entries": len(entries),
+            "skippedEntries": skipped,
+            "classes": len(set(class_id for class_id, _ in class_slot)),
+            "conflictsFound": len(conflicts),
+            "validationTime": round(time.time() - started, 4),
+        },
+    }